@@ -26,14 +26,15 @@ def render_funnel_chart(metrics: Dict[str, int]):
     
     st.plotly_chart(fig, use_container_width=True)
 
-def render_score_distribution(matches: list):
-    """Распределение оценок"""
+def render_score_distribution(score_buckets: Dict[int, int], bucket_size: int = 5):
+    """Распределение оценок (гистограмма уже посчитана в БД)"""
     
-    scores = [m.score for m in matches]
+    buckets = sorted(score_buckets.items())
     
-    fig = go.Figure(data=[go.Histogram(
-        x=scores,
-        nbinsx=20,
+    fig = go.Figure(data=[go.Bar(
+        x=[start + bucket_size / 2 for start, _ in buckets],
+        y=[count for _, count in buckets],
+        width=bucket_size,
         marker_color='#0066cc'
     )])
     
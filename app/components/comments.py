@@ -3,6 +3,7 @@ import streamlit as st
 import json
 from datetime import datetime
 from db.models import SessionLocal, Comment
+from services.query_cache import cached, invalidate
 
 def render_comments(match_id: int):
     """
@@ -35,11 +36,7 @@ def render_comments(match_id: int):
                 st.error("Введите текст комментария")
     
     # Список комментариев
-    db = SessionLocal()
-    comments = db.query(Comment).filter(
-        Comment.match_id == match_id
-    ).order_by(Comment.created_at.desc()).all()
-    db.close()
+    comments = get_comments(match_id)
     
     if not comments:
         st.info("Комментариев пока нет")
@@ -77,6 +74,16 @@ def render_comments(match_id: int):
             
             st.divider()
 
+@cached("comments")
+def get_comments(match_id: int) -> list:
+    """Комментарии кандидата, новые сверху"""
+    db = SessionLocal()
+    comments = db.query(Comment).filter(
+        Comment.match_id == match_id
+    ).order_by(Comment.created_at.desc()).all()
+    db.close()
+    return comments
+
 def add_comment(match_id: int, text: str, tags_input: str = ""):
     """
     Добавляет комментарий к кандидату
@@ -107,6 +114,7 @@ def add_comment(match_id: int, text: str, tags_input: str = ""):
     db.add(comment)
     db.commit()
     db.close()
+    invalidate("comments")
 
 def delete_comment(comment_id: int):
     """Удаляет комментарий"""
@@ -114,3 +122,4 @@ def delete_comment(comment_id: int):
     db.query(Comment).filter(Comment.id == comment_id).delete()
     db.commit()
     db.close()
+    invalidate("comments")
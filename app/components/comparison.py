@@ -65,16 +65,13 @@ def render_radar_chart(matches: List[Match]):
     colors = ['#0066cc', '#28a745', '#ffc107']
     
     for idx, m in enumerate(matches):
-        analysis = json.loads(m.analysis_json)
-        scores = analysis['matching_score']
-        
         values = [
-            scores.get('hard_skills', 0),
-            scores.get('experience', 0),
-            scores.get('cultural_fit', 0),
-            scores.get('communication', 0),
-            scores.get('growth_potential', 0),
-            scores.get('stability', 0)
+            m.hard_skills or 0,
+            m.experience or 0,
+            m.cultural_fit or 0,
+            m.communication or 0,
+            m.growth_potential or 0,
+            m.stability or 0
         ]
         
         fig.add_trace(go.Scatterpolar(
@@ -118,8 +115,7 @@ def render_comparison_table(matches: List[Match]):
         row = {'Критерий': crit_name}
         
         for m in matches:
-            analysis = json.loads(m.analysis_json)
-            score = analysis['matching_score'].get(crit_key, 0)
+            score = m.score if crit_key == 'overall' else (getattr(m, crit_key) or 0)
             row[m.resume_name] = f"{score}%"
         
         table_data.append(row)
@@ -129,8 +125,7 @@ def render_comparison_table(matches: List[Match]):
     rec_map = {"YES": "✅ Принять", "NO": "❌ Отклонить", "MAYBE": "🔍 Уточнить"}
     
     for m in matches:
-        analysis = json.loads(m.analysis_json)
-        rec = analysis.get('recommendation', 'MAYBE')
+        rec = m.recommendation or 'MAYBE'
         rec_row[m.resume_name] = rec_map.get(rec, rec)
     
     table_data.append(rec_row)
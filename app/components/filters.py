@@ -2,6 +2,7 @@
 import streamlit as st
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
+from components.status_manager import STATUS_CONFIG
 
 def render_filters(vacancies: list) -> Dict[str, Any]:
     """
@@ -60,12 +61,20 @@ def render_filters(vacancies: list) -> Dict[str, Any]:
             )
             min_score, max_score = score_range
             
-            # Поиск по имени
+            # Полнотекстовый поиск: имя, анализ, комментарии
             search_query = st.text_input(
-                "🔎 Поиск по имени",
-                placeholder="Введите имя кандидата...",
+                "🔎 Поиск",
+                placeholder="Имя, навык, слово из анализа или комментария...",
                 key="filter_search"
             )
+            
+            # Фильтр по статусу
+            statuses = st.multiselect(
+                "Статус",
+                list(STATUS_CONFIG.keys()),
+                format_func=lambda x: STATUS_CONFIG[x]["label"],
+                key="filter_statuses"
+            )
         
         # Фильтр по дате
         col3, col4 = st.columns(2)
@@ -110,7 +119,8 @@ def render_filters(vacancies: list) -> Dict[str, Any]:
         'recommendation': recommendation,
         'search_query': search_query,
         'date_from': date_from,
-        'date_to': date_to
+        'date_to': date_to,
+        'statuses': statuses
     }
 
 
@@ -138,6 +148,10 @@ def show_filter_summary(filters: Dict[str, Any], total_count: int, filtered_coun
     if filters['search_query']:
         active_filters.append(f"Поиск: '{filters['search_query']}'")
     
+    if filters.get('statuses'):
+        labels = [STATUS_CONFIG[s]["label"] for s in filters['statuses']]
+        active_filters.append(f"Статус: {', '.join(labels)}")
+    
     if filters['date_from'] or filters['date_to']:
         active_filters.append("Фильтр по дате активен")
     
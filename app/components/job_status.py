@@ -0,0 +1,109 @@
+"""Компонент для отображения очереди фоновых задач анализа"""
+import time
+import streamlit as st
+from config import JOB_POLL_INTERVAL
+from services.job_queue import get_batch_status, list_batches, retry_failed, enqueue_rescore
+
+def render_job_queue():
+    """
+    Показывает прогресс выбранного пакета задач и при активной обработке
+    перезапускает страницу каждые несколько секунд (опрос статуса)
+    """
+    batches = list_batches(limit=10)
+
+    if not batches:
+        return
+
+    st.divider()
+    st.subheader("📥 Очередь анализа")
+
+    batch_ids = [b['batch_id'] for b in batches]
+    active_batch_id = st.session_state.get('active_batch_id')
+    default_index = batch_ids.index(active_batch_id) if active_batch_id in batch_ids else 0
+
+    labels = {
+        b['batch_id']: f"{b['created_at'].strftime('%d.%m %H:%M')} — {b['total']} резюме ({b['batch_id']})"
+        for b in batches
+    }
+
+    batch_id = st.selectbox(
+        "Пакет",
+        batch_ids,
+        index=default_index,
+        format_func=lambda x: labels[x],
+        key="job_batch_selector"
+    )
+    st.session_state['active_batch_id'] = batch_id
+
+    status = get_batch_status(batch_id)
+    counts = status['counts']
+
+    progress = status['finished'] / status['total'] if status['total'] else 0
+    st.progress(progress)
+
+    col1, col2, col3, col4, col5, col6 = st.columns(6)
+    with col1:
+        st.metric("В очереди", counts['queued'] + counts['screened'])
+    with col2:
+        st.metric("В работе", counts['running'])
+    with col3:
+        st.metric("Готово", counts['done'])
+    with col4:
+        st.metric("Отсеяно", counts['skipped'])
+    with col5:
+        st.metric("Ошибок", counts['failed'])
+    with col6:
+        spi = status['seconds_per_item']
+        st.metric("Сек/резюме", f"{spi:.1f}" if spi else "—")
+
+    if status['results']:
+        st.dataframe(
+            sorted(status['results'], key=lambda r: r['score'] or 0, reverse=True),
+            use_container_width=True
+        )
+
+    if status['skipped']:
+        with st.expander(f"🧹 Отсеяно предварительным отбором ({len(status['skipped'])})"):
+            st.dataframe(
+                sorted(status['skipped'], key=lambda r: r['prescore'] or 0, reverse=True),
+                use_container_width=True
+            )
+
+    if status['errors']:
+        with st.expander(f"❌ Ошибки ({len(status['errors'])})"):
+            for err in status['errors']:
+                st.error(f"{err['file']}: {err['error']}")
+
+            if st.button("🔁 Повторить упавшие", key=f"retry_{batch_id}"):
+                count = retry_failed(batch_id)
+                st.success(f"Возвращено в очередь: {count}")
+                st.rerun()
+
+    if status['active']:
+        auto_refresh = st.checkbox("Автообновление", value=True, key="job_auto_refresh")
+        if auto_refresh:
+            time.sleep(JOB_POLL_INTERVAL)
+            st.rerun()
+
+
+def render_rescore_action(resume_id: int, vacancies):
+    """
+    Переоценка сохранённого резюме под выбранную вакансию (фоновая задача)
+
+    Повторно выполняется только оценка — парсинг и извлечение структуры
+    берутся из сохранённого резюме.
+    """
+    from config import get_selected_model
+
+    vacancy_options = {v.id: f"{v.title} @ {v.company}" for v in vacancies}
+    vacancy_id = st.selectbox(
+        "Вакансия",
+        list(vacancy_options.keys()),
+        format_func=lambda x: vacancy_options[x],
+        key=f"rescore_vacancy_{resume_id}"
+    )
+
+    if st.button("Переоценить", key=f"rescore_{resume_id}"):
+        batch_id = enqueue_rescore([resume_id], [vacancy_id], get_selected_model())
+        st.session_state['active_batch_id'] = batch_id
+        st.success(f"Переоценка поставлена в очередь (пакет {batch_id}), прогресс — на странице «Анализ»")
@@ -1,29 +1,44 @@
 # app/components/kanban.py
 """Kanban доска для управления кандидатами"""
 import streamlit as st
-from typing import List
-from db.models import SessionLocal, Match
-from components.status_manager import STATUS_CONFIG, change_status
-import json
+from typing import Optional
+from config import KANBAN_PAGE_SIZE
+from components.status_manager import STATUS_CONFIG, change_status, render_bulk_status_change
+from utils.queries import get_kanban_counts, get_kanban_cards, get_kanban_card_ids
 
-def render_kanban_board(matches: List[Match]):
+def render_kanban_board(vacancy_id: Optional[int] = None):
     """
     Рендерит Kanban доску с кандидатами
     
+    Счётчики колонок — из одного GROUP BY, в колонке показываются первые
+    KANBAN_PAGE_SIZE карточек по рейтингу, остальные — по кнопке "Показать ещё".
+    
     Args:
-        matches: Список всех кандидатов
+        vacancy_id: Показывать только кандидатов вакансии (None = все)
     """
     st.markdown("### 📋 Kanban доска")
     
-    # Группируем кандидатов по статусам
-    grouped = {key: [] for key in STATUS_CONFIG.keys()}
+    counts = get_kanban_counts(vacancy_id)
+    
+    # Сколько карточек раскрыто в каждой колонке (сбрасывается при смене вакансии)
+    scope_key = f"kanban_limits_{vacancy_id}"
+    if scope_key not in st.session_state:
+        st.session_state[scope_key] = {key: KANBAN_PAGE_SIZE for key in STATUS_CONFIG.keys()}
+    limits = st.session_state[scope_key]
     
-    for m in matches:
-        status = getattr(m, 'status', 'new')
-        if status in grouped:
-            grouped[status].append(m)
-        else:
-            grouped['new'].append(m)
+    with st.expander("🔀 Массовая смена статуса"):
+        source_status = st.selectbox(
+            "Из колонки",
+            [key for key in STATUS_CONFIG.keys() if counts[key]] or ['new'],
+            format_func=lambda x: f"{STATUS_CONFIG[x]['label']} ({counts[x]})",
+            key=f"kanban_bulk_source_{vacancy_id}"
+        )
+        loaded_cards = get_kanban_cards(source_status, limits[source_status], vacancy_id)
+        render_bulk_status_change(
+            {card.id: f"{card.resume_name} — {card.score}%" for card in loaded_cards},
+            key=f"kanban_bulk_{vacancy_id}_{source_status}",
+            all_ids=get_kanban_card_ids(source_status, vacancy_id)
+        )
     
     # Создаём колонки для каждого статуса
     cols = st.columns(len(STATUS_CONFIG))
@@ -31,7 +46,7 @@ def render_kanban_board(matches: List[Match]):
     for i, (status_key, config) in enumerate(STATUS_CONFIG.items()):
         with cols[i]:
             # Заголовок колонки
-            count = len(grouped[status_key])
+            count = counts[status_key]
             st.markdown(
                 f"""<div style="background: {config['color']}; color: white; padding: 10px; 
                 border-radius: 8px; text-align: center; font-weight: bold; margin-bottom: 10px;">
@@ -40,16 +55,34 @@ def render_kanban_board(matches: List[Match]):
                 unsafe_allow_html=True
             )
             
+            if not count:
+                continue
+            
             # Карточки кандидатов
-            for m in grouped[status_key]:
-                render_candidate_card(m, status_key)
+            cards = get_kanban_cards(status_key, limits[status_key], vacancy_id)
+            for card in cards:
+                render_candidate_card(card, status_key)
+            
+            if count > len(cards):
+                if st.button(
+                    f"⬇️ Показать ещё ({count - len(cards)})",
+                    key=f"kanban_more_{status_key}_{vacancy_id}",
+                    use_container_width=True
+                ):
+                    limits[status_key] += KANBAN_PAGE_SIZE
+                    st.rerun()
 
-def render_candidate_card(match: Match, current_status: str):
-    """Рендерит карточку кандидата в Kanban"""
+def render_candidate_card(match, current_status: str):
+    """
+    Рендерит карточку кандидата в Kanban
+    
+    Args:
+        match: Проекция кандидата (id, resume_name, vacancy_title, score, recommendation)
+        current_status: Колонка, в которой показана карточка
+    """
     
-    analysis = json.loads(match.analysis_json)
     score = match.score
-    rec = analysis.get('recommendation', 'MAYBE')
+    rec = match.recommendation or 'MAYBE'
     
     # Цвет карточки по рекомендации
     card_colors = {
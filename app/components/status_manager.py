@@ -1,7 +1,12 @@
 """Компонент для управления статусами кандидатов"""
 import streamlit as st
+import time
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, insert, or_
 from db.models import SessionLocal, Match, StatusHistory
+from services.analytics_rollup import on_status_changed, on_status_changed_bulk
+from services.query_cache import cached, invalidate
 
 # Доступные статусы
 STATUS_CONFIG = {
@@ -101,6 +106,7 @@ def change_status(match_id: int, old_status: str, new_status: str):
     # Обновляем статус
     match = db.query(Match).filter(Match.id == match_id).first()
     if match:
+        on_status_changed(db, match, match.status, new_status)
         match.status = new_status
         match.status_updated_at = datetime.utcnow()
         
@@ -115,6 +121,125 @@ def change_status(match_id: int, old_status: str, new_status: str):
         db.commit()
     
     db.close()
+    invalidate("matches", "status_history")
+
+@cached("status_history")
+def get_status_history(match_id: int) -> list:
+    """История смены статусов кандидата, новые сверху"""
+    db = SessionLocal()
+    history = db.query(StatusHistory).filter(
+        StatusHistory.match_id == match_id
+    ).order_by(StatusHistory.changed_at.desc()).all()
+    db.close()
+    return history
+
+BULK_CHUNK_SIZE = 500  # id в одном IN (...) — с запасом до лимита переменных SQLite
+
+def change_status_bulk(match_ids: List[int], new_status: str) -> Dict[str, Any]:
+    """
+    Меняет статус группы кандидатов одной транзакцией
+    
+    Set-based UPDATE + пакетная вставка истории + обновление предагрегатов
+    по группам. Кандидаты, уже находящиеся в new_status, пропускаются.
+    
+    Args:
+        match_ids: ID кандидатов
+        new_status: Новый статус
+    
+    Returns:
+        {'updated': int, 'seconds': float, 'rows_per_sec': float}
+    """
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    ids = list(dict.fromkeys(match_ids))
+    
+    db = SessionLocal()
+    try:
+        rows = []
+        for i in range(0, len(ids), BULK_CHUNK_SIZE):
+            chunk = ids[i:i + BULK_CHUNK_SIZE]
+            rows.extend(db.query(
+                Match.id, Match.status, Match.created_at, Match.vacancy_id, Match.vacancy_title,
+                Match.recommendation, Match.score, Match.hard_skills, Match.experience
+            ).filter(
+                Match.id.in_(chunk),
+                or_(Match.status != new_status, Match.status.is_(None))
+            ).all())
+        
+        if rows:
+            on_status_changed_bulk(db, rows, new_status)
+            
+            changed_ids = [row.id for row in rows]
+            for i in range(0, len(changed_ids), BULK_CHUNK_SIZE):
+                db.query(Match).filter(Match.id.in_(changed_ids[i:i + BULK_CHUNK_SIZE])).update(
+                    {"status": new_status, "status_updated_at": now},
+                    synchronize_session=False
+                )
+            
+            db.execute(insert(StatusHistory), [
+                {"match_id": row.id, "old_status": row.status, "new_status": new_status, "changed_at": now}
+                for row in rows
+            ])
+        
+        db.commit()
+    finally:
+        db.close()
+    
+    if rows:
+        invalidate("matches", "status_history")
+    
+    seconds = time.perf_counter() - started
+    return {
+        "updated": len(rows),
+        "seconds": seconds,
+        "rows_per_sec": len(rows) / seconds if seconds > 0 else 0
+    }
+
+def render_bulk_status_change(candidates: Dict[int, str], key: str, all_ids: Optional[List[int]] = None):
+    """
+    Панель массовой смены статуса
+    
+    Args:
+        candidates: {match_id: подпись} — кандидаты, доступные для выбора
+        key: Префикс ключей виджетов
+        all_ids: Если задан — опция "выбрать всех" берёт этот список
+                 (например, всю колонку Kanban, а не только показанные карточки)
+    """
+    report = st.session_state.pop(f"{key}_report", None)
+    if report:
+        st.success(
+            f"Статус изменён у {report['updated']} кандидатов за {report['seconds']:.2f} с "
+            f"({report['rows_per_sec']:.0f} строк/с)"
+        )
+    
+    select_all_ids = all_ids if all_ids is not None else list(candidates.keys())
+    select_all = st.checkbox(f"Выбрать всех ({len(select_all_ids)})", key=f"{key}_all")
+    
+    if select_all:
+        selected = select_all_ids
+    else:
+        selected = st.multiselect(
+            "Кандидаты",
+            list(candidates.keys()),
+            format_func=lambda x: candidates[x],
+            key=f"{key}_selected"
+        )
+    
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        new_status = st.selectbox(
+            "Новый статус",
+            list(STATUS_CONFIG.keys()),
+            format_func=get_status_label,
+            key=f"{key}_status"
+        )
+    with col2:
+        st.write("")
+        apply = st.button("💾 Применить", key=f"{key}_apply", disabled=not selected)
+    
+    if apply and selected:
+        st.session_state[f"{key}_report"] = change_status_bulk(selected, new_status)
+        st.rerun()
 
 def render_status_history(match_id: int):
     """
@@ -123,11 +248,7 @@ def render_status_history(match_id: int):
     Args:
         match_id: ID кандидата
     """
-    db = SessionLocal()
-    history = db.query(StatusHistory).filter(
-        StatusHistory.match_id == match_id
-    ).order_by(StatusHistory.changed_at.desc()).all()
-    db.close()
+    history = get_status_history(match_id)
     
     if not history:
         st.info("История статусов пуста")
@@ -163,14 +284,37 @@ def get_status_counts(matches: list) -> dict:
     
     return counts
 
-def render_status_overview(matches: list):
+@cached("matches")
+def get_status_counts_db() -> dict:
+    """
+    Подсчитывает количество кандидатов в каждом статусе одним GROUP BY запросом
+    
+    Returns:
+        Словарь {status_key: count}
+    """
+    db = SessionLocal()
+    try:
+        rows = db.query(Match.status, func.count(Match.id)).group_by(Match.status).all()
+    finally:
+        db.close()
+    
+    counts = {key: 0 for key in STATUS_CONFIG.keys()}
+    
+    for status, count in rows:
+        if status in counts:
+            counts[status] += count
+        else:
+            counts['new'] += count  # fallback для старых записей
+    
+    return counts
+
+def render_status_overview(counts: dict):
     """
     Отображает сводку по статусам (воронка)
     
     Args:
-        matches: Список объектов Match
+        counts: Словарь {status_key: count} (get_status_counts / get_status_counts_db)
     """
-    counts = get_status_counts(matches)
     
     st.markdown("### 📊 Воронка найма")
     
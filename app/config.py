@@ -1,4 +1,5 @@
 # app/config.py
+import json
 import os
 
 LLM_MANAGER_URL = os.getenv("LLM_MANAGER_URL", "http://192.168.149.194:8000")
@@ -25,19 +26,135 @@ AVAILABLE_MODELS = {
 
 DEFAULT_MODEL = "a-vibe"
 
-def load_system_prompt():
+# Пакетный анализ: сколько запросов к LLM держать одновременно
+# (по числу слотов инференса в оркестраторе)
+LLM_PARALLEL_SLOTS = int(os.getenv("LLM_PARALLEL_SLOTS", "2"))
+
+def _parse_backends(raw: str) -> list:
+    """
+    Узлы инференса из LLM_BACKENDS (JSON-список); пусто — один оркестратор LLM_MANAGER_URL
+
+    Поля узла: url, api_key, models (ключи AVAILABLE_MODELS или model_id;
+    пусто — все модели), slots (параллельных запросов), switch (false —
+    сервер держит все свои модели загруженными и /switch не нужен)
+    """
+    if not raw.strip():
+        return [{"url": LLM_MANAGER_URL, "api_key": LLM_API_KEY, "models": [], "slots": LLM_PARALLEL_SLOTS, "switch": True}]
+
+    return [
+        {
+            "url": node["url"].rstrip("/"),
+            "api_key": node.get("api_key", LLM_API_KEY),
+            "models": [AVAILABLE_MODELS.get(model, {}).get("model_id", model) for model in node.get("models") or []],
+            "slots": int(node.get("slots", LLM_PARALLEL_SLOTS)),
+            "switch": bool(node.get("switch", True)),
+        }
+        for node in json.loads(raw)
+    ]
+
+# Пул узлов инференса (services/llm_router.py) и автоматы отключения
+# сбоящих узлов: после N ошибок подряд узел исключается на COOLDOWN секунд
+LLM_BACKENDS = _parse_backends(os.getenv("LLM_BACKENDS", ""))
+LLM_TOTAL_SLOTS = sum(node["slots"] for node in LLM_BACKENDS)
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Фоновая очередь задач: на один поток больше, чем слотов инференса всех узлов,
+# чтобы парсинг следующего файла шёл, пока остальные ждут LLM
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(LLM_TOTAL_SLOTS + 1)))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+
+# Парсинг документов в отдельных процессах (services/parse_pool.py): число
+# процессов, лимит времени и размера на документ, страниц PDF и сколько файлов
+# пакета парсить заранее, пока воркеры ждут LLM
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", "60"))
+PARSE_MAX_FILE_MB = float(os.getenv("PARSE_MAX_FILE_MB", "20"))
+PARSE_MAX_PAGES = int(os.getenv("PARSE_MAX_PAGES", "50"))
+PARSE_PREFETCH_MAX = int(os.getenv("PARSE_PREFETCH_MAX", "32"))
+
+# Бюджет токенов на текст резюме/вакансии в промпте (services/text_compactor.py):
+# текст сжимается и укладывается по разделам вместо обрезки по символам
+RESUME_TEXT_TOKEN_BUDGET = int(os.getenv("RESUME_TEXT_TOKEN_BUDGET", "800"))
+VACANCY_TEXT_TOKEN_BUDGET = int(os.getenv("VACANCY_TEXT_TOKEN_BUDGET", "650"))
+
+# HTTP к оркестратору: размер пула keep-alive соединений и лимит
+# одновременных запросов для асинхронного клиента
+LLM_HTTP_POOL_SIZE = int(os.getenv("LLM_HTTP_POOL_SIZE", "16"))
+LLM_ASYNC_CONCURRENCY = int(os.getenv("LLM_ASYNC_CONCURRENCY", str(LLM_TOTAL_SLOTS)))
+
+# Потоковые ответы (stream: true): генерация обрывается, как только JSON закрылся
+LLM_STREAMING = os.getenv("LLM_STREAMING", "false").lower() in ("1", "true", "yes")
+
+# JSON Schema в response_format + валидация ответа по схеме
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "false").lower() in ("1", "true", "yes")
+
+# Ожидание готовности модели после /switch (опрос /status вместо фиксированной паузы)
+MODEL_READY_TIMEOUT = float(os.getenv("MODEL_READY_TIMEOUT", "120"))
+MODEL_READY_POLL_INTERVAL = float(os.getenv("MODEL_READY_POLL_INTERVAL", "1"))
+
+# Кэш результатов LLM в БД
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "720"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# Метрики каждого вызова LLM в БД (страница "LLM-вызовы"), хранятся N дней
+LLM_METRICS_ENABLED = os.getenv("LLM_METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_METRICS_RETENTION_DAYS = float(os.getenv("LLM_METRICS_RETENTION_DAYS", "30"))
+
+# Кэш запросов чтения в памяти процесса (сбрасывается по записи, см. services/query_cache.py)
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "512"))
+
+# Страница "Результаты": варианты размера страницы (LIMIT/OFFSET в SQL)
+RESULTS_PAGE_SIZES = [25, 50, 100, 200]
+
+# Страница "Вакансии": вакансий на странице
+VACANCIES_PAGE_SIZE = int(os.getenv("VACANCIES_PAGE_SIZE", "20"))
+
+# Kanban: карточек в колонке на старте и шаг кнопки "Показать ещё"
+KANBAN_PAGE_SIZE = int(os.getenv("KANBAN_PAGE_SIZE", "20"))
+
+# Предварительный отбор перед LLM (services/prescreen.py): значения по умолчанию
+# в форме загрузки — сколько лучших по локальной оценке отправлять в LLM
+# (0 — без ограничения) и минимальная локальная оценка
+PRESCREEN_TOP_K = int(os.getenv("PRESCREEN_TOP_K", "50"))
+PRESCREEN_MIN_SCORE = float(os.getenv("PRESCREEN_MIN_SCORE", "20"))
+
+# Промпты читаются с диска только при изменении файла (по mtime)
+_prompt_cache = {}
+
+def _read_prompt(path: str, default: str) -> str:
     try:
-        with open('/app/prompts/system_prompt.txt', 'r', encoding='utf-8') as f:
-            return f.read()
-    except FileNotFoundError:
-        return "You are an HR analysis assistant."
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return default
+
+    cached = _prompt_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
 
-def load_hr_guidelines():
     try:
-        with open('/app/prompts/hr_guidelines.txt', 'r', encoding='utf-8') as f:
-            return f.read()
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
     except FileNotFoundError:
-        return ""
+        return default
+
+    _prompt_cache[path] = (mtime, content)
+    return content
+
+# Промпты собираются от постоянного к переменному: инструкция, guidelines и
+# формат ответа -> вакансия -> резюме -> PROMPT_TAIL. Запросы под одну вакансию
+# совпадают до начала резюме, и бэкенды с кэшем префикса (llama.cpp cache_prompt,
+# vLLM prefix caching) не пересчитывают эту часть промпта.
+# См. benchmarks/bench_prefix_cache.py
+PROMPT_TAIL = "Верни результат строго в указанном выше JSON-формате."
+
+def load_system_prompt():
+    return _read_prompt('/app/prompts/system_prompt.txt', "You are an HR analysis assistant.")
+
+def load_hr_guidelines():
+    return _read_prompt('/app/prompts/hr_guidelines.txt', "")
 
 def get_selected_model():
     """Получает выбранную модель из session_state или дефолтную"""
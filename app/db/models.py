@@ -1,4 +1,7 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, Float, DateTime, ForeignKey
+from sqlalchemy import (
+    create_engine, event, Column, Integer, String, Text, Float, Boolean, Date, DateTime,
+    ForeignKey, LargeBinary, Index, UniqueConstraint
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
@@ -8,6 +11,14 @@ DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:////data/db/hr_analysis.db")
 
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+if "sqlite" in DATABASE_URL:
+    @event.listens_for(engine, "connect")
+    def _register_sqlite_functions(dbapi_connection, connection_record):
+        # Встроенный lower() в SQLite работает только с ASCII — для поиска по кириллице
+        dbapi_connection.create_function(
+            "py_lower", 1, lambda value: value.lower() if value is not None else None, deterministic=True
+        )
 Base = declarative_base()
 
 class Vacancy(Base):
@@ -32,13 +43,93 @@ class Match(Base):
     analysis_json = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Сохранённое резюме (текст и структура) — для переоценки без повторного парсинга
+    resume_id = Column(Integer, ForeignKey("resumes.id"), index=True)
+    
+    # Локальная оценка до LLM (services/prescreen.py), показывается рядом с score
+    prescore = Column(Float)
+    
     # НОВОЕ: статус кандидата
     status = Column(String, default="new")  # new, review, interview, offer, rejected, reserve
     status_updated_at = Column(DateTime, default=datetime.utcnow)
     
+    # Поля из analysis_json, вынесенные в колонки для фильтров и агрегатов
+    # (заполняются при вставке через analysis_columns, для старых строк — migrate_db.py)
+    recommendation = Column(String, index=True)  # YES, NO, MAYBE
+    confidence_level = Column(String)  # HIGH, MEDIUM, LOW
+    hard_skills = Column(Float)
+    experience = Column(Float)
+    cultural_fit = Column(Float)
+    communication = Column(Float)
+    growth_potential = Column(Float)
+    stability = Column(Float)
+    
     vacancy = relationship("Vacancy", back_populates="matches")
+    resume = relationship("Resume", back_populates="matches")
     comments = relationship("Comment", back_populates="match", cascade="all, delete-orphan")
     status_history = relationship("StatusHistory", back_populates="match", cascade="all, delete-orphan")
+    
+    # Индексы под фильтры и сортировку страницы "Результаты" (для существующей БД — migrate_db.py)
+    __table_args__ = (
+        Index("ix_matches_vacancy_score", "vacancy_id", "score"),
+        Index("ix_matches_vacancy_status", "vacancy_id", "status"),
+        Index("ix_matches_status", "status"),
+        Index("ix_matches_created_at", "created_at"),
+    )
+
+# Оценки из matching_score, хранящиеся в отдельных колонках Match
+SCORE_COLUMNS = ("hard_skills", "experience", "cultural_fit", "communication", "growth_potential", "stability")
+
+def analysis_columns(analysis: dict) -> dict:
+    """
+    Значения колонок Match из результата анализа LLM
+    
+    Используется при создании Match: Match(..., **analysis_columns(analysis))
+    """
+    scores = analysis.get('matching_score', {})
+    
+    columns = {
+        "recommendation": analysis.get('recommendation', 'MAYBE'),
+        "confidence_level": analysis.get('confidence_level'),
+    }
+    for key in SCORE_COLUMNS:
+        try:
+            columns[key] = float(scores.get(key) or 0)
+        except (TypeError, ValueError):
+            columns[key] = 0.0
+    
+    return columns
+
+# Загруженный файл резюме; одинаковые файлы хранятся один раз (по хэшу содержимого)
+class ResumeDocument(Base):
+    __tablename__ = "resume_documents"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False, unique=True, index=True)  # sha256 файла
+    filename = Column(String, nullable=False)
+    size_bytes = Column(Integer)
+    file_bytes = Column(LargeBinary)
+    resume_id = Column(Integer, ForeignKey("resumes.id"))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    resume = relationship("Resume", back_populates="documents")
+
+# Резюме кандидата: нормализованный текст и структура от ResumeExtractor.
+# Разные файлы с одинаковым текстом (PDF и DOCX одного резюме) — одна запись
+class Resume(Base):
+    __tablename__ = "resumes"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    text_hash = Column(String(64), nullable=False, unique=True, index=True)  # sha256 нормализованного текста
+    name = Column(String)
+    text = Column(Text)  # NULL для резюме, загруженных как JSON
+    structure_json = Column(Text)  # NULL, пока структура не извлечена
+    extracted_by = Column(String)  # model_id, извлёкший структуру
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    documents = relationship("ResumeDocument", back_populates="resume")
+    matches = relationship("Match", back_populates="resume")
 
 # НОВОЕ: таблица комментариев
 class Comment(Base):
@@ -64,5 +155,112 @@ class StatusHistory(Base):
     
     match = relationship("Match", back_populates="status_history")
 
+# Кэш результатов LLM (извлечение структуры и анализ), ключ — хэш входных данных
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    cache_key = Column(String(64), nullable=False, unique=True, index=True)
+    kind = Column(String, nullable=False)  # analysis, resume, vacancy
+    model_id = Column(String, nullable=False)
+    result_json = Column(Text, nullable=False)
+    hits = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+# Метрики вызовов LLM (services/llm_metrics.py): одна строка на call_llm_json,
+# время в секундах без вложенных фаз (ожидание модели не входит в HTTP и т.п.)
+class LLMCall(Base):
+    __tablename__ = "llm_calls"
+    
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    model_id = Column(String, nullable=False, index=True)
+    backend = Column(String)  # URL узла, обработавшего запрос (последнего при переключении на другой)
+    kind = Column(String, nullable=False)  # analysis, resume, vacancy, text
+    cache_hit = Column(Boolean, default=False)
+    prompt_chars = Column(Integer, default=0)  # system prompt + user prompt
+    prompt_tokens = Column(Integer)
+    tokens_estimated = Column(Boolean, default=False)  # сервер не вернул usage
+    completion_tokens = Column(Integer)
+    gate_wait_seconds = Column(Float, default=0)  # ожидание запросов к другой модели
+    switch_seconds = Column(Float, default=0)  # /switch и ожидание готовности
+    sleep_seconds = Column(Float, default=0)  # паузы между ретраями
+    http_seconds = Column(Float, default=0)
+    http_requests = Column(Integer, default=0)
+    retries = Column(Integer, default=0)
+    parse_seconds = Column(Float, default=0)
+    parse_outcome = Column(String)  # ok, repaired, reasked, failed
+    total_seconds = Column(Float, default=0)
+    error = Column(Text)
+
+# Очередь фоновых задач анализа (переживает перезапуски Streamlit и контейнера)
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    batch_id = Column(String, nullable=False, index=True)
+    kind = Column(String, nullable=False, default="analyze_file")
+    status = Column(String, nullable=False, default="queued", index=True)  # queued, running, done, failed
+    vacancy_id = Column(Integer, ForeignKey("vacancies.id"))
+    model_key = Column(String, nullable=False)
+    filename = Column(String)
+    file_bytes = Column(LargeBinary)  # очищается после успешной обработки
+    options_json = Column(Text)  # JSON: {"combined": true, ...}
+    result_json = Column(Text)
+    error = Column(Text)
+    match_id = Column(Integer)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+# Предагрегаты для страницы аналитики: обновляются инкрементально
+# (services/analytics_rollup.py), метрики читают их вместо всех Match.
+# vacancy_id = 0 для кандидатов без вакансии (NULL не участвует в UNIQUE)
+class AnalyticsDaily(Base):
+    __tablename__ = "analytics_daily"
+    
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False, index=True)
+    vacancy_id = Column(Integer, nullable=False, default=0)
+    vacancy_title = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    recommendation = Column(String, nullable=False)
+    cnt = Column(Integer, nullable=False, default=0)
+    score_sum = Column(Float, nullable=False, default=0)
+    hard_skills_sum = Column(Float, nullable=False, default=0)
+    experience_sum = Column(Float, nullable=False, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint("day", "vacancy_id", "vacancy_title", "status", "recommendation", name="uq_analytics_daily_key"),
+    )
+
+class AnalyticsScoreBucket(Base):
+    __tablename__ = "analytics_score_buckets"
+    
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False, index=True)
+    vacancy_id = Column(Integer, nullable=False, default=0)
+    bucket = Column(Integer, nullable=False)  # номер корзины шириной SCORE_BUCKET_SIZE
+    cnt = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint("day", "vacancy_id", "bucket", name="uq_analytics_score_buckets_key"),
+    )
+
+class AnalyticsMissingSkill(Base):
+    __tablename__ = "analytics_missing_skills"
+    
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False, index=True)
+    vacancy_id = Column(Integer, nullable=False, default=0)
+    skill = Column(String, nullable=False)
+    cnt = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        UniqueConstraint("day", "vacancy_id", "skill", name="uq_analytics_missing_skills_key"),
+    )
+
 def init_db():
     Base.metadata.create_all(bind=engine)
@@ -1,10 +1,16 @@
 """Страница аналитики и статистики"""
 import streamlit as st
-from datetime import datetime, timedelta
-from db.models import SessionLocal, Match, Vacancy
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+from db.models import SessionLocal
+from services.query_cache import cached
+from utils.queries import count_all_matches
 from utils.metrics import (
+    SCORE_BUCKET_SIZE,
     calculate_funnel_metrics,
     calculate_conversion_rate,
+    get_score_summary,
+    get_score_distribution,
     get_average_scores_by_vacancy,
     get_top_missing_skills,
     get_recommendation_distribution,
@@ -20,18 +26,35 @@ from components.charts import (
     render_timeline_chart
 )
 
+@cached("matches")
+def load_analytics(date_from: Optional[datetime]) -> Dict[str, Any]:
+    """
+    Все метрики страницы одним набором запросов (результат кэшируется
+    до следующей записи в matches)
+    """
+    db = SessionLocal()
+    try:
+        funnel = calculate_funnel_metrics(db, date_from)
+        return {
+            'summary': get_score_summary(db, date_from),
+            'funnel': funnel,
+            'conversion': calculate_conversion_rate(funnel),
+            'time_stats': get_time_to_decision_stats(db, date_from),
+            'score_distribution': get_score_distribution(db, date_from),
+            'recommendations': get_recommendation_distribution(db, date_from),
+            'date_counts': get_candidates_by_date(db, days=30),
+            'vacancy_scores': get_average_scores_by_vacancy(db, date_from),
+            'top_skills': get_top_missing_skills(db, date_from, top_n=10)
+        }
+    finally:
+        db.close()
+
 def render_analytics_page():
     """Рендерит страницу аналитики"""
     
     st.title("📊 Аналитика и статистика")
     
-    # Загружаем данные
-    db = SessionLocal()
-    all_matches = db.query(Match).all()
-    vacancies = db.query(Vacancy).all()
-    db.close()
-    
-    if not all_matches:
+    if not count_all_matches():
         st.info("Нет данных для аналитики. Добавьте кандидатов.")
         return
     
@@ -46,15 +69,16 @@ def render_analytics_page():
             key="analytics_period_filter"  # ИСПРАВЛЕНО: добавлен key
         )
     
-    # Фильтруем по периоду
+    # Граница периода — начало дня, чтобы ключ кэша не менялся на каждом rerun
+    date_from = None
     if days_filter > 0:
-        cutoff_date = datetime.now() - timedelta(days=days_filter)
-        matches = [m for m in all_matches if hasattr(m, 'created_at') and m.created_at >= cutoff_date]
-    else:
-        matches = all_matches
+        date_from = datetime.combine(date.today() - timedelta(days=days_filter), datetime.min.time())
+    
+    data = load_analytics(date_from)
+    summary = data['summary']
     
     with col2:
-        st.metric("Всего кандидатов", len(matches))
+        st.metric("Всего кандидатов", summary['count'])
     
     st.divider()
     
@@ -63,10 +87,11 @@ def render_analytics_page():
     
     col1, col2, col3, col4 = st.columns(4)
     
-    avg_score = sum(m.score for m in matches) / len(matches) if matches else 0
+    avg_score = summary['avg_score']
     
-    conversion = calculate_conversion_rate(matches)
-    time_stats = get_time_to_decision_stats(matches)
+    funnel_metrics = data['funnel']
+    conversion = data['conversion']
+    time_stats = data['time_stats']
     
     with col1:
         st.metric("Средняя оценка", f"{avg_score:.1f}%")
@@ -88,26 +113,25 @@ def render_analytics_page():
     
     with col1:
         # Воронка
-        funnel_metrics = calculate_funnel_metrics(matches)
         render_funnel_chart(funnel_metrics)
         
         # Распределение оценок
-        render_score_distribution(matches)
+        render_score_distribution(data['score_distribution'], SCORE_BUCKET_SIZE)
     
     with col2:
         # Распределение решений
-        recommendations = get_recommendation_distribution(matches)
+        recommendations = data['recommendations']
         render_recommendation_pie(recommendations)
         
         # Динамика по дням
-        date_counts = get_candidates_by_date(matches, days=30)
+        date_counts = data['date_counts']
         render_timeline_chart(date_counts)
     
     st.divider()
     
     # Сравнение вакансий
     st.markdown("### 🎯 Анализ по вакансиям")
-    vacancy_scores = get_average_scores_by_vacancy(matches)
+    vacancy_scores = data['vacancy_scores']
     
     if vacancy_scores:
         render_vacancy_comparison(vacancy_scores)
@@ -129,7 +153,7 @@ def render_analytics_page():
     
     # ТОП недостающих навыков
     st.markdown("### 🎓 Анализ недостающих навыков")
-    top_skills = get_top_missing_skills(matches, top_n=10)
+    top_skills = data['top_skills']
     render_missing_skills_chart(top_skills)
     
     if top_skills:
@@ -0,0 +1,154 @@
+"""Страница метрик вызовов LLM: время по фазам, токены, ретраи, разбор JSON"""
+import streamlit as st
+from typing import Any, Dict, List, Tuple
+from services.llm_metrics import PHASE_FIELDS, PERCENTILE_SAMPLE, load_summary
+
+# Период в днях
+PERIODS = {
+    "24 часа": 1,
+    "7 дней": 7,
+    "30 дней": 30,
+}
+
+PHASE_LABELS = {
+    "gate_wait_seconds": "Ожидание модели",
+    "switch_seconds": "Переключение модели",
+    "sleep_seconds": "Паузы между ретраями",
+    "http_seconds": "HTTP",
+    "parse_seconds": "Разбор JSON",
+}
+
+OUTCOME_LABELS = {"ok": "Сразу", "repaired": "Автофикс", "reasked": "Перезапрос", "failed": "Ошибка"}
+
+def _fmt(value, digits: int = 1) -> str:
+    return "—" if value is None else f"{value:.{digits}f}"
+
+def _breakdown(groups: List[Tuple[Any, Dict[str, Any]]], label: str) -> List[Dict[str, Any]]:
+    """Строки таблицы p50/p95 в разрезе моделей, типов запросов или узлов"""
+    rows = []
+    for name, summary in groups:
+        outcomes = summary['outcomes']
+        rows.append({
+            label: name or "—",
+            "Вызовов": summary['calls'],
+            "Из кэша": summary['cache_hits'],
+            "Всего p50, с": _fmt(summary['total_seconds']['p50']),
+            "Всего p95, с": _fmt(summary['total_seconds']['p95']),
+            "HTTP p50, с": _fmt(summary['http_seconds']['p50']),
+            "HTTP p95, с": _fmt(summary['http_seconds']['p95']),
+            "Переключения, мин": _fmt(summary['switch_seconds']['sum'] / 60),
+            "Промпт p50, ток.": _fmt(summary['prompt_tokens']['p50'], 0),
+            "Ответ p50, ток.": _fmt(summary['completion_tokens']['p50'], 0),
+            "Ретраев": summary['retries'],
+            "JSON: автофикс / перезапрос / ошибка": (
+                f"{outcomes.get('repaired', 0)} / {outcomes.get('reasked', 0)} / {outcomes.get('failed', 0)}"
+            ),
+        })
+    return rows
+
+def render_llm_calls_page():
+    """Рендерит страницу метрик вызовов LLM"""
+
+    st.title("📡 Вызовы LLM")
+
+    period = st.selectbox("Период", list(PERIODS.keys()), index=1, key="llm_calls_period")
+    data = load_summary(PERIODS[period])
+    summary = data['overall']
+
+    if not summary['calls']:
+        st.info("За выбранный период вызовов LLM не было")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Вызовов", summary['calls'])
+    with col2:
+        st.metric("Из кэша", summary['cache_hits'])
+    with col3:
+        st.metric("Ошибок", summary['errors'])
+    with col4:
+        st.metric("Ретраев", summary['retries'])
+
+    st.divider()
+    st.subheader("⏱️ Куда уходит время")
+
+    total = summary['total_seconds']['sum'] or 1
+    rows = [
+        {
+            "Фаза": PHASE_LABELS[field],
+            "p50, с": _fmt(summary[field]['p50'], 2),
+            "p95, с": _fmt(summary[field]['p95'], 2),
+            "Всего, мин": _fmt(summary[field]['sum'] / 60),
+            "Доля": f"{summary[field]['sum'] / total * 100:.0f}%",
+        }
+        for field in PHASE_FIELDS
+    ]
+    rows.append({
+        "Фаза": "Прочее (кэш, промпт, запись)",
+        "p50, с": "—",
+        "p95, с": "—",
+        "Всего, мин": _fmt(summary['other_seconds'] / 60),
+        "Доля": f"{summary['other_seconds'] / total * 100:.0f}%",
+    })
+    rows.append({
+        "Фаза": "Вызов целиком",
+        "p50, с": _fmt(summary['total_seconds']['p50'], 2),
+        "p95, с": _fmt(summary['total_seconds']['p95'], 2),
+        "Всего, мин": _fmt(summary['total_seconds']['sum'] / 60),
+        "Доля": "100%",
+    })
+    st.dataframe(rows, use_container_width=True)
+    if data['sample_size'] >= PERCENTILE_SAMPLE:
+        st.caption(f"p50 / p95 — по последним {PERCENTILE_SAMPLE} вызовам за период, суммы — по всем")
+
+    st.subheader("🔤 Размер промпта и ответа")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Промпт p50 / p95, символов",
+                  f"{_fmt(summary['prompt_chars']['p50'], 0)} / {_fmt(summary['prompt_chars']['p95'], 0)}")
+    with col2:
+        st.metric("Промпт p50 / p95, токенов",
+                  f"{_fmt(summary['prompt_tokens']['p50'], 0)} / {_fmt(summary['prompt_tokens']['p95'], 0)}")
+    with col3:
+        st.metric("Ответ p50 / p95, токенов",
+                  f"{_fmt(summary['completion_tokens']['p50'], 0)} / {_fmt(summary['completion_tokens']['p95'], 0)}")
+
+    if summary['tokens_estimated']:
+        st.caption(f"Для {summary['tokens_estimated']} вызовов сервер не вернул usage — токены оценены по длине текста")
+
+    outcomes = summary['outcomes']
+    if outcomes:
+        st.caption("Разбор JSON: " + " | ".join(
+            f"{OUTCOME_LABELS.get(outcome, outcome)}: {count}" for outcome, count in outcomes.items()
+        ))
+
+    st.divider()
+    st.subheader("🤖 По моделям")
+    st.dataframe(_breakdown(data['model_id'], "Модель"), use_container_width=True)
+
+    st.subheader("📄 По типам запросов")
+    st.dataframe(_breakdown(data['kind'], "Тип"), use_container_width=True)
+
+    if len(data['backend']) > 1:
+        st.subheader("🖧 По узлам")
+        st.dataframe(_breakdown(data['backend'], "Узел"), use_container_width=True)
+
+    with st.expander("🕒 Последние вызовы"):
+        st.dataframe([
+            {
+                "Время": call['created_at'].strftime('%d.%m %H:%M:%S'),
+                "Модель": call['model_id'],
+                "Узел": call['backend'] or "",
+                "Тип": call['kind'],
+                "Кэш": "✓" if call['cache_hit'] else "",
+                "Всего, с": _fmt(call['total_seconds'], 2),
+                "HTTP, с": _fmt(call['http_seconds'], 2),
+                "Промпт, ток.": call['prompt_tokens'],
+                "Ответ, ток.": call['completion_tokens'],
+                "Ретраев": call['retries'],
+                "JSON": OUTCOME_LABELS.get(call['parse_outcome'], call['parse_outcome'] or ""),
+                "Ошибка": call['error'] or "",
+            }
+            for call in data['recent']
+        ], use_container_width=True)
@@ -0,0 +1,118 @@
+"""Матричная оценка: пул сохранённых резюме против нескольких вакансий"""
+import time
+import streamlit as st
+from config import JOB_POLL_INTERVAL, get_selected_model
+from services.job_queue import enqueue_rescore, get_batch_status
+from utils.queries import get_vacancies, get_stored_resumes, get_score_matrix
+
+def render_matrix_progress(batch_id: str) -> bool:
+    """
+    Прогресс и пропускная способность всего пакета матрицы
+
+    Returns:
+        True, если пакет ещё обрабатывается
+    """
+    status = get_batch_status(batch_id)
+    counts = status['counts']
+
+    st.progress(status['finished'] / status['total'] if status['total'] else 0)
+
+    spi = status['seconds_per_item']
+    remaining = counts['queued'] + counts['running']
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Оценено", f"{counts['done']} / {status['total']}")
+    with col2:
+        st.metric("Ошибок", counts['failed'])
+    with col3:
+        st.metric("Оценок/мин", f"{60 / spi:.1f}" if spi else "—")
+    with col4:
+        st.metric("Осталось", f"~{remaining * spi / 60:.0f} мин" if spi and remaining else "—")
+
+    if status['errors']:
+        with st.expander(f"❌ Ошибки ({len(status['errors'])})"):
+            for err in status['errors']:
+                st.error(f"{err['file']}: {err['error']}")
+
+    return status['active']
+
+def render_matrix_page():
+    """Рендерит страницу матрицы резюме × вакансии"""
+
+    st.title("🧮 Матрица резюме × вакансии")
+
+    resumes = get_stored_resumes()
+    vacancies = get_vacancies()
+
+    if not resumes or not vacancies:
+        st.info("Нужны вакансии и хотя бы одно проанализированное резюме")
+        return
+
+    resume_names = {r.id: r.name or f"Резюме {r.id}" for r in resumes}
+    vacancy_names = {v.id: f"{v.title} @ {v.company}" for v in vacancies}
+
+    all_resumes = st.checkbox(f"Все резюме ({len(resumes)})", key="matrix_all_resumes")
+    if all_resumes:
+        resume_ids = list(resume_names.keys())
+    else:
+        resume_ids = st.multiselect(
+            "Резюме",
+            list(resume_names.keys()),
+            format_func=lambda x: resume_names[x],
+            key="matrix_resumes"
+        )
+
+    vacancy_ids = st.multiselect(
+        "Вакансии",
+        list(vacancy_names.keys()),
+        format_func=lambda x: vacancy_names[x],
+        key="matrix_vacancies"
+    )
+
+    if not resume_ids or not vacancy_ids:
+        return
+
+    rescore_all = st.checkbox(
+        "Переоценить уже оценённые пары",
+        value=False,
+        help="По умолчанию в очередь ставятся только пары без оценки",
+        key="matrix_rescore_all"
+    )
+
+    st.caption(f"Матрица {len(resume_ids)} × {len(vacancy_ids)} = {len(resume_ids) * len(vacancy_ids)} оценок")
+
+    if st.button("▶️ Оценить", type="primary"):
+        batch_id = enqueue_rescore(resume_ids, vacancy_ids, get_selected_model(), skip_scored=not rescore_all)
+        if batch_id:
+            st.session_state['matrix_batch_id'] = batch_id
+        else:
+            st.info("Все пары уже оценены")
+
+    active = False
+    batch_id = st.session_state.get('matrix_batch_id')
+    if batch_id:
+        st.divider()
+        st.subheader("Прогресс")
+        active = render_matrix_progress(batch_id)
+
+    st.divider()
+    st.subheader("Оценки")
+
+    scores = get_score_matrix(tuple(resume_ids), tuple(vacancy_ids))
+    columns = {vacancy_id: f"{vacancy_names[vacancy_id]} #{vacancy_id}" for vacancy_id in vacancy_ids}
+
+    rows = []
+    for resume_id in resume_ids:
+        row = {"Кандидат": resume_names[resume_id]}
+        for vacancy_id, column in columns.items():
+            row[column] = scores.get((resume_id, vacancy_id))
+        rows.append(row)
+
+    st.dataframe(rows, use_container_width=True)
+
+    if active:
+        auto_refresh = st.checkbox("Автообновление", value=True, key="matrix_auto_refresh")
+        if auto_refresh:
+            time.sleep(JOB_POLL_INTERVAL)
+            st.rerun()
@@ -0,0 +1,248 @@
+# app/services/analytics_rollup.py
+"""Инкрементальное обслуживание предагрегатов аналитики (analytics_* таблицы)
+
+Каждая запись/удаление Match и смена статуса вызывают соответствующую функцию
+в той же сессии до commit — предагрегаты меняются в одной транзакции с данными.
+При расхождении (ручные правки БД, старые версии) — rebuild():
+
+    cd app && python -m services.analytics_rollup
+"""
+import json
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+from sqlalchemy import func, select, insert, delete, cast, true, Integer
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from db.models import (
+    SessionLocal, Match, AnalyticsDaily, AnalyticsScoreBucket, AnalyticsMissingSkill
+)
+
+# Ширина корзины гистограммы оценок (в процентах)
+SCORE_BUCKET_SIZE = 5
+_MAX_BUCKET = 100 // SCORE_BUCKET_SIZE - 1
+
+
+def _score_bucket(score: float) -> int:
+    return min(max(int((score or 0) // SCORE_BUCKET_SIZE), 0), _MAX_BUCKET)
+
+
+def _missing_skills(match: Match) -> List[str]:
+    try:
+        skills = json.loads(match.analysis_json).get('missing_skills', [])
+    except (TypeError, ValueError, AttributeError):
+        return []
+    return [str(skill) for skill in skills if skill]
+
+
+def _add_many(db: Session, model, rows: List[Tuple[Dict[str, Any], Dict[str, Any]]]):
+    """
+    Прибавляет значения к строкам предагрегата (создаёт отсутствующие)
+
+    Один upsert-запрос на все строки (executemany); строки, у которых
+    счётчик дошёл до нуля, удаляются.
+
+    Args:
+        rows: Пары (ключ, прибавляемые значения) с одинаковым набором полей
+    """
+    if not rows:
+        return
+
+    table = model.__table__
+    key_names = list(rows[0][0].keys())
+    value_names = list(rows[0][1].keys())
+
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key_names,
+        set_={name: table.c[name] + stmt.excluded[name] for name in value_names}
+    )
+    db.execute(stmt, [{**key, **values} for key, values in rows])
+
+    if any(values.get('cnt', 0) < 0 for _, values in rows):
+        db.execute(delete(table).where(table.c.cnt <= 0))
+
+
+def _add(db: Session, model, key: Dict[str, Any], values: Dict[str, Any]):
+    _add_many(db, model, [(key, values)])
+
+
+def _daily_key(match, status: str) -> Dict[str, Any]:
+    return {
+        "day": (match.created_at or datetime.utcnow()).date(),
+        "vacancy_id": match.vacancy_id or 0,
+        "vacancy_title": match.vacancy_title,
+        "status": status or 'new',
+        "recommendation": match.recommendation or 'MAYBE',
+    }
+
+
+def _apply_daily(db: Session, match: Match, status: str, sign: int):
+    _add(db, AnalyticsDaily, _daily_key(match, status), {
+        "cnt": sign,
+        "score_sum": sign * (match.score or 0),
+        "hard_skills_sum": sign * (match.hard_skills or 0),
+        "experience_sum": sign * (match.experience or 0),
+    })
+
+
+def _apply_match(db: Session, match: Match, sign: int):
+    day = (match.created_at or datetime.utcnow()).date()
+    vacancy_id = match.vacancy_id or 0
+
+    _apply_daily(db, match, match.status, sign)
+
+    _add(db, AnalyticsScoreBucket, {
+        "day": day, "vacancy_id": vacancy_id, "bucket": _score_bucket(match.score)
+    }, {"cnt": sign})
+
+    _add_many(db, AnalyticsMissingSkill, [
+        ({"day": day, "vacancy_id": vacancy_id, "skill": skill}, {"cnt": sign})
+        for skill in _missing_skills(match)
+    ])
+
+
+def on_match_added(db: Session, match: Match):
+    """Учитывает новый Match (вызывать после db.flush(), до commit)"""
+    _apply_match(db, match, +1)
+
+
+def on_match_deleted(db: Session, match: Match):
+    """Вычитает удаляемый Match (вызывать до удаления строки)"""
+    _apply_match(db, match, -1)
+
+
+def on_status_changed(db: Session, match: Match, old_status: str, new_status: str):
+    """Переносит Match между строками предагрегата по статусам"""
+    if old_status == new_status:
+        return
+    _apply_daily(db, match, old_status, -1)
+    _apply_daily(db, match, new_status, +1)
+
+
+def on_status_changed_bulk(db: Session, rows: List[Any], new_status: str):
+    """
+    Массовая смена статуса: строки группируются по ключу предагрегата,
+    на каждую группу — два upsert вместо двух на каждого кандидата
+
+    Args:
+        rows: Кандидаты со старым статусом (id, status, created_at, vacancy_id,
+              vacancy_title, recommendation, score, hard_skills, experience)
+        new_status: Новый статус
+    """
+    groups: Dict[tuple, List[float]] = {}
+    for row in rows:
+        if (row.status or 'new') == new_status:
+            continue
+        key = tuple(_daily_key(row, row.status).items())
+        sums = groups.setdefault(key, [0, 0.0, 0.0, 0.0])
+        sums[0] += 1
+        sums[1] += row.score or 0
+        sums[2] += row.hard_skills or 0
+        sums[3] += row.experience or 0
+
+    updates = []
+    for key, (cnt, score_sum, hard_skills_sum, experience_sum) in groups.items():
+        old_key = dict(key)
+        new_key = {**old_key, "status": new_status}
+        for target, sign in ((old_key, -1), (new_key, +1)):
+            updates.append((target, {
+                "cnt": sign * cnt,
+                "score_sum": sign * score_sum,
+                "hard_skills_sum": sign * hard_skills_sum,
+                "experience_sum": sign * experience_sum,
+            }))
+
+    _add_many(db, AnalyticsDaily, updates)
+
+
+def on_vacancy_matches_deleted(db: Session, vacancy_id: int):
+    """Удаление всех кандидатов вакансии — удаляем её строки предагрегатов целиком"""
+    for model in (AnalyticsDaily, AnalyticsScoreBucket, AnalyticsMissingSkill):
+        db.query(model).filter(model.vacancy_id == vacancy_id).delete(synchronize_session=False)
+
+
+def rebuild(db: Session = None) -> Dict[str, int]:
+    """
+    Пересчитывает все предагрегаты из matches (исправляет накопившиеся расхождения)
+
+    Returns:
+        Количество строк в каждой таблице предагрегатов
+    """
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        for model in (AnalyticsDaily, AnalyticsScoreBucket, AnalyticsMissingSkill):
+            db.query(model).delete(synchronize_session=False)
+
+        day = func.date(Match.created_at)
+        vacancy_id = func.coalesce(Match.vacancy_id, 0)
+
+        db.execute(insert(AnalyticsDaily).from_select(
+            ["day", "vacancy_id", "vacancy_title", "status", "recommendation",
+             "cnt", "score_sum", "hard_skills_sum", "experience_sum"],
+            select(
+                day, vacancy_id, Match.vacancy_title,
+                func.coalesce(Match.status, 'new'),
+                func.coalesce(Match.recommendation, 'MAYBE'),
+                func.count(Match.id),
+                func.sum(Match.score),
+                func.sum(func.coalesce(Match.hard_skills, 0)),
+                func.sum(func.coalesce(Match.experience, 0))
+            ).group_by(
+                day, vacancy_id, Match.vacancy_title,
+                func.coalesce(Match.status, 'new'),
+                func.coalesce(Match.recommendation, 'MAYBE')
+            )
+        ))
+
+        bucket = func.max(func.min(cast(Match.score / SCORE_BUCKET_SIZE, Integer), _MAX_BUCKET), 0)
+        db.execute(insert(AnalyticsScoreBucket).from_select(
+            ["day", "vacancy_id", "bucket", "cnt"],
+            select(day, vacancy_id, bucket, func.count(Match.id)).group_by(day, vacancy_id, bucket)
+        ))
+
+        skills = func.json_each(Match.analysis_json, '$.missing_skills').table_valued('value')
+        db.execute(insert(AnalyticsMissingSkill).from_select(
+            ["day", "vacancy_id", "skill", "cnt"],
+            select(day, vacancy_id, skills.c.value, func.count())
+            .select_from(Match)
+            .join(skills, true())
+            .where(func.json_valid(Match.analysis_json), skills.c.value.isnot(None), skills.c.value != '')
+            .group_by(day, vacancy_id, skills.c.value)
+        ))
+
+        db.commit()
+
+        counts = {
+            model.__tablename__: db.query(func.count(model.id)).scalar()
+            for model in (AnalyticsDaily, AnalyticsScoreBucket, AnalyticsMissingSkill)
+        }
+        print(f"📊 Предагрегаты аналитики пересчитаны: {counts}")
+        return counts
+    finally:
+        if own_session:
+            db.close()
+
+
+_built_checked = False
+
+
+def ensure_built():
+    """Первичное заполнение предагрегатов для БД, созданной до их появления (раз на процесс)"""
+    global _built_checked
+    if _built_checked:
+        return
+    _built_checked = True
+
+    db = SessionLocal()
+    try:
+        if db.query(AnalyticsDaily.id).first() is None and db.query(Match.id).first() is not None:
+            rebuild(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    rebuild()
@@ -0,0 +1,132 @@
+# app/services/batch_analyzer.py
+"""Анализ одного резюме под вакансию: извлечение структуры, оценка, сохранение"""
+import json
+from typing import Dict, Any, Optional
+
+from db.models import SessionLocal, Match, analysis_columns
+from services.llm_client import get_llm_client
+from services.document_parser import ResumeExtractor
+from services.analytics_rollup import on_match_added
+from services.query_cache import invalidate
+from services.resume_store import get_resume, get_structure, store_structure
+from services import prescreen
+
+
+def save_match(
+    resume: Dict[str, Any],
+    analysis: Dict[str, Any],
+    fallback_name: str,
+    vacancy_id: int,
+    vacancy_title: str,
+    resume_id: Optional[int] = None,
+    prescore: Optional[float] = None
+) -> int:
+    """Записывает Match (с предагрегатами аналитики) и возвращает его ID"""
+    db = SessionLocal()
+    try:
+        match = Match(
+            resume_name=resume.get('name', fallback_name),
+            vacancy_id=vacancy_id,
+            vacancy_title=vacancy_title,
+            score=analysis['matching_score']['overall'],
+            analysis_json=json.dumps(analysis, ensure_ascii=False),
+            status='new',
+            resume_id=resume_id,
+            prescore=prescore,
+            **analysis_columns(analysis)
+        )
+        db.add(match)
+        db.flush()
+        on_match_added(db, match)
+        db.commit()
+        match_id = match.id
+    finally:
+        db.close()
+    
+    invalidate("matches")
+    return match_id
+
+
+def analyze_resume_text(
+    text: str,
+    filename: str,
+    vacancy_id: int,
+    vacancy_title: str,
+    vacancy_data: Dict[str, Any],
+    model_key: str,
+    combined: bool = False,
+    resume_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    LLM-этап для одного резюме и запись Match в БД
+
+    Args:
+        text: Текст резюме (уже распарсенный)
+        filename: Имя файла — фоллбэк для имени кандидата
+        vacancy_id: ID вакансии
+        vacancy_title: Название вакансии
+        vacancy_data: Вакансия в виде {title, company, requirements}
+        model_key: Ключ модели из AVAILABLE_MODELS
+        combined: Один запрос на резюме (извлечение + оценка) вместо двух
+        resume_id: Сохранённое резюме (services/resume_store.py); если структура
+            уже извлечена, вызывается только analyze_resume
+
+    Returns:
+        Словарь {name, score, prescore, match_id}
+    """
+    llm = get_llm_client(model_key)
+
+    resume = get_structure(resume_id) if resume_id else None
+
+    if resume is not None:
+        analysis = llm.analyze_resume(resume, vacancy_data)
+    else:
+        if combined:
+            result = llm.extract_and_analyze(text, vacancy_data)
+            resume = ResumeExtractor.apply_name_fallback(result['resume'])
+            analysis = result['analysis']
+        else:
+            resume = ResumeExtractor.extract_resume_structure(text, llm)
+            analysis = llm.analyze_resume(resume, vacancy_data)
+
+        if resume_id:
+            store_structure(resume_id, resume, llm._get_model_config()['model_id'])
+
+    prescore = prescreen.prescore(text, vacancy_data.get('requirements', {}), resume)
+    match_id = save_match(resume, analysis, filename, vacancy_id, vacancy_title, resume_id, prescore)
+
+    return {
+        "name": resume.get('name', 'Unknown'),
+        "score": analysis['matching_score']['overall'],
+        "prescore": prescore,
+        "match_id": match_id
+    }
+
+
+def rescore_resume(
+    resume_id: int,
+    vacancy_id: int,
+    vacancy_title: str,
+    vacancy_data: Dict[str, Any],
+    model_key: str
+) -> Dict[str, Any]:
+    """
+    Оценка сохранённого резюме под вакансию без парсинга и извлечения структуры
+
+    Returns:
+        Словарь {name, score, prescore, match_id}
+    """
+    text, resume = get_resume(resume_id)
+    if resume is None:
+        raise ValueError(f"У резюме {resume_id} нет извлечённой структуры")
+
+    analysis = get_llm_client(model_key).analyze_resume(resume, vacancy_data)
+    prescore = prescreen.prescore(text, vacancy_data.get('requirements', {}), resume)
+    match_id = save_match(resume, analysis, 'Unknown', vacancy_id, vacancy_title, resume_id, prescore)
+
+    return {
+        "name": resume.get('name', 'Unknown'),
+        "score": analysis['matching_score']['overall'],
+        "prescore": prescore,
+        "match_id": match_id
+    }
@@ -1,47 +1,91 @@
 import io
 import json
 import re
+import time
 from pypdf import PdfReader
 from docx import Document
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional
+from config import PROMPT_TAIL
+from services.text_compactor import prepare_resume_text, prepare_vacancy_text
 
 class DocumentParser:
     """Парсер PDF и DOCX документов"""
 
     @staticmethod
-    def parse_pdf(file_bytes: bytes) -> str:
+    def _check_deadline(deadline: Optional[float]):
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError("превышено время парсинга")
+
+    @classmethod
+    def iter_pdf_pages(
+        cls,
+        file_bytes: bytes,
+        max_pages: Optional[int] = None,
+        deadline: Optional[float] = None
+    ) -> Iterator[str]:
+        """Текст PDF постранично (не больше max_pages, до deadline по time.monotonic)"""
+        pdf = PdfReader(io.BytesIO(file_bytes))
+        for number, page in enumerate(pdf.pages):
+            if max_pages is not None and number >= max_pages:
+                break
+            cls._check_deadline(deadline)
+            yield page.extract_text() or ""
+
+    @classmethod
+    def iter_docx_paragraphs(cls, file_bytes: bytes, deadline: Optional[float] = None) -> Iterator[str]:
+        """Непустые абзацы DOCX"""
+        doc = Document(io.BytesIO(file_bytes))
+        for para in doc.paragraphs:
+            cls._check_deadline(deadline)
+            if para.text.strip():
+                yield para.text
+
+    @classmethod
+    def parse_pdf(cls, file_bytes: bytes, max_pages: Optional[int] = None, deadline: Optional[float] = None) -> str:
         """Извлекает текст из PDF"""
         try:
-            pdf = PdfReader(io.BytesIO(file_bytes))
-            text = ""
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+            return "\n".join(cls.iter_pdf_pages(file_bytes, max_pages, deadline)).strip()
         except Exception as e:
             raise ValueError(f"Ошибка парсинга PDF: {str(e)}")
 
-    @staticmethod
-    def parse_docx(file_bytes: bytes) -> str:
+    @classmethod
+    def parse_docx(cls, file_bytes: bytes, deadline: Optional[float] = None) -> str:
         """Извлекает текст из DOCX"""
         try:
-            doc = Document(io.BytesIO(file_bytes))
-            text = "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
-            return text.strip()
+            return "\n".join(cls.iter_docx_paragraphs(file_bytes, deadline)).strip()
         except Exception as e:
             raise ValueError(f"Ошибка парсинга DOCX: {str(e)}")
 
     @classmethod
-    def parse_file(cls, file_bytes: bytes, filename: str) -> str:
+    def parse_file(
+        cls,
+        file_bytes: bytes,
+        filename: str,
+        max_pages: Optional[int] = None,
+        deadline: Optional[float] = None
+    ) -> str:
         """Определяет тип файла и парсит"""
         if filename.lower().endswith('.pdf'):
-            return cls.parse_pdf(file_bytes)
+            return cls.parse_pdf(file_bytes, max_pages, deadline)
         elif filename.lower().endswith('.docx'):
-            return cls.parse_docx(file_bytes)
+            return cls.parse_docx(file_bytes, deadline)
         elif filename.lower().endswith('.txt'):
             return file_bytes.decode('utf-8')
         else:
             raise ValueError(f"Неподдерживаемый формат: {filename}")
 
+def _parse_llm_json(response: str) -> Dict[str, Any]:
+    """Очищает ответ LLM от markdown и парсит JSON"""
+    clean = response.strip()
+    if clean.startswith("```json"):
+        clean = clean[7:]
+    if clean.startswith("```"):
+        clean = clean[3:]
+    if clean.endswith("```"):
+        clean = clean[:-3]
+
+    return json.loads(clean.strip())
+
 class VacancyExtractor:
     """Извлекает структурированные данные вакансии через LLM"""
 
@@ -49,11 +93,9 @@ class VacancyExtractor:
     def extract_vacancy_structure(text: str, llm_client) -> Dict[str, Any]:
         """Структурирует текст вакансии через LLM"""
 
+        # Постоянная часть промпта идёт до текста — см. PROMPT_TAIL в config.py
         prompt = f"""Извлеки из текста вакансии структурированные данные.
 
-Текст вакансии:
-{text[:2000]}
-
 Верни ТОЛЬКО JSON в таком формате:
 {{
   "title": "Название должности",
@@ -66,21 +108,17 @@ class VacancyExtractor:
   "responsibilities": "Краткое описание обязанностей"
 }}
 
-Если какое-то поле не найдено, используй значения по умолчанию."""
+Если какое-то поле не найдено, используй значения по умолчанию.
 
-        # Используем call_llm
-        response = llm_client.call_llm(prompt, temperature=0.1)
+Текст вакансии:
+{prepare_vacancy_text(text)}
 
-        # Очищаем от markdown
-        clean = response.strip()
-        if clean.startswith("```json"):
-            clean = clean[7:]
-        if clean.startswith("```"):
-            clean = clean[3:]
-        if clean.endswith("```"):
-            clean = clean[:-3]
+{PROMPT_TAIL}"""
 
-        return json.loads(clean.strip())
+        # Используем call_llm_json (с кэшем)
+        return llm_client.call_llm_json(
+            prompt, kind="vacancy", temperature=0.1, parse=_parse_llm_json
+        )
 
 class ResumeExtractor:
     """Извлекает структурированные данные резюме через LLM"""
@@ -89,11 +127,9 @@ class ResumeExtractor:
     def extract_resume_structure(text: str, llm_client) -> Dict[str, Any]:
         """Структурирует текст резюме через LLM"""
 
+        # Постоянная часть промпта идёт до текста — см. PROMPT_TAIL в config.py
         prompt = f"""Извлеки из текста резюме структурированные данные.
 
-Текст резюме:
-{text[:2500]}
-
 Верни ТОЛЬКО JSON в таком формате:
 {{
   "name": "Фамилия Имя Отчество",
@@ -125,23 +161,23 @@ class ResumeExtractor:
 - Если возраст прямо указан - используй его
 - Если указана дата рождения - вычисли возраст (сейчас 2026 год)
 - Если ФИО не найдено, используй "Кандидат (возраст, пол)" например "Кандидат (31 год, М)"
-"""
 
-        # Используем call_llm
-        response = llm_client.call_llm(prompt, temperature=0.1)
+Текст резюме:
+{prepare_resume_text(text)}
 
-        # Очищаем от markdown
-        clean = response.strip()
-        if clean.startswith("```json"):
-            clean = clean[7:]
-        if clean.startswith("```"):
-            clean = clean[3:]
-        if clean.endswith("```"):
-            clean = clean[:-3]
+{PROMPT_TAIL}
+"""
 
-        result = json.loads(clean.strip())
+        # Используем call_llm_json (с кэшем)
+        result = llm_client.call_llm_json(
+            prompt, kind="resume", temperature=0.1, parse=_parse_llm_json
+        )
 
-        # Фоллбэк для имени
+        return ResumeExtractor.apply_name_fallback(result)
+
+    @staticmethod
+    def apply_name_fallback(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Подставляет имя-заглушку, если LLM не нашёл ФИО"""
         if not result.get('name') or result['name'] in ['N/A', 'Не указано', 'Unknown']:
             age = result.get('age', 'Н/У')
             gender = result.get('gender', 'Н/У')
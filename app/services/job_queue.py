@@ -0,0 +1,486 @@
+# app/services/job_queue.py
+"""Персистентная очередь задач анализа и фоновый пул воркеров"""
+import json
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+
+from config import JOB_WORKERS, JOB_MAX_ATTEMPTS, JOB_POLL_INTERVAL, AVAILABLE_MODELS
+from db.models import SessionLocal, Job, Match, Resume
+from services.batch_analyzer import analyze_resume_text, rescore_resume
+from services.resume_store import store_file, get_structure
+from services import parse_pool
+from services.prescreen import prescore
+from services.llm_router import get_router
+from utils.queries import get_vacancy_context
+
+# screened — прошла предварительный отбор и ждёт остальных задач пакета;
+# skipped — отсеяна предварительным отбором, в LLM не отправлялась
+JOB_STATUSES = ("queued", "running", "screened", "done", "skipped", "failed")
+
+# analyze_file — парсинг файла, извлечение и оценка; rescore — только оценка сохранённого резюме;
+# prescreen — парсинг и локальная оценка (services/prescreen.py), лучшие становятся analyze_file
+JOB_KINDS = ("analyze_file", "rescore", "prescreen")
+
+
+def enqueue_files(
+    vacancy_id: int,
+    model_key: str,
+    files: List[Tuple[str, bytes]],
+    options: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Ставит файлы резюме в очередь на анализ
+
+    Args:
+        vacancy_id: ID вакансии
+        model_key: Ключ модели из AVAILABLE_MODELS
+        files: Список пар (имя файла, содержимое)
+        options: Доп. параметры обработки (например, {"combined": True});
+            {"prefilter": {"top_k": 50, "min_score": 20}} — в LLM попадут только
+            лучшие по локальной оценке (top_k=0 — без ограничения по количеству)
+
+    Returns:
+        ID пакета (batch_id)
+    """
+    batch_id = uuid.uuid4().hex[:12]
+    options_json = json.dumps(options or {}, ensure_ascii=False)
+    kind = "prescreen" if (options or {}).get('prefilter') else "analyze_file"
+
+    db = SessionLocal()
+    try:
+        for filename, file_bytes in files:
+            db.add(Job(
+                batch_id=batch_id,
+                kind=kind,
+                status="queued",
+                vacancy_id=vacancy_id,
+                model_key=model_key,
+                filename=filename,
+                file_bytes=file_bytes,
+                options_json=options_json
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+    # Парсинг первых файлов начинается сразу и идёт параллельно с LLM-этапом
+    for filename, file_bytes in files:
+        parse_pool.prefetch(file_bytes, filename)
+
+    return batch_id
+
+
+def enqueue_rescore(
+    resume_ids: List[int],
+    vacancy_ids: List[int],
+    model_key: str,
+    skip_scored: bool = False
+) -> Optional[str]:
+    """
+    Ставит в очередь оценку сохранённых резюме под вакансии (матрица N×M)
+
+    Задачи создаются по вакансиям подряд: воркеры берут их по порядку, и все
+    резюме одной вакансии идут с одинаковым началом промпта. Модель одна на
+    пакет — переключение модели в оркестраторе оплачивается один раз.
+
+    Args:
+        resume_ids: ID резюме (services/resume_store.py)
+        vacancy_ids: ID вакансий
+        model_key: Ключ модели из AVAILABLE_MODELS
+        skip_scored: Не ставить пары (резюме, вакансия), у которых уже есть Match
+
+    Returns:
+        ID пакета (batch_id) или None, если оценивать нечего
+    """
+    batch_id = uuid.uuid4().hex[:12]
+
+    db = SessionLocal()
+    try:
+        names = dict(db.query(Resume.id, Resume.name).filter(Resume.id.in_(resume_ids)).all())
+
+        scored = set()
+        if skip_scored:
+            scored = set(db.query(Match.resume_id, Match.vacancy_id).filter(
+                Match.resume_id.in_(resume_ids),
+                Match.vacancy_id.in_(vacancy_ids)
+            ).distinct().all())
+
+        count = 0
+        for vacancy_id in vacancy_ids:
+            for resume_id in resume_ids:
+                if (resume_id, vacancy_id) in scored:
+                    continue
+                db.add(Job(
+                    batch_id=batch_id,
+                    kind="rescore",
+                    status="queued",
+                    vacancy_id=vacancy_id,
+                    model_key=model_key,
+                    filename=names.get(resume_id) or f"Резюме {resume_id}",
+                    options_json=json.dumps({"resume_id": resume_id})
+                ))
+                count += 1
+        db.commit()
+    finally:
+        db.close()
+
+    return batch_id if count else None
+
+
+def get_batch_status(batch_id: str) -> Dict[str, Any]:
+    """
+    Состояние пакета: счётчики по статусам, результаты, ошибки, пропускная способность
+    """
+    db = SessionLocal()
+    try:
+        jobs = db.query(
+            Job.id, Job.filename, Job.status, Job.result_json, Job.error,
+            Job.created_at, Job.started_at, Job.finished_at
+        ).filter(Job.batch_id == batch_id).order_by(Job.id).all()
+    finally:
+        db.close()
+
+    counts = {status: 0 for status in JOB_STATUSES}
+    results, skipped, errors = [], [], []
+
+    for job in jobs:
+        counts[job.status] = counts.get(job.status, 0) + 1
+        if job.status == "done" and job.result_json:
+            result = json.loads(job.result_json)
+            results.append({
+                "file": job.filename,
+                "name": result.get('name'),
+                "score": result.get('score'),
+                "prescore": result.get('prescore')
+            })
+        elif job.status == "skipped" and job.result_json:
+            skipped.append({"file": job.filename, "prescore": json.loads(job.result_json).get('prescore')})
+        elif job.status == "failed":
+            errors.append({"file": job.filename, "error": job.error})
+
+    total = len(jobs)
+    finished = counts["done"] + counts["failed"] + counts["skipped"]
+
+    started = [j.started_at for j in jobs if j.started_at]
+    finished_at = [j.finished_at for j in jobs if j.finished_at]
+    elapsed = (max(finished_at) - min(started)).total_seconds() if started and finished_at else 0
+
+    return {
+        "batch_id": batch_id,
+        "total": total,
+        "counts": counts,
+        "finished": finished,
+        "active": counts["queued"] + counts["running"] + counts["screened"] > 0,
+        "results": results,
+        "skipped": skipped,
+        "errors": errors,
+        "seconds_per_item": elapsed / finished if finished and elapsed else 0,
+        "created_at": jobs[0].created_at if jobs else None
+    }
+
+
+def list_batches(limit: int = 10) -> List[Dict[str, Any]]:
+    """Последние пакеты с числом задач"""
+    db = SessionLocal()
+    try:
+        rows = db.query(
+            Job.batch_id,
+            func.min(Job.created_at).label('created_at'),
+            func.count(Job.id).label('total'),
+            func.min(Job.vacancy_id).label('vacancy_id')
+        ).group_by(Job.batch_id).order_by(func.min(Job.created_at).desc()).limit(limit).all()
+    finally:
+        db.close()
+
+    return [
+        {"batch_id": r.batch_id, "created_at": r.created_at, "total": r.total, "vacancy_id": r.vacancy_id}
+        for r in rows
+    ]
+
+
+def retry_failed(batch_id: str) -> int:
+    """Возвращает упавшие задачи пакета в очередь (если файл ещё хранится)"""
+    db = SessionLocal()
+    try:
+        count = db.query(Job).filter(
+            Job.batch_id == batch_id,
+            Job.status == "failed",
+            or_(Job.file_bytes.isnot(None), Job.kind == "rescore")
+        ).update({"status": "queued", "attempts": 0, "error": None}, synchronize_session=False)
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+class JobWorker:
+    """
+    Пул потоков, забирающих задачи из таблицы jobs.
+
+    Задачи забираются условным UPDATE (status='queued' -> 'running'), поэтому
+    одну задачу не возьмут два воркера. Предпочтение отдаётся задачам под уже
+    загруженную в оркестраторе модель — пакет платит за переключение один раз.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = max(1, workers)
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+
+    def start(self):
+        self._requeue_interrupted()
+        self._release_stalled_batches()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"🧵 Запущено воркеров очереди: {self.workers}")
+
+    def stop(self):
+        self._stop.set()
+
+    @staticmethod
+    def _requeue_interrupted():
+        """Задачи, прерванные остановкой процесса, снова ставим в очередь"""
+        db = SessionLocal()
+        try:
+            count = db.query(Job).filter(Job.status == "running").update(
+                {"status": "queued"}, synchronize_session=False
+            )
+            db.commit()
+            if count:
+                print(f"♻️ Возвращено в очередь прерванных задач: {count}")
+        finally:
+            db.close()
+
+    @classmethod
+    def _release_stalled_batches(cls):
+        """
+        Пакеты, где предварительный отбор закончился, но процесс остановился
+        до _release_screened: без этого их задачи навсегда остались бы screened
+        """
+        db = SessionLocal()
+        try:
+            # Настройки отбора у всех задач пакета одинаковые — берём любые
+            batches = db.query(Job.batch_id, func.min(Job.options_json)).filter(
+                Job.status == "screened"
+            ).group_by(Job.batch_id).all()
+        finally:
+            db.close()
+
+        for batch_id, options_json in batches:
+            options = json.loads(options_json or "{}")
+            # Пакеты с незавершённым отбором _release_screened пропустит сам
+            cls._release_screened(batch_id, options.get('prefilter', {}).get('top_k') or 0)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                job_id = self._claim_next()
+            except Exception as e:
+                print(f"❌ Ошибка выборки задачи: {str(e)}")
+                job_id = None
+
+            if job_id is None:
+                self._stop.wait(JOB_POLL_INTERVAL)
+                continue
+
+            self._process(job_id)
+
+    def _claim_next(self) -> Optional[int]:
+        # Сначала задачи моделей, уже загруженных на узлах
+        active_models = get_router().preferred_models()
+        active_keys = [key for key, cfg in AVAILABLE_MODELS.items() if cfg['model_id'] in active_models]
+
+        db = SessionLocal()
+        try:
+            query = db.query(Job.id).filter(Job.status == "queued")
+
+            candidate = None
+            if active_keys:
+                candidate = query.filter(Job.model_key.in_(active_keys)).order_by(Job.id).first()
+            if candidate is None:
+                candidate = query.order_by(Job.model_key, Job.id).first()
+            if candidate is None:
+                return None
+
+            claimed = db.query(Job).filter(
+                Job.id == candidate.id,
+                Job.status == "queued"
+            ).update({
+                "status": "running",
+                "started_at": datetime.utcnow(),
+                "attempts": Job.attempts + 1
+            }, synchronize_session=False)
+            db.commit()
+
+            return candidate.id if claimed else None
+        finally:
+            db.close()
+
+    def _process(self, job_id: int):
+        # Сессию не держим открытой во время вызовов LLM: открытая транзакция
+        # SQLite блокировала бы запись для остальных воркеров и UI
+        db = SessionLocal()
+        try:
+            job = db.query(Job).filter(Job.id == job_id).first()
+            kind, filename, file_bytes, model_key = job.kind, job.filename, job.file_bytes, job.model_key
+            batch_id, vacancy_id = job.batch_id, job.vacancy_id
+            attempts = job.attempts or 0
+            options = json.loads(job.options_json or "{}")
+        finally:
+            db.close()
+
+        # Данные вакансии — из кэша запросов: в матрице N×M одна вакансия на N задач
+        vacancy_info = get_vacancy_context(vacancy_id)
+
+        update = {}
+        try:
+            if vacancy_info is None:
+                raise ValueError("Вакансия удалена")
+
+            vacancy_id, vacancy_title, vacancy_data = vacancy_info
+
+            print(f"📄 Задача {job_id} ({kind}): {filename}")
+            if kind == "prescreen":
+                update.update(self._prescreen(file_bytes, filename, vacancy_data, options))
+            else:
+                if kind == "rescore":
+                    result = rescore_resume(
+                        options['resume_id'], vacancy_id, vacancy_title, vacancy_data, model_key
+                    )
+                else:
+                    # Текст и файл сохраняются; уже загружавшийся файл не парсится повторно
+                    resume_id, text = store_file(file_bytes, filename)
+                    result = analyze_resume_text(
+                        text,
+                        filename,
+                        vacancy_id,
+                        vacancy_title,
+                        vacancy_data,
+                        model_key,
+                        combined=options.get('combined', False),
+                        resume_id=resume_id
+                    )
+
+                update.update({
+                    "status": "done",
+                    "result_json": json.dumps(result, ensure_ascii=False),
+                    "match_id": result['match_id'],
+                    "error": None,
+                    "file_bytes": None
+                })
+
+        except Exception as e:
+            print(f"❌ Задача {job_id} ({filename}): {str(e)}")
+            retry = attempts < JOB_MAX_ATTEMPTS and vacancy_info is not None
+            update.update({"status": "queued" if retry else "failed", "error": str(e)})
+
+        update["finished_at"] = datetime.utcnow()
+
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id == job_id).update(update, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+        if kind == "prescreen":
+            self._release_screened(batch_id, options['prefilter'].get('top_k') or 0)
+
+    @staticmethod
+    def _prescreen(
+        file_bytes: bytes,
+        filename: str,
+        vacancy_data: Dict[str, Any],
+        options: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Парсинг и локальная оценка; возвращает изменения задачи"""
+        resume_id, text = store_file(file_bytes, filename)
+        score = prescore(text, vacancy_data.get('requirements', {}), get_structure(resume_id))
+        result = json.dumps({"prescore": score}, ensure_ascii=False)
+
+        min_score = options['prefilter'].get('min_score') or 0
+        if score is not None and score < min_score:
+            print(f"🧹 {filename}: локальная оценка {score} < {min_score}, пропущено")
+            return {"status": "skipped", "result_json": result, "error": None, "file_bytes": None}
+
+        return {
+            "status": "screened",
+            "result_json": result,
+            "error": None,
+            "options_json": json.dumps({**options, "resume_id": resume_id, "prescore": score}, ensure_ascii=False)
+        }
+
+    @staticmethod
+    def _release_screened(batch_id: str, top_k: int):
+        """
+        Когда предварительный отбор пакета закончен, top_k лучших отправляются
+        в LLM (снова в очередь как analyze_file), остальные помечаются skipped
+
+        Обновления условные (status='screened'), поэтому одновременный вызов
+        из двух воркеров даёт тот же результат.
+        """
+        db = SessionLocal()
+        try:
+            pending = db.query(func.count(Job.id)).filter(
+                Job.batch_id == batch_id,
+                Job.kind == "prescreen",
+                Job.status.in_(("queued", "running"))
+            ).scalar()
+            if pending:
+                return
+
+            screened = db.query(Job.id, Job.options_json).filter(
+                Job.batch_id == batch_id,
+                Job.status == "screened"
+            ).all()
+            if not screened:
+                return
+
+            def rank(job):
+                score = json.loads(job.options_json).get('prescore')
+                # Без требований в вакансии оценки нет — такие резюме не отсеиваем
+                return 100 if score is None else score
+
+            ranked = sorted(screened, key=rank, reverse=True)
+            selected = ranked[:top_k] if top_k else ranked
+            rejected = ranked[len(selected):]
+
+            db.query(Job).filter(
+                Job.id.in_([job.id for job in selected]),
+                Job.status == "screened"
+            ).update(
+                # Попытка, ушедшая на предварительный отбор, не съедает ретрай LLM
+                {"status": "queued", "kind": "analyze_file", "attempts": 0},
+                synchronize_session=False
+            )
+
+            if rejected:
+                db.query(Job).filter(
+                    Job.id.in_([job.id for job in rejected]),
+                    Job.status == "screened"
+                ).update({"status": "skipped", "file_bytes": None}, synchronize_session=False)
+
+            db.commit()
+            print(f"🧹 Пакет {batch_id}: в LLM {len(selected)}, отсеяно по top-K {len(rejected)}")
+        finally:
+            db.close()
+
+
+_worker: Optional[JobWorker] = None
+_worker_lock = threading.Lock()
+
+
+def start_worker() -> JobWorker:
+    """Запускает пул воркеров один раз на процесс (повторные вызовы при rerun — no-op)"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = JobWorker()
+            _worker.start()
+        return _worker
@@ -0,0 +1,141 @@
+# app/services/json_stream.py
+"""Инкрементальный разбор JSON из потокового ответа LLM"""
+import json
+import re
+from typing import Dict, Any, Optional
+
+# Поля, которые показываем пользователю до окончания генерации
+PARTIAL_NUMBER_FIELDS = ('overall', 'hard_skills', 'experience')
+PARTIAL_STRING_FIELDS = ('recommendation', 'confidence_level')
+
+
+class IncrementalJSONParser:
+    """
+    Принимает ответ LLM кусками и отслеживает границы верхнеуровневого JSON-объекта.
+
+    - пропускает блоки <think>...</think> reasoning-моделей;
+    - учитывает строки и экранирование, поэтому скобки внутри значений не мешают;
+    - как только объект закрылся и парсится — сообщает, что генерацию можно оборвать;
+    - если первый объект битый, он и остаётся результатом (для автофикса) —
+      следующие объекты в ответе (например, примеры) не подменяют его;
+    - по ходу генерации достаёт уже готовые скалярные поля (например, overall).
+    """
+
+    def __init__(self):
+        self.raw = ""           # весь полученный текст
+        self.json_start = -1    # позиция '{' верхнего уровня в raw
+        self.result_text: Optional[str] = None
+        self.complete = False
+
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_think = False
+        self._partial: Dict[str, Any] = {}
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Добавляет очередной кусок ответа
+
+        Returns:
+            True, если верхнеуровневый JSON-объект закрылся (complete — если он
+            ещё и парсится); дальнейший текст ответа не нужен
+        """
+        if self.result_text is not None or not chunk:
+            return self.result_text is not None
+
+        self.raw += chunk
+        self._scan()
+        return self.result_text is not None
+
+    def _scan(self):
+        raw = self.raw
+
+        while self._pos < len(raw):
+            if self._in_think:
+                end = raw.find('</think>', self._pos)
+                if end == -1:
+                    # Хвост может оказаться началом '</think>' — дочитаем позже
+                    self._pos = max(self._pos, len(raw) - len('</think>'))
+                    return
+                self._in_think = False
+                self._pos = end + len('</think>')
+                continue
+
+            ch = raw[self._pos]
+
+            if self.json_start == -1:
+                if raw.startswith('<think>', self._pos):
+                    self._in_think = True
+                    self._pos += len('<think>')
+                    continue
+                if ch == '<' and '<think>'.startswith(raw[self._pos:]):
+                    # Незаконченный тег в конце куска
+                    return
+                if ch == '{':
+                    self.json_start = self._pos
+                    self._depth = 1
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == '{' or ch == '[':
+                self._depth += 1
+            elif ch == '}' or ch == ']':
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = raw[self.json_start:self._pos + 1]
+                    self._pos += 1
+                    if self._try_complete(candidate):
+                        return
+                    continue
+
+            self._pos += 1
+
+    def _try_complete(self, candidate: str) -> bool:
+        self.result_text = candidate
+        try:
+            json.loads(candidate)
+        except json.JSONDecodeError:
+            # Объект закрылся, но он битый — отдаём его обычному парсеру с автофиксом,
+            # а не ищем дальше: следующий объект в ответе может оказаться примером
+            return True
+
+        self.complete = True
+        return True
+
+    def partial_fields(self) -> Dict[str, Any]:
+        """Скалярные поля, которые уже полностью сгенерированы"""
+        if self.json_start == -1:
+            return dict(self._partial)
+
+        body = self.raw[self.json_start:]
+
+        for key in PARTIAL_NUMBER_FIELDS:
+            if key not in self._partial:
+                # Число считается готовым, когда после него идёт разделитель
+                m = re.search(rf'"{key}"\s*:\s*(-?\d+(?:\.\d+)?)\s*[,}}\n]', body)
+                if m:
+                    value = float(m.group(1))
+                    self._partial[key] = int(value) if value.is_integer() else value
+
+        for key in PARTIAL_STRING_FIELDS:
+            if key not in self._partial:
+                m = re.search(rf'"{key}"\s*:\s*"([^"\\]*)"', body)
+                if m:
+                    self._partial[key] = m.group(1)
+
+        return dict(self._partial)
+
+    def text(self) -> str:
+        """Текст для финального парсинга: первый объект (готовый или битый) или весь ответ"""
+        return self.result_text if self.result_text is not None else self.raw
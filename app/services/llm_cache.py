@@ -0,0 +1,176 @@
+# app/services/llm_cache.py
+"""Персистентный кэш результатов LLM с вытеснением по TTL и LRU"""
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from config import LLM_CACHE_TTL_HOURS, LLM_CACHE_MAX_ENTRIES
+from db.models import SessionLocal, LLMCacheEntry
+
+# Вытеснение по размеру запускаем не на каждую запись, а раз в N записей
+EVICT_EVERY_N_PUTS = 50
+
+_stats = {"hits": 0, "misses": 0, "puts": 0}
+_stats_lock = threading.Lock()
+
+
+def make_cache_key(
+    kind: str,
+    content: str,
+    model_id: str,
+    system_prompt: str,
+    hr_guidelines: str,
+    temperature: float
+) -> str:
+    """
+    Строит ключ кэша по содержимому запроса
+
+    Args:
+        kind: Тип результата (analysis, resume, vacancy)
+        content: Текст промпта (в нём уже есть текст резюме / вакансии)
+        model_id: ID модели
+        system_prompt: Текущий system prompt
+        hr_guidelines: Текущие HR guidelines
+        temperature: Температура генерации
+    """
+    h = hashlib.sha256()
+    for part in (kind, model_id, f"{temperature:.3f}", system_prompt, hr_guidelines, content):
+        h.update(part.encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+        return _stats[name]
+
+
+def get(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Возвращает закэшированный результат или None"""
+    db = SessionLocal()
+    try:
+        entry = db.query(LLMCacheEntry).filter(LLMCacheEntry.cache_key == cache_key).first()
+
+        if entry is None:
+            _count("misses")
+            return None
+
+        if entry.created_at < datetime.utcnow() - timedelta(hours=LLM_CACHE_TTL_HOURS):
+            db.delete(entry)
+            db.commit()
+            _count("misses")
+            return None
+
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_used_at = datetime.utcnow()
+        result = json.loads(entry.result_json)
+        db.commit()
+
+        _count("hits")
+        return result
+    except Exception as e:
+        # Кэш не должен ломать анализ
+        print(f"⚠️ Ошибка чтения кэша LLM: {str(e)}")
+        db.rollback()
+        _count("misses")
+        return None
+    finally:
+        db.close()
+
+
+def put(cache_key: str, kind: str, model_id: str, result: Dict[str, Any]):
+    """Сохраняет результат в кэш"""
+    db = SessionLocal()
+    try:
+        entry = db.query(LLMCacheEntry).filter(LLMCacheEntry.cache_key == cache_key).first()
+        now = datetime.utcnow()
+
+        if entry is None:
+            entry = LLMCacheEntry(cache_key=cache_key, kind=kind, model_id=model_id, hits=0)
+            db.add(entry)
+
+        entry.result_json = json.dumps(result, ensure_ascii=False)
+        entry.created_at = now
+        entry.last_used_at = now
+        db.commit()
+    except Exception as e:
+        print(f"⚠️ Ошибка записи в кэш LLM: {str(e)}")
+        db.rollback()
+        return
+    finally:
+        db.close()
+
+    if _count("puts") % EVICT_EVERY_N_PUTS == 0:
+        evict()
+
+
+def evict() -> int:
+    """
+    Удаляет просроченные записи и самые давно использованные сверх лимита
+
+    Returns:
+        Количество удалённых записей
+    """
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(hours=LLM_CACHE_TTL_HOURS)
+        removed = db.query(LLMCacheEntry).filter(
+            LLMCacheEntry.created_at < cutoff
+        ).delete(synchronize_session=False)
+
+        total = db.query(LLMCacheEntry).count()
+        if total > LLM_CACHE_MAX_ENTRIES:
+            stale_ids = [
+                row.id for row in db.query(LLMCacheEntry.id)
+                .order_by(LLMCacheEntry.last_used_at.asc())
+                .limit(total - LLM_CACHE_MAX_ENTRIES)
+            ]
+            removed += db.query(LLMCacheEntry).filter(
+                LLMCacheEntry.id.in_(stale_ids)
+            ).delete(synchronize_session=False)
+
+        db.commit()
+        return removed
+    except Exception as e:
+        # Очистка вызывается из put() — не должна ломать уже готовый анализ
+        print(f"⚠️ Ошибка очистки кэша LLM: {str(e)}")
+        db.rollback()
+        return 0
+    finally:
+        db.close()
+
+
+def clear() -> int:
+    """Полностью очищает кэш"""
+    db = SessionLocal()
+    try:
+        removed = db.query(LLMCacheEntry).delete(synchronize_session=False)
+        db.commit()
+        return removed
+    except Exception as e:
+        # Очистка вызывается из put() — не должна ломать уже готовый анализ
+        print(f"⚠️ Ошибка очистки кэша LLM: {str(e)}")
+        db.rollback()
+        return 0
+    finally:
+        db.close()
+
+
+def get_stats() -> Dict[str, Any]:
+    """Счётчики попаданий/промахов в этом процессе и размер кэша"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = (stats["hits"] / lookups * 100) if lookups else 0
+
+    db = SessionLocal()
+    try:
+        stats["entries"] = db.query(LLMCacheEntry).count()
+    finally:
+        db.close()
+
+    return stats
@@ -1,62 +1,411 @@
 # app/services/llm_client.py
+import asyncio
+import functools
 import requests
+import httpx
 import json
 import time
 import re
-from typing import Dict, Any
+import threading
+import weakref
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List, Optional, Callable
+from services import llm_cache, llm_metrics, schemas
+from services.llm_router import Backend, BackendError, LLMRouter, NoBackendAvailable, get_router
+from services.json_stream import IncrementalJSONParser
+from services.text_compactor import prepare_resume_text, prepare_vacancy_text
 from config import (
-    LLM_MANAGER_URL,
-    LLM_API_KEY,
+    LLM_BACKENDS,
+    LLM_CACHE_ENABLED,
+    LLM_HTTP_POOL_SIZE,
+    LLM_ASYNC_CONCURRENCY,
+    LLM_STREAMING,
+    LLM_STRUCTURED_OUTPUT,
+    MODEL_READY_TIMEOUT,
+    MODEL_READY_POLL_INTERVAL,
     load_system_prompt,
     load_hr_guidelines,
+    PROMPT_TAIL,
     AVAILABLE_MODELS,
     get_selected_model
 )
 
+# Формат ответа анализа резюме (общий для analyze_resume и extract_and_analyze)
+ANALYSIS_JSON_FORMAT = """{
+    "matching_score": {
+        "overall": <число 0-100>,
+        "hard_skills": <число 0-100>,
+        "hard_skills_reasoning": "<объяснение оценки БЕЗ переносов строк>",
+        "experience": <число 0-100>,
+        "experience_reasoning": "<объяснение оценки БЕЗ переносов строк>",
+        "cultural_fit": <число 0-100>,
+        "cultural_fit_reasoning": "<объяснение БЕЗ переносов строк>",
+        "communication": <число 0-100>,
+        "communication_reasoning": "<объяснение БЕЗ переносов строк>",
+        "growth_potential": <число 0-100>,
+        "growth_potential_reasoning": "<объяснение БЕЗ переносов строк>",
+        "stability": <число 0-100>,
+        "stability_reasoning": "<объяснение БЕЗ переносов строк>"
+    },
+    "summary": "<краткий вывод БЕЗ переносов строк>",
+    "strengths": ["сильная сторона 1", "сильная сторона 2"],
+    "weaknesses": ["слабая сторона 1", "слабая сторона 2"],
+    "missing_skills": ["недостающий навык 1", "недостающий навык 2"],
+    "red_flags": ["риск 1", "риск 2"],
+    "recommendation": "YES|NO|MAYBE",
+    "confidence_level": "HIGH|MEDIUM|LOW",
+    "interview_questions": ["вопрос 1", "вопрос 2", "вопрос 3"],
+    "next_steps": ["шаг 1", "шаг 2"],
+    "salary_expectation_fit": "MATCH|BELOW|ABOVE|UNCLEAR",
+    "availability": "IMMEDIATE|NOTICE_PERIOD|UNCLEAR"
+}"""
+
+# Формат структуры резюме (совпадает с ResumeExtractor)
+RESUME_JSON_FORMAT = """{
+    "name": "Фамилия Имя Отчество",
+    "age": 30,
+    "gender": "М|Ж|Не указано",
+    "email": "email@example.com",
+    "phone": "+7 999 123-45-67",
+    "skills": ["навык1", "навык2"],
+    "experience": [{"company": "Компания", "position": "Должность", "start_date": "2020-01", "end_date": "2023-12", "description": "Кратко"}],
+    "education": [{"institution": "ВУЗ", "degree": "Степень", "year": "2019"}]
+}"""
+
+JSON_OUTPUT_RULES = """КРИТИЧЕСКИ ВАЖНО:
+1. Верни ТОЛЬКО валидный JSON
+2. НЕ добавляй текст ДО или ПОСЛЕ JSON
+3. НЕ используй комментарии // или /* */
+4. Все строки в двойных кавычках
+5. Все ключи в двойных кавычках
+6. НЕ используй переносы строк внутри строковых значений - пиши весь текст в одну строку
+7. Если текст длинный - сокращай, но НЕ переноси на новую строку"""
+
+
+def _is_backend_failure(error: Exception) -> bool:
+    """Сбой узла (а не запроса): стоит попробовать другой узел и учесть в circuit breaker"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, httpx.TransportError)):
+        return True
+    return isinstance(error, BackendError) and error.status_code >= 500
+
+
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Общая для процесса HTTP-сессия с пулом keep-alive соединений к узлам LLM"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=max(4, len(LLM_BACKENDS)), pool_maxsize=LLM_HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _http_session = session
+        return _http_session
+
+
+# httpx.AsyncClient и семафор привязаны к event loop, поэтому храним их по loop
+_async_resources = weakref.WeakKeyDictionary()
+
+
+async def _client_lifetime(client: httpx.AsyncClient):
+    """
+    Закрывает клиент при остановке event loop: asyncio.run() перед закрытием
+    loop вызывает shutdown_asyncgens(), и finally выполняется внутри loop
+    """
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+async def _get_async_resources():
+    loop = asyncio.get_running_loop()
+    resources = _async_resources.get(loop)
+    if resources is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_HTTP_POOL_SIZE,
+                max_keepalive_connections=LLM_HTTP_POOL_SIZE
+            ),
+            timeout=240
+        )
+        lifetime = _client_lifetime(client)
+        await lifetime.__anext__()
+        # Ссылка на генератор хранится вместе с клиентом, иначе его финализирует сборщик мусора
+        resources = (client, asyncio.Semaphore(max(1, LLM_ASYNC_CONCURRENCY)), lifetime)
+        _async_resources[loop] = resources
+    return resources
+
+
+async def _acquire_async(backend: Backend, model_id: str, switch):
+    """
+    backend.acquire в потоке; если задачу отменили, пока поток ждёт слот,
+    слот всё равно будет занят — освобождаем его, когда поток завершится
+    """
+    acquiring = asyncio.ensure_future(asyncio.to_thread(backend.acquire, model_id, switch))
+    try:
+        await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        def release_late(future):
+            if not future.cancelled() and future.exception() is None:
+                backend.release()
+
+        acquiring.add_done_callback(release_late)
+        raise
+
+
+@functools.lru_cache(maxsize=64)
+def _analysis_prompt_head(hr_guidelines: str, vacancy_json: str) -> str:
+    """
+    Начало промпта анализа (инструкция, guidelines, формат, вакансия) — строится
+    один раз на вакансию и совпадает байт в байт для всех резюме под неё
+    """
+    vacancy_text = json.dumps(json.loads(vacancy_json), ensure_ascii=False, indent=2)
+    return f"""
+Проанализируй резюме кандидата относительно требований вакансии.
+
+HR Guidelines:
+{hr_guidelines}
+
+Верни результат СТРОГО в формате JSON (без markdown блоков, без комментариев):
+{ANALYSIS_JSON_FORMAT}
+
+{JSON_OUTPUT_RULES}
+
+Вакансия:
+{vacancy_text}
+"""
+
+
 class LLMClient:
-    def __init__(self):
-        self.base_url = LLM_MANAGER_URL
-        self.api_key = LLM_API_KEY
-        self.system_prompt = load_system_prompt()
-        self.hr_guidelines = load_hr_guidelines()
+    def __init__(
+        self,
+        model_key: Optional[str] = None,
+        use_cache: bool = LLM_CACHE_ENABLED,
+        structured_output: bool = LLM_STRUCTURED_OUTPUT,
+        router: Optional[LLMRouter] = None
+    ):
+        # model_key задаётся явно, когда клиент работает вне потока Streamlit
+        # (там нет session_state) — например, в пуле пакетного анализа
+        self.model_key = model_key
+        self.use_cache = use_cache
+        # Отправлять JSON Schema в response_format и валидировать ответ по ней
+        self.structured_output = structured_output
+        # usage последнего ответа (токены) — отдельно для каждого потока
+        self._local = threading.local()
+        # Пул узлов инференса (по умолчанию — общий для процесса, из LLM_BACKENDS)
+        self.router = router or get_router()
+
+    @property
+    def system_prompt(self) -> str:
+        # Файл перечитывается только при изменении, поэтому клиент можно переиспользовать
+        return load_system_prompt()
+
+    @property
+    def hr_guidelines(self) -> str:
+        return load_hr_guidelines()
 
     def _get_model_config(self):
         """Получает конфигурацию текущей выбранной модели"""
-        model_key = get_selected_model()
+        model_key = self.model_key or get_selected_model()
         return AVAILABLE_MODELS.get(model_key, AVAILABLE_MODELS['a-vibe'])
 
-    def _switch_model(self, model_id: str):
-        """Переключает активную модель в оркестраторе"""
-        try:
-            url = f"{self.base_url}/switch/{model_id}"
-            headers = {"Authorization": f"Bearer {self.api_key}"}
+    def _switch_model(self, model_id: str, backend: Backend):
+        """Переключает активную модель в оркестраторе узла"""
+        with llm_metrics.timed("switch_seconds"):
+            try:
+                url = f"{backend.url}/switch/{model_id}"
+                headers = {"Authorization": f"Bearer {backend.api_key}"}
 
-            print(f"🔄 Переключаюсь на модель {model_id}...")
-            response = requests.post(url, headers=headers, timeout=10)
-            response.raise_for_status()
+                print(f"🔄 Переключаюсь на модель {model_id} ({backend.url})...")
+                response = get_http_session().post(url, headers=headers, timeout=10)
+                response.raise_for_status()
             
-            switch_data = response.json()
-            print(f"✓ Ответ switch: {switch_data}")
+                switch_data = response.json()
+                print(f"✓ Ответ switch: {switch_data}")
+
+                return self._wait_until_ready(model_id, backend)
+
+            except Exception as e:
+                print(f"❌ Ошибка переключения модели: {str(e)}")
+                return False
+
+    def _wait_until_ready(self, model_id: str, backend: Backend) -> bool:
+        """
+        Опрашивает /status, пока модель не будет загружена (или не истечёт таймаут)
+
+        Если оркестратор не поддерживает /status (404 и другие 4xx) или отвечает
+        в непонятном формате, ждём фиксированную паузу, как раньше, и считаем
+        модель загруженной — иначе каждый запрос переключал бы её заново.
+        """
+        url = f"{backend.url}/status"
+        headers = {"Authorization": f"Bearer {backend.api_key}"}
+        started = time.time()
+
+        print(f"⏳ Ждём загрузки модели {model_id} (до {MODEL_READY_TIMEOUT:.0f} сек)...")
+        while time.time() - started < MODEL_READY_TIMEOUT:
+            try:
+                response = get_http_session().get(url, headers=headers, timeout=5)
+                if response.status_code == 200:
+                    ready = self._is_model_ready(response.json(), model_id)
+                    if ready is None:
+                        return self._wait_fixed(model_id, "ответ /status не распознан")
+                    if ready:
+                        print(f"✓ Модель {model_id} готова за {time.time() - started:.1f} сек")
+                        return True
+                elif 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                    # Повторный опрос ничего не изменит
+                    return self._wait_fixed(model_id, f"/status вернул HTTP {response.status_code}")
+            except ValueError:
+                return self._wait_fixed(model_id, "ответ /status не JSON")
+            except requests.exceptions.RequestException:
+                pass
+            time.sleep(MODEL_READY_POLL_INTERVAL)
+
+        print(f"⚠️ Модель {model_id} не подтвердила готовность за {MODEL_READY_TIMEOUT:.0f} сек")
+        return False
+
+    @staticmethod
+    def _wait_fixed(model_id: str, reason: str) -> bool:
+        """Готовность не проверить — фиксированная пауза (для 14B моделей значительно дольше)"""
+        wait_time = 15 if '14b' in model_id.lower() else 4
+        print(f"⏳ {reason}, ждём загрузки модели {wait_time} сек...")
+        time.sleep(wait_time)
+        return True
 
-            return True
+    @staticmethod
+    def _is_model_ready(status: Any, model_id: str) -> Optional[bool]:
+        """
+        Проверяет ответ /status: загружена нужная модель и она не в процессе загрузки
 
-        except Exception as e:
-            print(f"❌ Ошибка переключения модели: {str(e)}")
+        Returns:
+            None, если в ответе нет ни одного известного поля
+        """
+        if not isinstance(status, dict):
+            return None
+
+        model_keys = ('current_model', 'active_model', 'model', 'model_id')
+        if not any(key in status for key in ('status', 'state', 'ready', 'loading') + model_keys):
+            return None
+
+        state = str(status.get('status', status.get('state', ''))).lower()
+        if state in ('loading', 'switching', 'starting', 'busy'):
             return False
+        if status.get('ready') is False or status.get('loading') is True:
+            return False
+
+        for key in model_keys:
+            if key in status and status[key]:
+                return status[key] == model_id
 
-    def _call_llm(self, user_prompt: str, temperature: float = 0.3, max_retries: int = 3) -> str:
+        # Оркестратор не сообщает имя модели — достаточно того, что он не грузится
+        return True
+
+    def _call_llm(
+        self,
+        user_prompt: str,
+        temperature: float = 0.3,
+        max_retries: int = 3,
+        on_partial: Optional[Callable[[Dict[str, Any]], None]] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
         model_config = self._get_model_config()
         model_id = model_config['model_id']
 
-        # Переключаемся на модель
-        self._switch_model(model_id)
-        
-        # Ждём загрузки - для 14B моделей значительно дольше
-        wait_time = 15 if '14b' in model_id.lower() else 4
-        print(f"⏳ Ждём загрузки модели ({wait_time} сек)...")
-        time.sleep(wait_time)
+        # При сбое узла запрос повторяется на следующем подходящем узле
+        tried: List[Backend] = []
+        last_error: Optional[Exception] = None
+        while True:
+            try:
+                backend = self.router.pick(model_id, exclude=tried)
+            except NoBackendAvailable:
+                if last_error is not None:
+                    raise last_error
+                raise
+
+            llm_metrics.note(backend=backend.url)
+            ok = None
+            try:
+                # Переключаем модель только если на узле загружена другая
+                with llm_metrics.timed("gate_wait_seconds"):
+                    backend.acquire(model_id, functools.partial(self._switch_model, backend=backend))
+                try:
+                    response = self._request_completion(
+                        backend, model_id, user_prompt, temperature, max_retries, on_partial, response_format
+                    )
+                finally:
+                    backend.release()
+                ok = True
+                return response
+            except Exception as e:
+                if not _is_backend_failure(e):
+                    raise
+                ok = False
+                last_error = e
+                tried.append(backend)
+                print(f"⚠️ Сбой узла {backend.url}: {str(e)[:100]}")
+            finally:
+                self.router.done(backend, ok)
+
+    async def _call_llm_async(
+        self,
+        user_prompt: str,
+        temperature: float = 0.3,
+        max_retries: int = 3,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        model_id = self._get_model_config()['model_id']
+        client, semaphore, _ = await _get_async_resources()
+
+        async with semaphore:
+            tried: List[Backend] = []
+            last_error: Optional[Exception] = None
+            while True:
+                try:
+                    backend = self.router.pick(model_id, exclude=tried)
+                except NoBackendAvailable:
+                    if last_error is not None:
+                        raise last_error
+                    raise
 
-        url = f"{self.base_url}/v1/chat/completions"
+                llm_metrics.note(backend=backend.url)
+                ok = None
+                try:
+                    # Переключение модели синхронное и редкое — выполняем его в потоке
+                    with llm_metrics.timed("gate_wait_seconds"):
+                        await _acquire_async(backend, model_id, functools.partial(self._switch_model, backend=backend))
+                    try:
+                        response = await self._request_completion_async(
+                            client, backend, model_id, user_prompt, temperature, max_retries, response_format
+                        )
+                    finally:
+                        backend.release()
+                    ok = True
+                    return response
+                except Exception as e:
+                    if not _is_backend_failure(e):
+                        raise
+                    ok = False
+                    last_error = e
+                    tried.append(backend)
+                    print(f"⚠️ Сбой узла {backend.url}: {str(e)[:100]}")
+                finally:
+                    self.router.done(backend, ok)
+
+    def _build_request(
+        self,
+        backend: Backend,
+        model_id: str,
+        user_prompt: str,
+        temperature: float,
+        stream: bool = False,
+        response_format: Optional[Dict[str, Any]] = None
+    ):
+        """Собирает URL, payload и заголовки запроса к /v1/chat/completions узла"""
+        url = f"{backend.url}/v1/chat/completions"
 
         # Увеличиваем max_tokens чтобы JSON не обрезался
         payload = {
@@ -67,47 +416,212 @@ class LLMClient:
             "temperature": temperature,
             "max_tokens": 8000
         }
+        if not backend.switch:
+            # Узел держит несколько моделей одновременно — модель выбирается полем запроса
+            payload["model"] = model_id
+        if stream:
+            payload["stream"] = True
+        if response_format:
+            payload["response_format"] = response_format
 
         headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
+            "Authorization": f"Bearer {backend.api_key}"
         }
 
+        return url, payload, headers
+
+    def _read_completion(self, result: Dict[str, Any]) -> Optional[str]:
+        """
+        Достаёт текст ответа из JSON оркестратора
+
+        Returns:
+            Текст ответа или None, если модель ещё грузится (503)
+        """
+        # Проверяем структуру
+        if 'choices' not in result or not result['choices']:
+            # Если 503 - модель ещё грузится
+            if 'error' in result and result['error'].get('code') == 503:
+                return None
+            raise ValueError(f"Invalid response structure. Response: {result}")
+
+        print(f"✅ Получен ответ от LLM")
+        self._local.last_usage = result.get('usage') or {}
+        llm_metrics.add_usage(self._local.last_usage)
+        return result['choices'][0]['message']['content']
+
+    def _request_completion(
+        self,
+        backend: Backend,
+        model_id: str,
+        user_prompt: str,
+        temperature: float,
+        max_retries: int,
+        on_partial: Optional[Callable[[Dict[str, Any]], None]] = None,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        stream = LLM_STREAMING or on_partial is not None
+        url, payload, headers = self._build_request(backend, model_id, user_prompt, temperature, stream, response_format)
+        session = get_http_session()
+
         # Ретраи при 503 (модель грузится)
         for attempt in range(max_retries):
             try:
                 print(f"🚀 Отправляю запрос к LLM (попытка {attempt + 1}/{max_retries})...")
-                response = requests.post(url, json=payload, headers=headers, timeout=240)
-                
-                if response.status_code != 200:
-                    raise Exception(f"HTTP {response.status_code}: {response.text}")
-                
-                result = response.json()
+                llm_metrics.add("http_requests")
+                if attempt:
+                    llm_metrics.add("retries")
+                with llm_metrics.timed("http_seconds"):
+                    response = session.post(url, json=payload, headers=headers, timeout=240, stream=stream)
+                    
+                    if response.status_code != 200:
+                        raise BackendError(response.status_code, response.text)
+                    
+                    if stream and response.headers.get('Content-Type', '').startswith('text/event-stream'):
+                        return self._read_stream(response, on_partial)
+                    
+                    # Сервер проигнорировал stream (или вернул ошибку) — обычный JSON
+                    result = response.json()
+                content = self._read_completion(result)
                 
-                # Проверяем структуру
-                if 'choices' not in result or not result['choices']:
-                    # Если 503 - модель ещё грузится
-                    if 'error' in result and result['error'].get('code') == 503:
-                        if attempt < max_retries - 1:
-                            wait = (attempt + 1) * 10  # 10, 20, 30 сек
-                            print(f"⚠️ Модель ещё грузится, жду {wait} сек...")
+                if content is None:
+                    if attempt < max_retries - 1:
+                        wait = (attempt + 1) * 10  # 10, 20, 30 сек
+                        print(f"⚠️ Модель ещё грузится, жду {wait} сек...")
+                        with llm_metrics.timed("sleep_seconds"):
                             time.sleep(wait)
-                            continue
+                        continue
                     raise ValueError(f"Invalid response structure. Response: {result}")
                 
-                print(f"✅ Получен ответ от LLM")
-                return result['choices'][0]['message']['content']
+                return content
                 
             except requests.exceptions.Timeout:
                 if attempt < max_retries - 1:
                     print(f"⏱️ Таймаут, повтор...")
-                    time.sleep(5)
+                    with llm_metrics.timed("sleep_seconds"):
+                        time.sleep(5)
+                    continue
+                raise
+            except Exception as e:
+                if attempt < max_retries - 1 and "503" in str(e):
+                    print(f"⚠️ Ошибка 503, повтор через 10 сек...")
+                    with llm_metrics.timed("sleep_seconds"):
+                        time.sleep(10)
+                    continue
+                raise
+
+        raise Exception("Все попытки вызова LLM исчерпаны")
+
+    def _read_stream(
+        self,
+        response: requests.Response,
+        on_partial: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> str:
+        """
+        Читает SSE-поток /v1/chat/completions и обрывает его, как только
+        верхнеуровневый JSON-объект закрылся (хвост reasoning-токенов не ждём)
+        """
+        parser = IncrementalJSONParser()
+        reported: Dict[str, Any] = {}
+        usage: Dict[str, Any] = {}
+
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith('data:'):
+                    continue
+
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+
+                try:
+                    event = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+
+                if event.get('usage'):
+                    usage = event['usage']
+
+                choices = event.get('choices') or []
+                if not choices:
+                    continue
+
+                delta = choices[0].get('delta') or {}
+                if parser.feed(delta.get('content') or ''):
+                    print(f"✂️ JSON-объект закрылся, обрываю генерацию")
+                    break
+
+                if on_partial:
+                    fields = parser.partial_fields()
+                    if fields != reported:
+                        reported = fields
+                        on_partial(fields)
+        finally:
+            response.close()
+
+        if on_partial:
+            fields = parser.partial_fields()
+            if fields != reported:
+                on_partial(fields)
+
+        print(f"✅ Получен потоковый ответ от LLM ({len(parser.raw)} символов)")
+        self._local.last_usage = usage
+        llm_metrics.add_usage(usage)
+        return parser.text()
+
+    async def _request_completion_async(
+        self,
+        client: httpx.AsyncClient,
+        backend: Backend,
+        model_id: str,
+        user_prompt: str,
+        temperature: float,
+        max_retries: int,
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> str:
+        url, payload, headers = self._build_request(
+            backend, model_id, user_prompt, temperature, response_format=response_format
+        )
+
+        # Та же логика ретраев, что и в синхронной версии
+        for attempt in range(max_retries):
+            try:
+                print(f"🚀 Отправляю async-запрос к LLM (попытка {attempt + 1}/{max_retries})...")
+                llm_metrics.add("http_requests")
+                if attempt:
+                    llm_metrics.add("retries")
+                with llm_metrics.timed("http_seconds"):
+                    response = await client.post(url, json=payload, headers=headers)
+                    
+                    if response.status_code != 200:
+                        raise BackendError(response.status_code, response.text)
+                    
+                    result = response.json()
+                content = self._read_completion(result)
+                
+                if content is None:
+                    if attempt < max_retries - 1:
+                        wait = (attempt + 1) * 10
+                        print(f"⚠️ Модель ещё грузится, жду {wait} сек...")
+                        with llm_metrics.timed("sleep_seconds"):
+                            await asyncio.sleep(wait)
+                        continue
+                    raise ValueError(f"Invalid response structure. Response: {result}")
+                
+                return content
+                
+            except httpx.TimeoutException:
+                if attempt < max_retries - 1:
+                    print(f"⏱️ Таймаут, повтор...")
+                    with llm_metrics.timed("sleep_seconds"):
+                        await asyncio.sleep(5)
                     continue
                 raise
             except Exception as e:
                 if attempt < max_retries - 1 and "503" in str(e):
                     print(f"⚠️ Ошибка 503, повтор через 10 сек...")
-                    time.sleep(10)
+                    with llm_metrics.timed("sleep_seconds"):
+                        await asyncio.sleep(10)
                     continue
                 raise
 
@@ -115,7 +629,194 @@ class LLMClient:
 
     def call_llm(self, user_prompt: str, temperature: float = 0.3) -> str:
         """Публичный метод для вызова LLM"""
-        return self._call_llm(user_prompt, temperature)
+        with llm_metrics.track_call("text", self._get_model_config()['model_id'], self._prompt_chars(user_prompt)):
+            response = self._call_llm(user_prompt, temperature)
+            llm_metrics.note(response_chars=len(response))
+            return response
+
+    async def call_llm_async(self, user_prompt: str, temperature: float = 0.3) -> str:
+        """Асинхронный вызов LLM (ограничен LLM_ASYNC_CONCURRENCY на event loop)"""
+        with llm_metrics.track_call("text", self._get_model_config()['model_id'], self._prompt_chars(user_prompt)):
+            response = await self._call_llm_async(user_prompt, temperature)
+            llm_metrics.note(response_chars=len(response))
+            return response
+
+    def _prompt_chars(self, user_prompt: str) -> int:
+        return len(self.system_prompt) + len(user_prompt)
+
+    def get_last_usage(self) -> Dict[str, Any]:
+        """Возвращает usage (prompt_tokens, completion_tokens) последнего запроса в этом потоке"""
+        return getattr(self._local, 'last_usage', {})
+
+    def call_llm_json(
+        self,
+        user_prompt: str,
+        kind: str,
+        temperature: float = 0.3,
+        parse: Optional[Callable[[str], Dict[str, Any]]] = None,
+        on_partial: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Вызывает LLM и парсит JSON-ответ с использованием кэша
+
+        В кэш попадает только успешно распарсенный результат, поэтому
+        битый ответ модели не будет возвращаться повторно.
+
+        Args:
+            user_prompt: Текст запроса
+            kind: Тип результата для кэша (analysis, resume, vacancy)
+            temperature: Температура генерации
+            parse: Функция разбора ответа (по умолчанию _extract_json)
+            on_partial: Колбэк с уже готовыми полями (overall, recommendation...)
+                во время потоковой генерации
+        """
+        parse = parse or self._extract_json
+        model_id = self._get_model_config()['model_id']
+
+        with llm_metrics.track_call(kind, model_id, self._prompt_chars(user_prompt)):
+            cache_key = self._cache_key(kind, user_prompt, model_id, temperature)
+            if cache_key:
+                cached = llm_cache.get(cache_key)
+                if cached is not None:
+                    print(f"⚡ Результат '{kind}' взят из кэша")
+                    llm_metrics.note(cache_hit=True)
+                    return cached
+
+            response = self._call_llm(
+                user_prompt, temperature,
+                on_partial=on_partial,
+                response_format=self._response_format(kind)
+            )
+            llm_metrics.note(response_chars=len(response))
+            with llm_metrics.timed("parse_seconds"):
+                result = self._parse_response(kind, model_id, response, parse, temperature)
+
+            if cache_key:
+                llm_cache.put(cache_key, kind, model_id, result)
+
+            return result
+
+    async def call_llm_json_async(
+        self,
+        user_prompt: str,
+        kind: str,
+        temperature: float = 0.3,
+        parse: Optional[Callable[[str], Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """Асинхронный вариант call_llm_json"""
+        parse = parse or self._extract_json
+        model_id = self._get_model_config()['model_id']
+
+        with llm_metrics.track_call(kind, model_id, self._prompt_chars(user_prompt)):
+            cache_key = self._cache_key(kind, user_prompt, model_id, temperature)
+            if cache_key:
+                cached = await asyncio.to_thread(llm_cache.get, cache_key)
+                if cached is not None:
+                    print(f"⚡ Результат '{kind}' взят из кэша")
+                    llm_metrics.note(cache_hit=True)
+                    return cached
+
+            response = await self._call_llm_async(
+                user_prompt, temperature, response_format=self._response_format(kind)
+            )
+            llm_metrics.note(response_chars=len(response))
+            # Перезапрос поля (редкий) синхронный — не блокируем event loop
+            with llm_metrics.timed("parse_seconds"):
+                result = await asyncio.to_thread(self._parse_response, kind, model_id, response, parse, temperature)
+
+            if cache_key:
+                await asyncio.to_thread(llm_cache.put, cache_key, kind, model_id, result)
+
+            return result
+
+    def _response_format(self, kind: str) -> Optional[Dict[str, Any]]:
+        return schemas.get_response_format(kind) if self.structured_output else None
+
+    def _parse_response(
+        self,
+        kind: str,
+        model_id: str,
+        response: str,
+        parse: Callable[[str], Dict[str, Any]],
+        temperature: float
+    ) -> Dict[str, Any]:
+        """Разбирает ответ, в structured-режиме валидирует по схеме, ведёт статистику"""
+        self._local.json_repaired = False
+        self._local.reasked = False
+
+        try:
+            if self.structured_output:
+                try:
+                    # Ответ, ограниченный схемой, обычно парсится сразу
+                    result = json.loads(response)
+                except json.JSONDecodeError:
+                    result = parse(response)
+                result = self._validate_structured(kind, result, temperature)
+            else:
+                result = parse(response)
+        except Exception:
+            record_parse_result(model_id, "failed")
+            llm_metrics.note(parse_outcome="failed")
+            raise
+
+        if self._local.reasked:
+            outcome = "reasked"
+        elif self._local.json_repaired:
+            outcome = "repaired"
+        else:
+            outcome = "ok"
+        record_parse_result(model_id, outcome)
+        llm_metrics.note(parse_outcome=outcome)
+
+        return result
+
+    def _validate_structured(self, kind: str, result: Any, temperature: float) -> Dict[str, Any]:
+        """
+        Проверяет ответ по схеме; если некорректно ровно одно поле —
+        дешёвым отдельным запросом просит модель исправить только его
+        """
+        errors = schemas.validate(kind, result)
+        if not errors:
+            return schemas.normalize(kind, result)
+
+        if not isinstance(result, dict) or len(errors) > 1:
+            details = "; ".join(f"{schemas.format_path(path)}: {msg}" for path, msg in errors[:5])
+            raise ValueError(f"Ответ LLM не соответствует схеме '{kind}': {details}")
+
+        path, message = errors[0]
+        field = schemas.format_path(path)
+        print(f"🔁 Поле '{field}' некорректно ({message}), перезапрашиваю только его...")
+
+        prompt = f"""В JSON-ответе ниже поле "{field}" некорректно: {message}
+
+JSON:
+{json.dumps(result, ensure_ascii=False)}
+
+Верни ТОЛЬКО JSON вида {{"value": <исправленное значение поля {field}>}} без пояснений и markdown."""
+
+        answer = self._extract_json(
+            self._call_llm(prompt, temperature, response_format={"type": "json_object"})
+        )
+        if not isinstance(answer, dict) or 'value' not in answer:
+            raise ValueError(f"Не удалось исправить поле '{field}'")
+
+        schemas.set_path(result, path, answer['value'])
+        self._local.reasked = True
+
+        errors = schemas.validate(kind, result)
+        if errors:
+            details = "; ".join(f"{schemas.format_path(p)}: {m}" for p, m in errors[:5])
+            raise ValueError(f"Ответ LLM не соответствует схеме '{kind}' после исправления: {details}")
+
+        return schemas.normalize(kind, result)
+
+    def _cache_key(self, kind: str, user_prompt: str, model_id: str, temperature: float) -> Optional[str]:
+        if not self.use_cache:
+            return None
+        return llm_cache.make_cache_key(
+            kind, user_prompt, model_id,
+            self.system_prompt, self.hr_guidelines, temperature
+        )
 
     def _clean_json_text(self, text: str) -> str:
         """Очищает текст от мусора перед парсингом JSON"""
@@ -233,6 +934,7 @@ class LLMClient:
             try:
                 result = json.loads(fixed)
                 print(f"✓ JSON починен автоматически")
+                self._local.json_repaired = True
                 
                 if isinstance(result, list):
                     result = result[0] if result else {}
@@ -244,70 +946,78 @@ class LLMClient:
                 print(json_str[-500:])
                 raise ValueError(f"Не удалось распарсить JSON: {str(e)}")
 
-    def analyze_resume(self, resume_data: Dict[str, Any], vacancy_data: Dict[str, Any]) -> Dict[str, Any]:
-        prompt = f"""
-Проанализируй резюме кандидата относительно требований вакансии.
-
-HR Guidelines:
-{self.hr_guidelines}
+    def analyze_resume(
+        self,
+        resume_data: Dict[str, Any],
+        vacancy_data: Dict[str, Any],
+        on_partial: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        prompt = self._build_analysis_prompt(resume_data, vacancy_data)
+        return self.call_llm_json(prompt, kind="analysis", on_partial=on_partial)
 
-Вакансия:
-{json.dumps(vacancy_data, ensure_ascii=False, indent=2)}
+    async def analyze_resume_async(self, resume_data: Dict[str, Any], vacancy_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Асинхронный вариант analyze_resume"""
+        prompt = self._build_analysis_prompt(resume_data, vacancy_data)
+        return await self.call_llm_json_async(prompt, kind="analysis")
 
+    def _build_analysis_prompt(self, resume_data: Dict[str, Any], vacancy_data: Dict[str, Any]) -> str:
+        return f"""{_analysis_prompt_head(self.hr_guidelines, json.dumps(vacancy_data, ensure_ascii=False))}
 Резюме:
 {json.dumps(resume_data, ensure_ascii=False, indent=2)}
 
+{PROMPT_TAIL}
+"""
+
+    def extract_and_analyze(self, resume_text: str, vacancy_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Извлекает структуру резюме и оценивает его одним запросом к LLM
+
+        Вместо двух вызовов (ResumeExtractor + analyze_resume) модель получает
+        сырой текст резюме и компактный JSON вакансии и возвращает оба результата.
+
+        Returns:
+            {"resume": {...}, "analysis": {...}}
+        """
+        prompt = f"""
+Извлеки структурированные данные из текста резюме и проанализируй кандидата относительно требований вакансии.
+
+HR Guidelines:
+{self.hr_guidelines}
+
 Верни результат СТРОГО в формате JSON (без markdown блоков, без комментариев):
 {{
-    "matching_score": {{
-        "overall": <число 0-100>,
-        "hard_skills": <число 0-100>,
-        "hard_skills_reasoning": "<объяснение оценки БЕЗ переносов строк>",
-        "experience": <число 0-100>,
-        "experience_reasoning": "<объяснение оценки БЕЗ переносов строк>",
-        "cultural_fit": <число 0-100>,
-        "cultural_fit_reasoning": "<объяснение БЕЗ переносов строк>",
-        "communication": <число 0-100>,
-        "communication_reasoning": "<объяснение БЕЗ переносов строк>",
-        "growth_potential": <число 0-100>,
-        "growth_potential_reasoning": "<объяснение БЕЗ переносов строк>",
-        "stability": <число 0-100>,
-        "stability_reasoning": "<объяснение БЕЗ переносов строк>"
-    }},
-    "summary": "<краткий вывод БЕЗ переносов строк>",
-    "strengths": ["сильная сторона 1", "сильная сторона 2"],
-    "weaknesses": ["слабая сторона 1", "слабая сторона 2"],
-    "missing_skills": ["недостающий навык 1", "недостающий навык 2"],
-    "red_flags": ["риск 1", "риск 2"],
-    "recommendation": "YES|NO|MAYBE",
-    "confidence_level": "HIGH|MEDIUM|LOW",
-    "interview_questions": ["вопрос 1", "вопрос 2", "вопрос 3"],
-    "next_steps": ["шаг 1", "шаг 2"],
-    "salary_expectation_fit": "MATCH|BELOW|ABOVE|UNCLEAR",
-    "availability": "IMMEDIATE|NOTICE_PERIOD|UNCLEAR"
+"resume": {RESUME_JSON_FORMAT},
+"analysis": {ANALYSIS_JSON_FORMAT}
 }}
 
-КРИТИЧЕСКИ ВАЖНО:
-1. Верни ТОЛЬКО валидный JSON
-2. НЕ добавляй текст ДО или ПОСЛЕ JSON
-3. НЕ используй комментарии // или /* */
-4. Все строки в двойных кавычках
-5. Все ключи в двойных кавычках
-6. НЕ используй переносы строк внутри строковых значений - пиши весь текст в одну строку
-7. Если текст длинный - сокращай, но НЕ переноси на новую строку
+Для resume: определи пол по имени, если указана дата рождения - вычисли возраст (сейчас 2026 год).
+
+{JSON_OUTPUT_RULES}
+
+Вакансия:
+{json.dumps(vacancy_data, ensure_ascii=False, separators=(',', ':'))}
+
+Текст резюме:
+{prepare_resume_text(resume_text)}
+
+{PROMPT_TAIL}
 """
 
-        response = self._call_llm(prompt)
-        return self._extract_json(response)
+        # Проверка блоков — внутри разбора, до записи в кэш: иначе неполный ответ
+        # возвращался бы из кэша при каждом повторе задачи
+        return self.call_llm_json(prompt, kind="combined", parse=self._parse_combined)
+
+    def _parse_combined(self, response: str) -> Dict[str, Any]:
+        result = self._extract_json(response)
+        if not isinstance(result, dict) or not isinstance(result.get('resume'), dict) or not isinstance(result.get('analysis'), dict):
+            raise ValueError("Ответ LLM не содержит блоков 'resume' и 'analysis'")
+        return result
 
     def extract_structure(self, text: str, extraction_type: str) -> Dict[str, Any]:
         if extraction_type == "vacancy":
             prompt = f"""
 Извлеки структурированную информацию о вакансии из текста.
 
-Текст:
-{text[:3000]}
-
 Верни ТОЛЬКО валидный JSON (без markdown, без текста до/после, без комментариев):
 {{
     "title": "должность",
@@ -322,14 +1032,16 @@ HR Guidelines:
 ВАЖНО: 
 1. ТОЛЬКО JSON, без дополнительного текста
 2. НЕ используй переносы строк внутри строковых значений
+
+Текст:
+{prepare_vacancy_text(text, baseline_chars=3000)}
+
+{PROMPT_TAIL}
 """
         else:  # resume
             prompt = f"""
 Извлеки структурированную информацию о кандидате из резюме.
 
-Текст:
-{text[:3000]}
-
 Верни ТОЛЬКО валидный JSON (без markdown, без текста до/после, без комментариев):
 {{
     "name": "ФИО",
@@ -343,7 +1055,64 @@ HR Guidelines:
 ВАЖНО: 
 1. ТОЛЬКО JSON, без дополнительного текста
 2. НЕ используй переносы строк внутри строковых значений
+
+Текст:
+{prepare_resume_text(text, baseline_chars=3000)}
+
+{PROMPT_TAIL}
 """
 
-        response = self._call_llm(prompt)
-        return self._extract_json(response)
+        return self.call_llm_json(prompt, kind=extraction_type)
+
+
+_shared_clients: Dict[Optional[str], LLMClient] = {}
+_shared_clients_lock = threading.Lock()
+
+
+def get_llm_client(model_key: Optional[str] = None) -> LLMClient:
+    """
+    Возвращает общий для процесса LLMClient
+
+    Клиент не хранит состояния запроса (usage — в thread-local), промпты
+    читаются с диска только при изменении, а соединения берутся из общего пула,
+    поэтому один экземпляр безопасно использовать из нескольких потоков.
+
+    Args:
+        model_key: Ключ модели; None — модель из session_state текущей сессии
+    """
+    with _shared_clients_lock:
+        if model_key not in _shared_clients:
+            _shared_clients[model_key] = LLMClient(model_key=model_key)
+        return _shared_clients[model_key]
+
+
+# Статистика разбора ответов по моделям: сколько вызовов потрачено на битый JSON
+_parse_stats: Dict[str, Dict[str, int]] = {}
+_parse_stats_lock = threading.Lock()
+
+
+def record_parse_result(model_id: str, outcome: str):
+    """
+    Учитывает исход разбора ответа модели
+
+    Args:
+        outcome: ok — сразу валиден, repaired — понадобился автофикс,
+                 reasked — понадобился перезапрос поля, failed — ответ потерян
+    """
+    with _parse_stats_lock:
+        stats = _parse_stats.setdefault(
+            model_id, {"calls": 0, "ok": 0, "repaired": 0, "reasked": 0, "failed": 0}
+        )
+        stats["calls"] += 1
+        stats[outcome] += 1
+
+
+def get_parse_stats() -> Dict[str, Dict[str, Any]]:
+    """Статистика разбора JSON по моделям с долей неудач в процентах"""
+    with _parse_stats_lock:
+        result = {model_id: dict(stats) for model_id, stats in _parse_stats.items()}
+
+    for stats in result.values():
+        stats["failure_rate"] = stats["failed"] / stats["calls"] * 100 if stats["calls"] else 0
+
+    return result
@@ -0,0 +1,302 @@
+# app/services/llm_metrics.py
+"""Метрики вызовов LLM: куда уходит время и токены
+
+Каждый call_llm_json (и call_llm) пишет одну строку в llm_calls: размер
+промпта, токены из usage, время по фазам — ожидание модели в ModelGate,
+переключение модели, паузы между ретраями, HTTP, разбор JSON — и какой путь
+починки JSON понадобился.
+
+Фазы меряются через timed(): вложенная фаза вычитается из внешней, поэтому
+переключение модели не попадает в ожидание, а перезапрос поля при разборе —
+в parse_seconds. Текущий вызов хранится в ContextVar, поэтому метрики
+корректны и в потоках воркеров, и в asyncio-задачах.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func
+
+from config import LLM_METRICS_ENABLED, LLM_METRICS_RETENTION_DAYS
+from db.models import SessionLocal, LLMCall
+from services.query_cache import cached, invalidate
+from services.text_compactor import CHARS_PER_TOKEN
+
+# Очистка старых строк не на каждую запись, а раз в N записей
+PURGE_EVERY_N_CALLS = 200
+
+PHASE_FIELDS = ("gate_wait_seconds", "switch_seconds", "sleep_seconds", "http_seconds", "parse_seconds")
+
+# Поля сводки (p50/p95 и суммы) и разрезы для страницы метрик
+SUMMARY_FIELDS = PHASE_FIELDS + ("total_seconds", "prompt_chars", "prompt_tokens", "completion_tokens")
+GROUP_KEYS = ("model_id", "kind", "backend")
+
+# Перцентили считаются по последним N вызовам за период, а не по всем строкам
+PERCENTILE_SAMPLE = 5000
+RECENT_CALLS = 100
+
+_current: ContextVar[Optional[Dict[str, Any]]] = ContextVar("llm_call_metrics", default=None)
+
+_saved = 0
+_saved_lock = threading.Lock()
+
+
+@contextmanager
+def track_call(kind: str, model_id: str, prompt_chars: int):
+    """Метрики одного вызова LLM; строка сохраняется при выходе (и при ошибке)"""
+    if not LLM_METRICS_ENABLED or _current.get() is not None:
+        # Вложенный вызов (перезапрос поля) учитывается во внешнем
+        yield _current.get()
+        return
+
+    metrics: Dict[str, Any] = {
+        "kind": kind,
+        "model_id": model_id,
+        "backend": None,
+        "cache_hit": False,
+        "prompt_chars": prompt_chars,
+        "response_chars": 0,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "http_requests": 0,
+        "retries": 0,
+        "parse_outcome": None,
+        "error": None,
+        "_stack": [],
+        **{field: 0.0 for field in PHASE_FIELDS}
+    }
+    token = _current.set(metrics)
+    started = time.perf_counter()
+    try:
+        yield metrics
+    except Exception as e:
+        metrics["error"] = str(e)[:500]
+        raise
+    finally:
+        _current.reset(token)
+        metrics["total_seconds"] = time.perf_counter() - started
+        _save(metrics)
+
+
+@contextmanager
+def timed(field: str):
+    """Добавляет к полю текущего вызова время блока без вложенных timed()"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+
+    stack = metrics["_stack"]
+    stack.append(0.0)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        nested = stack.pop()
+        metrics[field] += elapsed - nested
+        if stack:
+            stack[-1] += elapsed
+
+
+def add(field: str, value: float = 1):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics[field] += value
+
+
+def note(**fields):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.update(fields)
+
+
+def add_usage(usage: Optional[Dict[str, Any]]):
+    """Суммирует usage ответа (перезапрос поля добавляет свои токены)"""
+    metrics = _current.get()
+    if metrics is None or not usage:
+        return
+    for field in ("prompt_tokens", "completion_tokens"):
+        if usage.get(field) is not None:
+            metrics[field] = (metrics[field] or 0) + int(usage[field])
+
+
+def _save(metrics: Dict[str, Any]):
+    global _saved
+
+    prompt_tokens = metrics["prompt_tokens"]
+    completion_tokens = metrics["completion_tokens"]
+    estimated = not metrics["cache_hit"] and prompt_tokens is None
+    if estimated:
+        # Сервер не вернул usage — оценка по длине текста
+        prompt_tokens = round(metrics["prompt_chars"] / CHARS_PER_TOKEN)
+        completion_tokens = round(metrics["response_chars"] / CHARS_PER_TOKEN) if metrics["response_chars"] else None
+
+    db = SessionLocal()
+    try:
+        db.add(LLMCall(
+            model_id=metrics["model_id"],
+            backend=metrics["backend"],
+            kind=metrics["kind"],
+            cache_hit=metrics["cache_hit"],
+            prompt_chars=metrics["prompt_chars"],
+            prompt_tokens=prompt_tokens,
+            tokens_estimated=estimated,
+            completion_tokens=completion_tokens,
+            http_requests=metrics["http_requests"],
+            retries=metrics["retries"],
+            parse_outcome=metrics["parse_outcome"],
+            total_seconds=metrics["total_seconds"],
+            error=metrics["error"],
+            **{field: metrics[field] for field in PHASE_FIELDS}
+        ))
+        db.commit()
+    except Exception as e:
+        # Метрики не должны ломать анализ
+        print(f"⚠️ Ошибка записи метрик LLM: {str(e)}")
+        db.rollback()
+        return
+    finally:
+        db.close()
+
+    invalidate("llm_calls")
+
+    with _saved_lock:
+        _saved += 1
+        purge = _saved % PURGE_EVERY_N_CALLS == 0
+    if purge:
+        purge_old()
+
+
+def purge_old() -> int:
+    """Удаляет метрики старше LLM_METRICS_RETENTION_DAYS"""
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=LLM_METRICS_RETENTION_DAYS)
+        removed = db.query(LLMCall).filter(LLMCall.created_at < cutoff).delete(synchronize_session=False)
+        db.commit()
+    except Exception as e:
+        # Вызывается из track_call — не должна подменять результат вызова LLM
+        print(f"⚠️ Ошибка очистки метрик LLM: {str(e)}")
+        db.rollback()
+        return 0
+    finally:
+        db.close()
+
+    invalidate("llm_calls")
+    return removed
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Перцентиль q (0-100) с линейной интерполяцией"""
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _group_summary(totals: List[Any], outcomes: List[Any], sample: List[Any]) -> Dict[str, Any]:
+    """
+    Сводка по группе: счётчики и суммы — из SQL-агрегатов, p50/p95 — по выборке
+
+    Кэш-попадания только считаются — в перцентили, суммы и исходы не входят.
+    """
+    requests_made = [row for row in totals if not row.cache_hit]
+    calls = sum(row.calls for row in totals)
+    summary: Dict[str, Any] = {
+        "calls": calls,
+        "cache_hits": calls - sum(row.calls for row in requests_made),
+        "errors": sum(row.errors for row in requests_made),
+        "retries": sum(row.retries or 0 for row in requests_made),
+        "tokens_estimated": sum(row.tokens_estimated or 0 for row in requests_made),
+        "outcomes": {},
+    }
+
+    for field in SUMMARY_FIELDS:
+        if field in PHASE_FIELDS or field == "total_seconds":
+            values = [getattr(row, field) or 0 for row in sample]
+        else:
+            values = [getattr(row, field) for row in sample if getattr(row, field) is not None]
+        summary[field] = {
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "sum": sum(getattr(row, field) or 0 for row in requests_made),
+        }
+
+    for row in outcomes:
+        outcome = row.parse_outcome or "—"
+        summary["outcomes"][outcome] = summary["outcomes"].get(outcome, 0) + row.calls
+
+    # Время вне измеряемых фаз (чтение кэша, сборка промпта, запись результата)
+    summary["other_seconds"] = summary["total_seconds"]["sum"] - sum(summary[field]["sum"] for field in PHASE_FIELDS)
+    return summary
+
+
+@cached("llm_calls")
+def load_summary(days: int) -> Dict[str, Any]:
+    """
+    Сводка вызовов LLM за последние days дней: целиком и в разрезе моделей,
+    типов запросов и узлов, плюс последние RECENT_CALLS вызовов
+
+    Счётчики и суммы считаются в SQL; p50/p95 — по последним PERCENTILE_SAMPLE
+    вызовам к LLM (выбираются только числовые колонки).
+    """
+    since = datetime.utcnow() - timedelta(days=days)
+    in_period = LLMCall.created_at >= since
+    made = LLMCall.cache_hit.isnot(True)
+
+    db = SessionLocal()
+    try:
+        totals = db.query(
+            *[getattr(LLMCall, key) for key in GROUP_KEYS],
+            LLMCall.cache_hit,
+            func.count(LLMCall.id).label("calls"),
+            func.count(LLMCall.error).label("errors"),
+            func.sum(LLMCall.retries).label("retries"),
+            func.sum(case((LLMCall.tokens_estimated.is_(True), 1), else_=0)).label("tokens_estimated"),
+            *[func.sum(getattr(LLMCall, field)).label(field) for field in SUMMARY_FIELDS]
+        ).filter(in_period).group_by(*[getattr(LLMCall, key) for key in GROUP_KEYS], LLMCall.cache_hit).all()
+
+        outcomes = db.query(
+            *[getattr(LLMCall, key) for key in GROUP_KEYS],
+            LLMCall.parse_outcome,
+            func.count(LLMCall.id).label("calls")
+        ).filter(in_period, made).group_by(*[getattr(LLMCall, key) for key in GROUP_KEYS], LLMCall.parse_outcome).all()
+
+        sample = db.query(
+            *[getattr(LLMCall, key) for key in GROUP_KEYS],
+            *[getattr(LLMCall, field) for field in SUMMARY_FIELDS]
+        ).filter(in_period, made).order_by(LLMCall.created_at.desc()).limit(PERCENTILE_SAMPLE).all()
+
+        recent = db.query(
+            LLMCall.created_at, LLMCall.model_id, LLMCall.backend, LLMCall.kind, LLMCall.cache_hit,
+            LLMCall.total_seconds, LLMCall.http_seconds, LLMCall.prompt_tokens, LLMCall.completion_tokens,
+            LLMCall.retries, LLMCall.parse_outcome, LLMCall.error
+        ).filter(in_period).order_by(LLMCall.created_at.desc()).limit(RECENT_CALLS).all()
+    finally:
+        db.close()
+
+    result: Dict[str, Any] = {
+        "overall": _group_summary(totals, outcomes, sample),
+        "sample_size": len(sample),
+        "recent": [row._asdict() for row in recent],
+    }
+    for key in GROUP_KEYS:
+        names = sorted({getattr(row, key) for row in totals}, key=lambda name: (name is None, name))
+        groups = [
+            (name, _group_summary(
+                [row for row in totals if getattr(row, key) == name],
+                [row for row in outcomes if getattr(row, key) == name],
+                [row for row in sample if getattr(row, key) == name]
+            ))
+            for name in names
+        ]
+        groups.sort(key=lambda item: -item[1]["calls"])
+        result[key] = groups
+    return result
@@ -0,0 +1,310 @@
+# app/services/llm_router.py
+"""Маршрутизация запросов к LLM по пулу узлов инференса
+
+Узлы задаются в LLM_BACKENDS (по умолчанию — один оркестратор
+LLM_MANAGER_URL). Для каждого запроса выбирается узел, который обслуживает
+модель, исправен и наименее загружен, в порядке предпочтения:
+
+1. модель уже загружена и есть свободный слот;
+2. узел простаивает — переключение модели не ждёт чужих запросов;
+3. модель загружена, но все слоты заняты — встаём в очередь узла;
+4. узел занят другой моделью — ждём её запросы и переключаем.
+
+Так трафик каждой модели идёт на узлы, где она уже загружена, а при
+пакетной нагрузке простаивающие узлы подключаются к самой нагруженной
+модели — пропускная способность растёт с числом узлов.
+
+Сбоящий узел (ошибки соединения, таймауты, HTTP 5xx) после
+LLM_BREAKER_FAILURES ошибок подряд выводится из ротации на
+LLM_BREAKER_COOLDOWN секунд, затем пропускает один пробный запрос.
+"""
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import AVAILABLE_MODELS, LLM_BACKENDS, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN
+
+
+class BackendError(Exception):
+    """Ответ узла с HTTP-статусом, отличным от 200"""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"HTTP {status_code}: {text}")
+        self.status_code = status_code
+
+
+class NoBackendAvailable(Exception):
+    """Нет исправного узла, обслуживающего модель"""
+
+
+class ModelGate:
+    """
+    Отслеживает, какая модель загружена в оркестраторе, и не даёт
+    переключить её, пока на текущей модели есть незавершённые запросы.
+    Один экземпляр на узел, общий для всех клиентов процесса.
+
+    Переключение (/switch и ожидание готовности) идёт вне блокировки — release()
+    и запросы к узлу не ждут его. Пока другую модель ждут, новые запросы к
+    текущей не допускаются: текущие дорабатывают, и модель переключается.
+    """
+
+    def __init__(self):
+        self.active_model: Optional[str] = None
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.switching = False
+        # Сколько запросов ждёт каждую модель и сколько было переключений
+        self.waiting: Dict[str, int] = {}
+        self.switches = 0
+
+    def _others_waiting(self, model_id: str) -> bool:
+        return any(count for model, count in self.waiting.items() if model != model_id)
+
+    def acquire(self, model_id: str, switch) -> None:
+        """Занимает слот на модели model_id, при необходимости переключая её через switch()"""
+        with self.condition:
+            if self.active_model == model_id and not self.switching and not self._others_waiting(model_id):
+                self.in_flight += 1
+                return
+
+            since = self.switches
+            self.waiting[model_id] = self.waiting.get(model_id, 0) + 1
+            try:
+                while True:
+                    if not self.switching:
+                        if self.active_model == model_id and (
+                            self.switches > since or not self._others_waiting(model_id)
+                        ):
+                            # Модель загружена (ждавшие её до переключения входят все вместе)
+                            self.in_flight += 1
+                            return
+                        if self.active_model != model_id and self.in_flight == 0:
+                            self.switching = True
+                            break
+                    self.condition.wait()
+            finally:
+                self.waiting[model_id] -= 1
+
+        try:
+            ok = switch(model_id)
+        except BaseException:
+            with self.condition:
+                self.active_model = None
+                self.switching = False
+                self.condition.notify_all()
+            raise
+
+        with self.condition:
+            # Если переключение не удалось, состояние оркестратора неизвестно —
+            # в следующий раз переключаемся снова
+            self.active_model = model_id if ok else None
+            self.switches += 1
+            self.switching = False
+            self.in_flight += 1
+            self.condition.notify_all()
+
+    def release(self) -> None:
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+
+class CircuitBreaker:
+    """closed — узел в ротации, open — исключён до конца паузы, half_open — идёт пробный запрос"""
+
+    def __init__(self, max_failures: int = LLM_BREAKER_FAILURES, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.probing or time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос (в half_open — только один пробный)"""
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.max_failures:
+                # Пробный запрос не прошёл — снова пауза
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class Backend:
+    """Узел инференса: адрес, модели, число слотов, состояние загрузки и исправности"""
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str = "",
+        models: Optional[List[str]] = None,
+        slots: int = 1,
+        switch: bool = True
+    ):
+        self.url = url.rstrip("/")
+        self.api_key = api_key
+        # model_id; пусто — все модели из AVAILABLE_MODELS
+        self.models = set(models or [])
+        self.slots = max(1, slots)
+        # False — сервер держит все свои модели загруженными (vLLM, отдельный llama.cpp на модель)
+        self.switch = switch
+        self.gate = ModelGate()
+        self.breaker = CircuitBreaker()
+        # Запросы, назначенные узлу: в очереди ModelGate и в работе
+        self.pending = 0
+
+    def serves(self, model_id: str) -> bool:
+        return not self.models or model_id in self.models
+
+    def is_loaded(self, model_id: str) -> bool:
+        return not self.switch or self.gate.active_model == model_id
+
+    def acquire(self, model_id: str, switch) -> None:
+        if self.switch:
+            self.gate.acquire(model_id, switch)
+        else:
+            # Модели не вытесняют друг друга — переключение и ожидание не нужны
+            with self.gate.condition:
+                self.gate.in_flight += 1
+
+    def release(self) -> None:
+        self.gate.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "models": sorted(self.models),
+            "active_model": self.gate.active_model if self.switch else None,
+            "in_flight": self.gate.in_flight,
+            "pending": self.pending,
+            "slots": self.slots,
+            "breaker": self.breaker.state,
+            "failures": self.breaker.failures,
+        }
+
+
+class LLMRouter:
+    def __init__(self, backends: List[Backend]):
+        if not backends:
+            raise ValueError("Пул узлов LLM пуст")
+        self.backends = backends
+        self.lock = threading.Lock()
+        # Для равных кандидатов — по кругу, чтобы не грузить всегда первый узел
+        self._rotation = itertools.count()
+
+    def _rank(self, backend: Backend, model_id: str):
+        loaded = backend.is_loaded(model_id)
+        if loaded and backend.pending < backend.slots:
+            tier = 0
+        elif backend.pending == 0:
+            tier = 1
+        elif loaded:
+            tier = 2
+        else:
+            tier = 3
+        return tier, backend.pending / backend.slots
+
+    def pick(self, model_id: str, exclude: Optional[List[Backend]] = None) -> Backend:
+        """
+        Выбирает узел для запроса к модели и резервирует на нём место;
+        после запроса обязательно вызвать done()
+
+        Raises:
+            NoBackendAvailable: Модель не обслуживает ни один исправный узел
+        """
+        exclude = exclude or []
+        with self.lock:
+            candidates = [b for b in self.backends if b.serves(model_id) and b not in exclude]
+            if not candidates:
+                raise NoBackendAvailable(f"Нет узлов LLM для модели {model_id}")
+
+            offset = next(self._rotation)
+            ranked = sorted(
+                enumerate(candidates),
+                key=lambda item: (*self._rank(item[1], model_id), (item[0] - offset) % len(candidates))
+            )
+            for _, backend in ranked:
+                if backend.breaker.allow():
+                    backend.pending += 1
+                    return backend
+
+        raise NoBackendAvailable(f"Все узлы LLM для модели {model_id} временно исключены после ошибок")
+
+    def done(self, backend: Backend, ok: Optional[bool]):
+        """
+        Освобождает место на узле
+
+        Args:
+            ok: True — запрос прошёл, False — сбой узла, None — ошибка не связана с узлом
+        """
+        with self.lock:
+            backend.pending -= 1
+        if ok:
+            backend.breaker.record_success()
+        elif ok is False:
+            backend.breaker.record_failure()
+            if backend.breaker.state != "closed":
+                print(f"🔌 Узел {backend.url} исключён из ротации на {backend.breaker.cooldown:.0f} сек")
+        elif backend.breaker.probing:
+            # Пробный запрос упал не по вине узла — узел отвечает
+            backend.breaker.record_success()
+
+    def preferred_models(self) -> List[str]:
+        """
+        model_id, загруженные на исправных узлах (сначала узлы со свободными слотами):
+        их задачи выгоднее брать первыми, чтобы не переключать модели
+        """
+        with self.lock:
+            loaded = [
+                backend for backend in self.backends
+                if backend.switch and backend.gate.active_model and backend.breaker.state == "closed"
+            ]
+            loaded.sort(key=lambda backend: backend.pending / backend.slots)
+            return list(dict.fromkeys(backend.gate.active_model for backend in loaded))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [backend.snapshot() for backend in self.backends]
+
+
+_router: Optional[LLMRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> LLMRouter:
+    """Общий для процесса маршрутизатор по узлам из LLM_BACKENDS"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter([Backend(**node) for node in LLM_BACKENDS])
+            known = {cfg['model_id'] for cfg in AVAILABLE_MODELS.values()}
+            for backend in _router.backends:
+                unknown = backend.models - known
+                if unknown:
+                    print(f"⚠️ Узел {backend.url}: модели {', '.join(sorted(unknown))} нет в AVAILABLE_MODELS")
+        return _router
@@ -0,0 +1,311 @@
+# app/services/parse_pool.py
+"""Парсинг PDF/DOCX в пуле процессов
+
+Извлечение текста — CPU-bound и под GIL блокировало бы поток Streamlit и
+воркеры очереди. Здесь оно выполняется в отдельных процессах с лимитами на
+документ: размер файла, число страниц PDF и время. Время проверяется
+между страницами внутри процесса; если процесс завис на одной странице,
+сторожевой поток завершает этот процесс по жёсткому таймауту.
+
+Жёсткий таймаут считается с момента, когда дочерний процесс сообщил о начале
+парсинга, а не с отправки в пул: документы из очереди пула не успевают
+"истечь", не начавшись. Завершение одного процесса ломает весь
+ProcessPoolExecutor, поэтому остальные документы, которые в нём были,
+отправляются в новый пул заново и не тратят попытки задач очереди.
+
+Файлы пакета можно отправить на парсинг заранее (prefetch) — к моменту,
+когда воркер очереди возьмёт задачу, текст уже готов, а парсинг идёт
+параллельно с вызовами LLM.
+"""
+import hashlib
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from queue import Empty
+from typing import Dict, Optional
+
+from config import PARSE_WORKERS, PARSE_TIMEOUT, PARSE_MAX_FILE_MB, PARSE_MAX_PAGES, PARSE_PREFETCH_MAX
+from services.document_parser import DocumentParser
+
+# Сверх PARSE_TIMEOUT ждём, пока процесс сам прервётся между страницами
+_HARD_TIMEOUT_GRACE = 5
+
+# Сколько раз документ отправляется заново после падения пула
+_MAX_RESUBMITS = 3
+
+_spawn = multiprocessing.get_context("spawn")
+
+_lock = threading.Lock()
+_executor: Optional[ProcessPoolExecutor] = None
+# Заранее запущенный парсинг: идущий (не больше PARSE_PREFETCH_MAX) и уже
+# завершённый, но ещё не забранный (последние PARSE_PREFETCH_MAX, старые вытесняются)
+_inflight: Dict[str, Future] = {}
+_ready: "OrderedDict[str, Future]" = OrderedDict()
+
+# Задачи, отправленные в пул, по номеру; дочерний процесс сообщает о начале в _started
+_tasks: Dict[int, "_Task"] = {}
+_task_ids = itertools.count()
+_started = None
+_started_queue = None  # в дочернем процессе — очередь для сообщения о начале
+
+
+class _Task:
+    """Документ в пуле: Future для вызывающих и текущая попытка в ProcessPoolExecutor"""
+
+    def __init__(self, file_bytes: bytes, filename: str):
+        self.id = next(_task_ids)
+        self.file_bytes = file_bytes
+        self.filename = filename
+        self.future: Future = Future()
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.attempt: Optional[Future] = None
+        self.pid: Optional[int] = None
+        self.started_at: Optional[float] = None
+        self.timed_out = False
+        self.resubmits = 0
+
+
+def _init_process(started_queue):
+    """Инициализатор дочернего процесса"""
+    global _started_queue
+    _started_queue = started_queue
+
+
+def _parse_in_process(
+    task_id: int, attempt_no: int, file_bytes: bytes, filename: str, max_pages: int, timeout: float
+) -> str:
+    """Выполняется в дочернем процессе"""
+    _started_queue.put((task_id, attempt_no, os.getpid()))
+    return DocumentParser.parse_file(
+        file_bytes, filename, max_pages=max_pages, deadline=time.monotonic() + timeout
+    )
+
+
+def _watch():
+    """Сторожевой поток: отмечает начало парсинга и завершает зависшие процессы"""
+    while True:
+        try:
+            task_id, attempt_no, pid = _started.get(timeout=1)
+            with _lock:
+                task = _tasks.get(task_id)
+                # Сообщение от попытки в уже сломанном пуле не относится к текущей
+                if task is not None and task.resubmits == attempt_no:
+                    task.pid, task.started_at = pid, time.monotonic()
+        except Empty:
+            pass
+
+        now = time.monotonic()
+        with _lock:
+            hung = [
+                task for task in _tasks.values()
+                if task.started_at is not None and not task.timed_out
+                and now - task.started_at > PARSE_TIMEOUT + _HARD_TIMEOUT_GRACE
+            ]
+            for task in hung:
+                task.timed_out = True
+
+        for task in hung:
+            # Процесс не прервался сам (завис внутри одной страницы)
+            print(f"♻️ Парсинг {task.filename} завис — процесс {task.pid} остановлен")
+            try:
+                os.kill(task.pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Вызывается под _lock"""
+    global _executor, _started
+    if _started is None:
+        _started = _spawn.Queue()
+        threading.Thread(target=_watch, name="parse-pool-watchdog", daemon=True).start()
+    if _executor is None:
+        # spawn, а не fork: процесс Streamlit многопоточный
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, PARSE_WORKERS),
+            mp_context=_spawn,
+            initializer=_init_process,
+            initargs=(_started,)
+        )
+    return _executor
+
+
+def _send(task: _Task):
+    """Отправляет (или повторно отправляет) документ в текущий пул"""
+    args = (task.id, task.resubmits, task.file_bytes, task.filename, PARSE_MAX_PAGES, PARSE_TIMEOUT)
+    with _lock:
+        task.pid = task.started_at = None
+        _tasks[task.id] = task
+        try:
+            task.executor = _get_executor()
+            attempt = task.executor.submit(_parse_in_process, *args)
+        except (BrokenProcessPool, RuntimeError):
+            # Пул уже сломан, но колбэки его задач ещё не отработали — сразу новый
+            _drop_executor(task.executor)
+            task.executor = _get_executor()
+            attempt = task.executor.submit(_parse_in_process, *args)
+        task.attempt = attempt
+    attempt.add_done_callback(lambda done: _on_attempt_done(task, done))
+
+
+def _drop_executor(executor: ProcessPoolExecutor):
+    """Вызывается под _lock: сломанный пул больше не используется, следующий вызов создаст новый"""
+    global _executor
+    if _executor is executor:
+        _executor = None
+        executor.shutdown(wait=False)
+
+
+def _on_attempt_done(task: _Task, attempt: Future):
+    with _lock:
+        if task.attempt is not attempt:
+            return
+        if task.future.cancelled() or attempt.cancelled():
+            _tasks.pop(task.id, None)
+            return
+
+        error = attempt.exception()
+        resend = False
+        if isinstance(error, BrokenProcessPool):
+            _drop_executor(task.executor)
+            if task.timed_out:
+                error = ValueError(f"Парсинг {task.filename} не уложился в {PARSE_TIMEOUT:g} с")
+            elif task.resubmits >= _MAX_RESUBMITS:
+                error = ValueError(f"Процесс парсинга {task.filename} аварийно завершился")
+            else:
+                # Документ пострадал из-за соседнего — отправляем заново в новый пул
+                task.resubmits += 1
+                resend = True
+        if not resend:
+            _tasks.pop(task.id, None)
+
+    if resend:
+        _send(task)
+        return
+
+    try:
+        if error is not None:
+            task.future.set_exception(error)
+        else:
+            task.future.set_result(attempt.result())
+    except InvalidStateError:
+        # Future отменили (discard) после проверки выше
+        pass
+
+
+def _check_size(file_bytes: bytes, filename: str):
+    size_mb = len(file_bytes) / (1024 * 1024)
+    if size_mb > PARSE_MAX_FILE_MB:
+        raise ValueError(f"Файл {filename} слишком большой: {size_mb:.1f} МБ (лимит {PARSE_MAX_FILE_MB:g} МБ)")
+
+
+def _submit(file_bytes: bytes, filename: str) -> Future:
+    task = _Task(file_bytes, filename)
+    _send(task)
+    return task.future
+
+
+def content_hash(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def prefetch(file_bytes: bytes, filename: str):
+    """Запускает парсинг заранее (не больше PARSE_PREFETCH_MAX файлов одновременно)"""
+    if filename.lower().endswith('.txt') or len(file_bytes) > PARSE_MAX_FILE_MB * 1024 * 1024:
+        return
+
+    key = content_hash(file_bytes)
+    with _lock:
+        if key in _inflight or key in _ready or len(_inflight) >= PARSE_PREFETCH_MAX:
+            return
+
+    future = _submit(file_bytes, filename)
+    with _lock:
+        if _inflight.setdefault(key, future) is not future:
+            return
+    # Вне _lock: для уже завершённого Future колбэк вызывается сразу
+    future.add_done_callback(lambda done: _prefetch_done(key, done))
+
+
+def _prefetch_done(key: str, future: Future):
+    """
+    Завершённый парсинг освобождает место в _inflight — иначе файлы, задачи
+    которых так и не взяли (пакет удалён, перезапуск), навсегда занимали бы лимит
+    """
+    with _lock:
+        if _inflight.get(key) is not future:
+            # Уже забран parse_document или отменён discard
+            return
+        del _inflight[key]
+        if future.cancelled():
+            return
+        _ready[key] = future
+        _ready.move_to_end(key)
+        while len(_ready) > PARSE_PREFETCH_MAX:
+            _ready.popitem(last=False)
+
+
+def _take(key: str) -> Optional[Future]:
+    """Вызывается под _lock"""
+    future = _inflight.pop(key, None)
+    return future if future is not None else _ready.pop(key, None)
+
+
+def discard(key: str):
+    """Забывает заранее запущенный парсинг (файл уже есть в БД)"""
+    with _lock:
+        future = _take(key)
+        task = next((task for task in _tasks.values() if task.future is future), None)
+    if future is not None:
+        future.cancel()
+    if task is not None and task.attempt is not None:
+        task.attempt.cancel()
+
+
+def parse_document(file_bytes: bytes, filename: str, key: Optional[str] = None) -> str:
+    """
+    Текст документа, распарсенного в пуле процессов
+
+    Args:
+        file_bytes: Содержимое файла
+        filename: Имя файла (по расширению выбирается парсер)
+        key: sha256 содержимого, если уже посчитан
+
+    Raises:
+        ValueError: Неподдерживаемый формат, ошибка парсинга, превышение лимитов
+    """
+    _check_size(file_bytes, filename)
+
+    # Текстовые файлы не стоят накладных расходов на передачу в процесс
+    if filename.lower().endswith('.txt'):
+        return DocumentParser.parse_file(file_bytes, filename)
+
+    key = key or content_hash(file_bytes)
+    with _lock:
+        future = _take(key)
+
+    if future is None or future.cancelled():
+        future = _submit(file_bytes, filename)
+
+    # Таймаут и падения пула обрабатывает сторожевой поток — Future всегда завершится
+    return future.result()
+
+
+def shutdown():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+        tasks = list(_tasks.values())
+        _tasks.clear()
+        _inflight.clear()
+        _ready.clear()
+    for task in tasks:
+        task.future.cancel()
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
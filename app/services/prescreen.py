@@ -0,0 +1,162 @@
+# app/services/prescreen.py
+"""Предварительный отбор резюме без LLM
+
+Локальная оценка 0-100: доля требуемых hard skills вакансии, найденных
+в тексте резюме (и в извлечённых skills, если структура уже есть), плюс
+соответствие опыта в годах. Слова сравниваются по основам (stem_ru),
+поэтому "микросервисы" в требованиях находит "микросервисной архитектуры".
+
+Оценка дешёвая (миллисекунды на резюме) и используется, чтобы отправлять
+в LLM только лучших кандидатов пакета — см. services/job_queue.py.
+"""
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from services.search_index import stem_ru
+
+# Вклад навыков и опыта в итоговую оценку
+SKILLS_WEIGHT = 0.8
+EXPERIENCE_WEIGHT = 0.2
+
+_TOKEN_RE = re.compile(r"[\w+#]+")
+_PRESENT_RE = r"(?:н\.?\s*в\.?|наст\w*|по\s+наст\w*|сейчас|present|now|current)"
+_YEAR_RANGE_RE = re.compile(
+    rf"((?:19|20)\d{{2}})\s*(?:г\.?|год\w*)?\s*[-–—]\s*((?:19|20)\d{{2}}|{_PRESENT_RE})",
+    re.IGNORECASE
+)
+_YEARS_STATED_RE = re.compile(r"опыт\w*[^\n\d]{0,40}(\d{1,2})\+?\s*(?:год|лет)", re.IGNORECASE)
+
+
+def _stem(token: str) -> str:
+    stem = stem_ru(token)
+    return stem if len(stem) >= 3 else token
+
+
+def _tokens(text: str) -> List[str]:
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower())]
+
+
+def _has_term(term: str, vocabulary: Set[str]) -> bool:
+    if term in vocabulary:
+        return True
+    # Основа может быть короче слова в тексте ("разработ" -> "разработка")
+    return len(term) >= 4 and any(word.startswith(term) for word in vocabulary)
+
+
+def skill_coverage(required: Iterable[str], vocabulary: Set[str]) -> Dict[str, bool]:
+    """
+    Какие требуемые навыки встречаются в резюме
+
+    Навык из нескольких слов ("Spring Boot") считается найденным, если найдены все слова.
+
+    Returns:
+        {навык: найден ли}
+    """
+    coverage = {}
+    for skill in required:
+        terms = _tokens(str(skill))
+        if terms:
+            coverage[str(skill)] = all(_has_term(term, vocabulary) for term in terms)
+    return coverage
+
+
+def _parse_month(value: Any) -> Optional[int]:
+    """'2020-01' / '2020' -> номер месяца от нулевого года; 'present' и т.п. -> текущий месяц"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value or re.fullmatch(_PRESENT_RE, value, re.IGNORECASE):
+        now = datetime.now()
+        return now.year * 12 + now.month - 1
+    match = re.match(r"((?:19|20)\d{2})(?:[-./](\d{1,2}))?", value)
+    if not match:
+        return None
+    month = int(match.group(2) or 1)
+    return int(match.group(1)) * 12 + min(max(month, 1), 12) - 1
+
+
+def _merged_years(intervals: List[tuple]) -> float:
+    """Суммарная длительность интервалов (в месяцах) без учёта пересечений, в годах"""
+    total, current_start, current_end = 0, None, None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total / 12
+
+
+def experience_years(text: Optional[str], structure: Optional[Dict[str, Any]] = None) -> float:
+    """Опыт в годах: по периодам работы из структуры, иначе по тексту"""
+    intervals = []
+
+    for item in (structure or {}).get('experience') or []:
+        if not isinstance(item, dict):
+            continue
+        start = _parse_month(item.get('start_date'))
+        end = _parse_month(item.get('end_date') or 'present')
+        if start is not None and end is not None and end >= start:
+            intervals.append((start, end))
+
+    if not intervals and text:
+        for start_raw, end_raw in _YEAR_RANGE_RE.findall(text):
+            start, end = _parse_month(start_raw), _parse_month(end_raw)
+            if start is not None and end is not None and end >= start:
+                intervals.append((start, end))
+
+    years = _merged_years(intervals)
+
+    if text:
+        stated = [int(value) for value in _YEARS_STATED_RE.findall(text)]
+        if stated:
+            years = max(years, max(stated))
+
+    return years
+
+
+def prescore(
+    text: Optional[str],
+    requirements: Dict[str, Any],
+    structure: Optional[Dict[str, Any]] = None
+) -> Optional[float]:
+    """
+    Локальная оценка соответствия резюме вакансии (0-100)
+
+    Args:
+        text: Текст резюме (может отсутствовать для резюме, загруженных как JSON)
+        requirements: requirements вакансии (hard_skills, experience_years)
+        structure: Структура резюме, если уже извлечена
+
+    Returns:
+        Оценка или None, если в вакансии нет ни навыков, ни требуемого опыта
+    """
+    hard_skills = [skill for skill in requirements.get('hard_skills') or [] if str(skill).strip()]
+    try:
+        required_years = float(requirements.get('experience_years') or 0)
+    except (TypeError, ValueError):
+        required_years = 0
+
+    if not hard_skills and not required_years:
+        return None
+
+    vocabulary = set(_tokens(text or ""))
+    for skill in (structure or {}).get('skills') or []:
+        vocabulary.update(_tokens(str(skill)))
+
+    parts, weights = [], []
+
+    if hard_skills:
+        coverage = skill_coverage(hard_skills, vocabulary)
+        parts.append(sum(coverage.values()) / len(coverage) if coverage else 0)
+        weights.append(SKILLS_WEIGHT)
+
+    if required_years:
+        parts.append(min(experience_years(text, structure) / required_years, 1.0))
+        weights.append(EXPERIENCE_WEIGHT)
+
+    return round(100 * sum(p * w for p, w in zip(parts, weights)) / sum(weights), 1)
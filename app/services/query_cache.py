@@ -0,0 +1,92 @@
+# app/services/query_cache.py
+"""Кэш запросов чтения на уровне процесса и шина инвалидации
+
+Функции чтения помечаются @cached("matches", ...) — результат хранится до
+тех пор, пока путь записи не вызовет invalidate() по одной из тем.
+Reruns Streamlit без изменений данных в БД не ходят.
+
+Темы:
+    vacancies       список вакансий
+    matches         кандидаты, их статусы, счётчики и аналитика
+    comments        комментарии к кандидатам
+    status_history  история смены статусов
+    llm_calls       метрики вызовов LLM
+"""
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+from config import QUERY_CACHE_MAX_ENTRIES
+
+TOPICS = ("vacancies", "matches", "comments", "status_history", "llm_calls")
+
+_lock = threading.Lock()
+_entries: "OrderedDict[tuple, tuple[tuple[str, ...], Any]]" = OrderedDict()
+_generations: Dict[str, int] = {topic: 0 for topic in TOPICS}
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def cached(*topics: str) -> Callable:
+    """
+    Декоратор: кэширует результат функции по аргументам до инвалидации тем
+
+    Аргументы функции должны быть хэшируемыми (списки передавать кортежами).
+    Возвращаемые ORM-объекты отсоединены от сессии и общие для всех
+    пользователей — их нельзя изменять.
+    """
+    unknown = set(topics) - set(TOPICS)
+    if unknown:
+        raise ValueError(f"Неизвестные темы кэша: {unknown}")
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+
+            with _lock:
+                entry = _entries.get(key)
+                if entry is not None:
+                    _entries.move_to_end(key)
+                    _stats["hits"] += 1
+                    return entry[1]
+                _stats["misses"] += 1
+                generations = tuple(_generations[topic] for topic in topics)
+
+            value = func(*args, **kwargs)
+
+            with _lock:
+                # Если во время запроса прошла запись — результат мог устареть, не сохраняем
+                if generations == tuple(_generations[topic] for topic in topics):
+                    _entries[key] = (topics, value)
+                    while len(_entries) > QUERY_CACHE_MAX_ENTRIES:
+                        _entries.popitem(last=False)
+
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate(*topics: str):
+    """Сбрасывает все закэшированные результаты, зависящие от указанных тем"""
+    topics = set(topics)
+    with _lock:
+        for topic in topics:
+            _generations[topic] += 1
+
+        stale = [key for key, (entry_topics, _) in _entries.items() if topics.intersection(entry_topics)]
+        for key in stale:
+            del _entries[key]
+
+        _stats["invalidations"] += 1
+
+
+def clear():
+    invalidate(*TOPICS)
+
+
+def get_stats() -> Dict[str, Any]:
+    with _lock:
+        return {**_stats, "entries": len(_entries)}
@@ -0,0 +1,151 @@
+# app/services/resume_store.py
+"""Хранилище резюме: исходные файлы, нормализованный текст и извлечённая структура
+
+Файл сохраняется один раз по sha256 содержимого, резюме — по sha256
+нормализованного текста. Повторная загрузка того же файла не парсится заново,
+а резюме с уже извлечённой структурой не отправляется на извлечение в LLM:
+для оценки под другую вакансию остаётся только analyze_resume.
+"""
+import hashlib
+import json
+import re
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from db.models import SessionLocal, Resume, ResumeDocument
+from services import parse_pool
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Текст резюме без мусорных символов и лишних пробелов (строки сохраняются)"""
+    text = text.replace("\x00", "").replace("\r\n", "\n").replace("\r", "\n")
+    lines = [re.sub(r"[ \t ]+", " ", line).strip() for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def _text_hash(text: Optional[str], structure: Optional[Dict[str, Any]] = None) -> str:
+    # Для резюме без текста (загружено как JSON) хэшируем саму структуру
+    if text is None:
+        text = json.dumps(structure or {}, ensure_ascii=False, sort_keys=True)
+    return sha256(text.encode("utf-8"))
+
+
+def _get_or_create_resume(db, text: Optional[str], structure: Optional[Dict[str, Any]] = None) -> Resume:
+    text_hash = _text_hash(text, structure)
+    resume = db.query(Resume).filter(Resume.text_hash == text_hash).first()
+    if resume is not None:
+        return resume
+
+    resume = Resume(text_hash=text_hash, text=text)
+    if structure is not None:
+        resume.structure_json = json.dumps(structure, ensure_ascii=False)
+        resume.name = structure.get('name')
+    db.add(resume)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Параллельный воркер успел сохранить то же резюме
+        db.rollback()
+        resume = db.query(Resume).filter(Resume.text_hash == text_hash).one()
+    return resume
+
+
+def store_file(file_bytes: bytes, filename: str) -> Tuple[int, str]:
+    """
+    Сохраняет файл резюме и его текст; уже известный файл не парсится повторно
+
+    Returns:
+        (ID резюме, нормализованный текст)
+    """
+    content_hash = sha256(file_bytes)
+
+    db = SessionLocal()
+    try:
+        document = db.query(ResumeDocument).filter(ResumeDocument.content_hash == content_hash).first()
+        if document is not None and document.resume is not None and document.resume.text is not None:
+            print(f"♻️ Файл уже загружался: {filename} -> резюме {document.resume_id}")
+            parse_pool.discard(content_hash)
+            return document.resume_id, document.resume.text
+    finally:
+        db.close()
+
+    # Парсинг — вне сессии, в пуле процессов (возможно, уже запущен заранее)
+    text = normalize_text(parse_pool.parse_document(file_bytes, filename, key=content_hash))
+
+    db = SessionLocal()
+    try:
+        resume = _get_or_create_resume(db, text)
+
+        document = db.query(ResumeDocument).filter(ResumeDocument.content_hash == content_hash).first()
+        if document is None:
+            db.add(ResumeDocument(
+                content_hash=content_hash,
+                filename=filename,
+                size_bytes=len(file_bytes),
+                file_bytes=file_bytes,
+                resume_id=resume.id
+            ))
+        else:
+            document.resume_id = resume.id
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+
+        return resume.id, text
+    finally:
+        db.close()
+
+
+def store_structure(resume_id: int, structure: Dict[str, Any], model_id: Optional[str] = None):
+    """Сохраняет структуру, извлечённую ResumeExtractor (или комбинированным запросом)"""
+    db = SessionLocal()
+    try:
+        db.query(Resume).filter(Resume.id == resume_id).update({
+            "structure_json": json.dumps(structure, ensure_ascii=False),
+            "name": structure.get('name'),
+            "extracted_by": model_id,
+            "updated_at": datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def store_structured(structure: Dict[str, Any]) -> int:
+    """Сохраняет резюме, загруженное сразу в виде JSON-структуры; возвращает ID"""
+    db = SessionLocal()
+    try:
+        return _get_or_create_resume(db, None, structure).id
+    finally:
+        db.close()
+
+
+def get_resume(resume_id: int) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Текст и извлечённая структура резюме"""
+    db = SessionLocal()
+    try:
+        row = db.query(Resume.text, Resume.structure_json).filter(Resume.id == resume_id).first()
+    finally:
+        db.close()
+
+    if row is None:
+        return None, None
+    return row.text, json.loads(row.structure_json) if row.structure_json else None
+
+
+def get_structure(resume_id: int) -> Optional[Dict[str, Any]]:
+    """Извлечённая структура резюме или None, если её ещё нет"""
+    db = SessionLocal()
+    try:
+        structure_json = db.query(Resume.structure_json).filter(Resume.id == resume_id).scalar()
+    finally:
+        db.close()
+
+    return json.loads(structure_json) if structure_json else None
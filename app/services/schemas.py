@@ -0,0 +1,180 @@
+# app/services/schemas.py
+"""Схемы JSON-ответов LLM: модели для валидации и JSON Schema для response_format"""
+from typing import Annotated, Dict, Any, List, Optional, Tuple, Union, Literal
+from pydantic import AfterValidator, BaseModel, Field, ValidationError
+
+# Оценка 0-100; целые остаются int ("75" и 75 -> 75), чтобы в UI не было "75.0%"
+Score = Annotated[float, Field(ge=0, le=100), AfterValidator(lambda v: int(v) if v.is_integer() else v)]
+
+
+class MatchingScore(BaseModel):
+    overall: Score
+    hard_skills: Score
+    hard_skills_reasoning: str = ""
+    experience: Score
+    experience_reasoning: str = ""
+    cultural_fit: Score = 0
+    cultural_fit_reasoning: str = ""
+    communication: Score = 0
+    communication_reasoning: str = ""
+    growth_potential: Score = 0
+    growth_potential_reasoning: str = ""
+    stability: Score = 0
+    stability_reasoning: str = ""
+
+
+class AnalysisResult(BaseModel):
+    matching_score: MatchingScore
+    summary: str = ""
+    strengths: List[str] = []
+    weaknesses: List[str] = []
+    missing_skills: List[str] = []
+    red_flags: List[str] = []
+    recommendation: Literal["YES", "NO", "MAYBE"]
+    confidence_level: Literal["HIGH", "MEDIUM", "LOW"] = "MEDIUM"
+    interview_questions: List[str] = []
+    next_steps: List[str] = []
+    salary_expectation_fit: Literal["MATCH", "BELOW", "ABOVE", "UNCLEAR"] = "UNCLEAR"
+    availability: Literal["IMMEDIATE", "NOTICE_PERIOD", "UNCLEAR"] = "UNCLEAR"
+
+
+class ExperienceItem(BaseModel):
+    company: str = ""
+    position: str = ""
+    start_date: str = ""
+    end_date: str = ""
+    description: str = ""
+
+
+class EducationItem(BaseModel):
+    institution: str = ""
+    degree: str = ""
+    year: Union[str, int] = ""
+
+
+class ResumeStructure(BaseModel):
+    name: str
+    age: Optional[Union[int, str]] = None
+    gender: str = "Не указано"
+    email: str = ""
+    phone: str = ""
+    skills: List[str] = []
+    experience: List[ExperienceItem] = []
+    education: List[EducationItem] = []
+
+
+class VacancyRequirements(BaseModel):
+    hard_skills: List[str] = []
+    soft_skills: List[str] = []
+    experience_years: Union[int, float] = 0
+
+
+class VacancyStructure(BaseModel):
+    title: str
+    company: str
+    requirements: VacancyRequirements
+    responsibilities: str = ""
+
+
+class CombinedResult(BaseModel):
+    resume: ResumeStructure
+    analysis: AnalysisResult
+
+
+# kind (как в LLMClient.call_llm_json) -> модель ответа
+SCHEMAS = {
+    "analysis": AnalysisResult,
+    "resume": ResumeStructure,
+    "vacancy": VacancyStructure,
+    "combined": CombinedResult,
+}
+
+_json_schema_cache: Dict[str, Dict[str, Any]] = {}
+
+
+def get_response_format(kind: str) -> Optional[Dict[str, Any]]:
+    """
+    Возвращает response_format для /v1/chat/completions
+
+    llama.cpp и vLLM по нему ограничивают генерацию грамматикой схемы.
+    """
+    model = SCHEMAS.get(kind)
+    if model is None:
+        return None
+
+    if kind not in _json_schema_cache:
+        _json_schema_cache[kind] = model.model_json_schema()
+
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": kind, "schema": _json_schema_cache[kind]}
+    }
+
+
+def _field_path(loc: Tuple[Union[str, int], ...], data: Any) -> Tuple[Union[str, int], ...]:
+    """
+    Путь к полю без суффикса варианта Union: pydantic сообщает об ошибке
+    поля Union[int, str] дважды — ('age', 'int') и ('age', 'str')
+    """
+    path = []
+    current = data
+    for key in loc:
+        if isinstance(current, dict):
+            path.append(key)
+            if key not in current:
+                # Отсутствующее поле — дальше идти некуда
+                break
+            current = current[key]
+        elif isinstance(current, list) and isinstance(key, int) and 0 <= key < len(current):
+            path.append(key)
+            current = current[key]
+        else:
+            # Значение не контейнер (или индекс не подходит) — остаток loc это имя варианта Union
+            break
+    return tuple(path) or tuple(loc[:1])
+
+
+def validate(kind: str, data: Any) -> List[Tuple[Tuple[Union[str, int], ...], str]]:
+    """
+    Проверяет ответ по схеме
+
+    Returns:
+        Список ошибок (путь к полю, сообщение), по одной на поле; пустой — ответ корректен
+    """
+    model = SCHEMAS.get(kind)
+    if model is None:
+        return []
+
+    try:
+        model.model_validate(data)
+        return []
+    except ValidationError as e:
+        grouped: Dict[Tuple[Union[str, int], ...], List[str]] = {}
+        for err in e.errors():
+            messages = grouped.setdefault(_field_path(tuple(err['loc']), data), [])
+            if err['msg'] not in messages:
+                messages.append(err['msg'])
+        return [(path, " или ".join(messages)) for path, messages in grouped.items()]
+
+
+def normalize(kind: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Ответ после проверки по схеме: значения приведены к типам ("75" -> 75.0), пропуски — по умолчанию"""
+    model = SCHEMAS.get(kind)
+    if model is None:
+        return data
+    return model.model_validate(data).model_dump()
+
+
+def format_path(path: Tuple[Union[str, int], ...]) -> str:
+    return ".".join(str(p) for p in path)
+
+
+def set_path(data: Dict[str, Any], path: Tuple[Union[str, int], ...], value: Any):
+    """Записывает значение по пути (создаёт промежуточные словари при необходимости)"""
+    target = data
+    for key in path[:-1]:
+        if isinstance(target, dict):
+            target = target.setdefault(key, {})
+        else:
+            target = target[key]
+    target[path[-1]] = value
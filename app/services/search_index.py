@@ -0,0 +1,240 @@
+# app/services/search_index.py
+"""Полнотекстовый поиск по кандидатам: имя, текст резюме, анализ LLM, комментарии
+
+SQLite: виртуальная таблица FTS5 match_search, синхронизируется триггерами
+на matches и comments (в том числе при массовых UPDATE/DELETE в обход ORM).
+В FTS5 нет русского стеммера, поэтому слова запроса приводятся к основе
+лёгким стеммером (окончания по Snowball) и ищутся как префиксы: "разработчиками"
+-> "разработчик"* находит "разработчика", "разработчики" и т.д.
+
+Поиск работает только на SQLite, как и сводки метрик (julianday в utils/metrics.py).
+"""
+import re
+from typing import List, Optional
+
+from sqlalchemy import text, literal_column
+from sqlalchemy.orm import Session
+
+from db.models import SessionLocal
+
+FTS_TABLE = "match_search"
+FTS_COLUMNS = ["match_id", "name", "resume_text", "analysis", "comments"]
+
+# Веса колонок для bm25 (match_id не индексируется, вес 0)
+FTS_WEIGHTS = (0.0, 10.0, 1.0, 4.0, 2.0)
+
+# Текст резюме из services/resume_store.py (у старых кандидатов его нет)
+_RESUME_SQL = "coalesce((SELECT r.text FROM resumes r WHERE r.id = {src}.resume_id), '')"
+
+# Текст анализа для индекса: summary, strengths, missing_skills
+_ANALYSIS_SQL = """
+    coalesce(json_extract({src}.analysis_json, '$.summary'), '') || ' ' ||
+    coalesce((SELECT group_concat(value, ' ') FROM json_each({src}.analysis_json, '$.strengths')), '') || ' ' ||
+    coalesce((SELECT group_concat(value, ' ') FROM json_each({src}.analysis_json, '$.missing_skills')), '')
+"""
+
+_COMMENTS_SQL = """
+    coalesce((SELECT group_concat(c.text || ' ' || coalesce(c.tags, ''), ' ')
+              FROM comments c WHERE c.match_id = {match_id}), '')
+"""
+
+
+def _fold(expr: str) -> str:
+    """unicode61 не приводит ё к е — делаем это при индексации (и в запросе, см. stem_ru)"""
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _ddl() -> List[str]:
+    new_name = _fold("new.resume_name")
+    new_resume = _fold(_RESUME_SQL.format(src="new"))
+    new_analysis = _fold(_ANALYSIS_SQL.format(src="new"))
+    return [
+        f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            match_id UNINDEXED, name, resume_text, analysis, comments,
+            tokenize = 'unicode61 remove_diacritics 2'
+        )""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_match_ai AFTER INSERT ON matches
+            WHEN json_valid(new.analysis_json)
+        BEGIN
+            INSERT INTO {FTS_TABLE} (match_id, name, resume_text, analysis, comments)
+            VALUES (new.id, {new_name}, {new_resume}, {new_analysis}, '');
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_match_au AFTER UPDATE OF resume_name, resume_id, analysis_json ON matches
+        BEGIN
+            DELETE FROM {FTS_TABLE} WHERE match_id = old.id;
+            INSERT INTO {FTS_TABLE} (match_id, name, resume_text, analysis, comments)
+            SELECT new.id, {new_name}, {new_resume}, {new_analysis}, {_fold(_COMMENTS_SQL.format(match_id="new.id"))}
+            WHERE json_valid(new.analysis_json);
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_match_ad AFTER DELETE ON matches
+        BEGIN
+            DELETE FROM {FTS_TABLE} WHERE match_id = old.id;
+        END""",
+    ] + [
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_comment_{suffix} AFTER {event} ON comments
+        BEGIN
+            UPDATE {FTS_TABLE} SET comments = {_fold(_COMMENTS_SQL.format(match_id=f"{ref}.match_id"))}
+            WHERE match_id = {ref}.match_id;
+        END"""
+        for suffix, event, ref in (("ai", "INSERT", "new"), ("ad", "DELETE", "old"), ("au", "UPDATE", "new"))
+    ]
+
+
+def rebuild_search_index(db: Session = None) -> int:
+    """Перезаполняет FTS-индекс из matches и comments (исправляет расхождения)"""
+    own_session = db is None
+    db = db or SessionLocal()
+    try:
+        db.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        db.execute(text(f"""
+            INSERT INTO {FTS_TABLE} (match_id, name, resume_text, analysis, comments)
+            SELECT m.id, {_fold("m.resume_name")}, {_fold(_RESUME_SQL.format(src="m"))},
+                   {_fold(_ANALYSIS_SQL.format(src="m"))},
+                   {_fold(_COMMENTS_SQL.format(match_id="m.id"))}
+            FROM matches m
+            WHERE json_valid(m.analysis_json)
+        """))
+        db.commit()
+        count = db.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+        print(f"🔎 Поисковый индекс перестроен: {count} кандидатов")
+        return count
+    finally:
+        if own_session:
+            db.close()
+
+
+_index_checked = False
+
+
+def ensure_search_index():
+    """Создаёт FTS-таблицу и триггеры (раз на процесс); для новой таблицы — первичное заполнение"""
+    global _index_checked
+    if _index_checked:
+        return
+    _index_checked = True
+
+    db = SessionLocal()
+    try:
+        columns = [row[1] for row in db.execute(text(f"PRAGMA table_info({FTS_TABLE})")).fetchall()]
+        if columns and columns != FTS_COLUMNS:
+            # Набор колонок изменился — пересоздаём таблицу и триггеры
+            db.execute(text(f"DROP TABLE {FTS_TABLE}"))
+            for (name,) in db.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE :prefix"
+            ), {"prefix": f"{FTS_TABLE}_%"}).fetchall():
+                db.execute(text(f"DROP TRIGGER {name}"))
+            columns = []
+
+        for statement in _ddl():
+            db.execute(text(statement))
+        db.commit()
+
+        if not columns:
+            rebuild_search_index(db)
+    finally:
+        db.close()
+
+
+# --- Стемминг запроса -------------------------------------------------------
+
+_VOWELS = "аеиоуыэюя"
+
+_PERFECTIVE_GERUND = re.compile(r"((ив|ивши|ившись|ыв|ывши|ывшись)|((?<=[ая])(в|вши|вшись)))$")
+_REFLEXIVE = re.compile(r"(с[яь])$")
+_ADJECTIVE = re.compile(r"(ее|ие|ые|ое|ими|ыми|ей|ий|ый|ой|ем|им|ым|ом|его|ого|ему|ому|их|ых|ую|юю|ая|яя|ою|ею)$")
+_PARTICIPLE = re.compile(r"((ивш|ывш|ующ)|((?<=[ая])(ем|нн|вш|ющ|щ)))$")
+_VERB = re.compile(
+    r"((ила|ыла|ена|ейте|уйте|ите|или|ыли|ей|уй|ил|ыл|им|ым|ен|ило|ыло|ено|ят|ует|уют|ит|ыт|ены|ить|ыть|ишь|ую|ю)"
+    r"|((?<=[ая])(ла|на|ете|йте|ли|й|л|ем|н|ло|но|ет|ют|ны|ть|ешь|нно)))$"
+)
+_NOUN = re.compile(
+    r"(а|ев|ов|ие|ье|е|иями|ями|ами|еи|ии|и|ией|ей|ой|ий|й|иям|ям|ием|ем|ам|ом|о|у|ах|иях|ях|ы|ь|ию|ью|ю|ия|ья|я)$"
+)
+_DERIVATIONAL = re.compile(r"(ост|ость)$")
+_SUPERLATIVE = re.compile(r"(ейше|ейш)$")
+
+
+def _rv_start(word: str) -> int:
+    for i, ch in enumerate(word):
+        if ch in _VOWELS:
+            return i + 1
+    return len(word)
+
+
+def stem_ru(word: str) -> str:
+    """
+    Лёгкий русский стеммер (шаги Snowball без R2-тонкостей)
+
+    Достаточно точен для префиксного поиска: лишнее усечение только
+    расширяет выдачу, а bm25 ставит точные совпадения выше.
+    """
+    word = word.lower().replace("ё", "е")
+    if not re.search(r"[а-я]", word):
+        return word
+
+    start = _rv_start(word)
+    prefix, rv = word[:start], word[start:]
+
+    stripped = _PERFECTIVE_GERUND.sub("", rv, count=1)
+    if stripped == rv:
+        rv = _REFLEXIVE.sub("", rv, count=1)
+        stripped = _ADJECTIVE.sub("", rv, count=1)
+        if stripped != rv:
+            stripped = _PARTICIPLE.sub("", stripped, count=1)
+        else:
+            stripped = _VERB.sub("", rv, count=1)
+            if stripped == rv:
+                stripped = _NOUN.sub("", rv, count=1)
+    rv = stripped
+
+    if rv.endswith("и"):
+        rv = rv[:-1]
+    rv = _DERIVATIONAL.sub("", rv, count=1)
+    rv = _SUPERLATIVE.sub("", rv, count=1)
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    elif rv.endswith("ь"):
+        rv = rv[:-1]
+
+    return prefix + rv
+
+
+def build_fts_query(user_query: str) -> Optional[str]:
+    """
+    Запрос пользователя -> выражение FTS5 MATCH
+
+    Каждое слово приводится к основе и ищется как префикс; слова
+    объединяются через AND (все должны встретиться).
+    """
+    terms = []
+    for token in re.findall(r"\w+", user_query.lower()):
+        stem = stem_ru(token)
+        if len(stem) < 3:
+            stem = token
+        terms.append(f'"{stem}"*')
+    return " ".join(terms) if terms else None
+
+
+def search_subquery(search_query: str):
+    """
+    Подзапрос (match_id, rank) для полнотекстового поиска; rank — чем меньше, тем выше
+
+    Returns:
+        Подзапрос для JOIN с matches или None, если в запросе нет слов
+    """
+    fts_query = build_fts_query(search_query)
+    if fts_query is None:
+        return None
+
+    fts = text(
+        f"SELECT match_id, bm25({FTS_TABLE}, {', '.join(str(w) for w in FTS_WEIGHTS)}) AS rank "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts_query"
+    ).bindparams(fts_query=fts_query).columns(
+        literal_column("match_id"), literal_column("rank")
+    )
+    return fts.subquery("fts")
+
+
+if __name__ == "__main__":
+    ensure_search_index()
+    rebuild_search_index()
@@ -0,0 +1,185 @@
+# app/services/text_compactor.py
+"""Сжатие текста резюме и вакансий перед отправкой в LLM
+
+Вместо обрезки text[:2500] (теряется всё после лимита — навыки в конце
+длинного резюме, а короткое резюме отправляется вместе с колонтитулами):
+
+1. compact_text: удаляет повторяющиеся колонтитулы, номера страниц,
+   служебные строки и лишние пробелы;
+2. split_sections: находит разделы (опыт, навыки, образование...) по заголовкам;
+3. pack: укладывает разделы в бюджет токенов по приоритету — каждому разделу
+   достаётся своя доля, неиспользованное перераспределяется, порядок
+   разделов в тексте сохраняется.
+
+Сэкономленные токены по каждому вызову копятся в get_compaction_stats().
+"""
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from config import RESUME_TEXT_TOKEN_BUDGET, VACANCY_TEXT_TOKEN_BUDGET
+
+# Грубая оценка для смешанного русско-английского текста (токенизаторы
+# современных моделей: ~3 символа кириллицы и ~4 латиницы на токен)
+CHARS_PER_TOKEN = 3.2
+
+# Разделы: (название, шаблон заголовка, доля бюджета); header — текст до первого заголовка
+RESUME_SECTIONS = [
+    ("header", None, 0.15),
+    ("skills", r"ключевые навыки|навыки|hard skills|skills|технологии|технический стек|стек|компетенции", 0.25),
+    ("experience", r"опыт работы|опыт|трудовая деятельность|места работы|work experience|experience|employment", 0.40),
+    ("about", r"о себе|обо мне|summary|about me|профиль|profile|цель", 0.08),
+    ("education", r"образование|education|курсы|сертификаты|повышение квалификации|certifications", 0.08),
+    ("languages", r"знание языков|языки|languages", 0.04),
+]
+
+VACANCY_SECTIONS = [
+    ("header", None, 0.15),
+    ("requirements", r"требования|мы ждем|мы ждём|ожидаем|что нужно|необходимые навыки|нам важно|requirements|qualifications", 0.40),
+    ("responsibilities", r"обязанности|задачи|чем предстоит заниматься|responsibilities", 0.25),
+    ("nice_to_have", r"будет плюсом|плюсом будет|желательно|nice to have", 0.10),
+    ("conditions", r"условия|мы предлагаем|что мы предлагаем|предлагаем|benefits", 0.05),
+    ("company", r"о компании|о нас|about us|кто мы", 0.05),
+]
+
+_PAGE_NUMBER_RE = re.compile(r"^(?:стр\.?|страница|page)?\s*[-–]?\s*\d{1,3}\s*[-–]?\s*(?:(?:из|of|/)\s*\d{1,3})?$", re.IGNORECASE)
+_BOILERPLATE_RE = re.compile(r"^(?:резюме обновлено|curriculum vitae$|резюме$|cv$)", re.IGNORECASE)
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, int]] = {}
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN + 0.5)
+
+
+def compact_text(text: str) -> str:
+    """Текст без колонтитулов, номеров страниц, повторов строк и лишних пробелов"""
+    lines = [re.sub(r"[ \t ]+", " ", line).strip() for line in text.replace("\r", "\n").split("\n")]
+
+    # Колонтитулы: строки, дословно повторяющиеся на каждой странице
+    # (подзаголовки вида "Обязанности:" повторяются законно — их не трогаем)
+    repeats = Counter(line for line in lines if 15 <= len(line) <= 80 and not line.endswith(":"))
+    headers = {line for line, count in repeats.items() if count >= 3}
+
+    result: List[str] = []
+    for line in lines:
+        if line and (line in headers or _PAGE_NUMBER_RE.match(line) or _BOILERPLATE_RE.match(line)):
+            continue
+        if line and result and line == result[-1]:
+            continue
+        if not line and (not result or not result[-1]):
+            continue
+        result.append(line)
+
+    return "\n".join(result).strip()
+
+
+def _header_pattern(sections) -> re.Pattern:
+    alternatives = "|".join(f"(?P<{name}>{pattern})" for name, pattern, _ in sections if pattern)
+    return re.compile(rf"^(?:{alternatives})\s*:?$", re.IGNORECASE)
+
+
+def split_sections(text: str, sections) -> List[Tuple[str, str]]:
+    """
+    Делит текст на разделы по строкам-заголовкам
+
+    Returns:
+        [(название раздела, текст раздела с заголовком)] в порядке следования;
+        текст до первого заголовка — раздел header, нераспознанных нет
+    """
+    pattern = _header_pattern(sections)
+    parts: List[Tuple[str, List[str]]] = [("header", [])]
+
+    for line in text.split("\n"):
+        match = pattern.match(line) if len(line) <= 40 else None
+        if match:
+            parts.append((match.lastgroup, [line]))
+        else:
+            parts[-1][1].append(line)
+
+    return [(name, "\n".join(lines).strip()) for name, lines in parts if "\n".join(lines).strip()]
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Начало раздела по границе строки (в опыте работы первыми идут последние места)"""
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind("\n", 0, max_chars)
+    if cut < max_chars // 2:
+        cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars].rstrip() + " …"
+
+
+def pack(text: str, budget_tokens: int, sections) -> str:
+    """Укладывает разделы текста в бюджет токенов по их долям"""
+    budget_chars = int(budget_tokens * CHARS_PER_TOKEN)
+    if len(text) <= budget_chars:
+        return text
+
+    parts = split_sections(text, sections)
+    shares = {name: share for name, _, share in sections}
+    order = [name for name, _, _ in sections]
+
+    # 1) каждый раздел получает не больше своей доли (повторяющиеся разделы делят долю)
+    counts = Counter(name for name, _ in parts)
+    limits = [
+        min(len(body), int(budget_chars * shares.get(name, 0.05) / counts[name]))
+        for name, body in parts
+    ]
+
+    # 2) остаток бюджета — разделам, которым не хватило, в порядке приоритета
+    spare = budget_chars - sum(limits) - len(parts)
+    for index in sorted(range(len(parts)), key=lambda i: order.index(parts[i][0]) if parts[i][0] in order else len(order)):
+        if spare <= 0:
+            break
+        extra = min(spare, len(parts[index][1]) - limits[index])
+        limits[index] += extra
+        spare -= extra
+
+    packed = [_truncate(body, limit) for (_, body), limit in zip(parts, limits) if limit > 0]
+    return "\n".join(packed)
+
+
+def _record(kind: str, raw: str, packed: str, baseline_chars: int):
+    with _stats_lock:
+        stats = _stats.setdefault(kind, {"calls": 0, "raw_tokens": 0, "baseline_tokens": 0, "packed_tokens": 0})
+        stats["calls"] += 1
+        stats["raw_tokens"] += estimate_tokens(raw)
+        stats["baseline_tokens"] += estimate_tokens(raw[:baseline_chars])
+        stats["packed_tokens"] += estimate_tokens(packed)
+
+
+def prepare_resume_text(text: str, budget_tokens: int = RESUME_TEXT_TOKEN_BUDGET, baseline_chars: int = 2500) -> str:
+    """
+    Текст резюме для промпта: сжатие и укладка разделов в бюджет
+
+    Args:
+        baseline_chars: Прежняя обрезка text[:N] — для статистики экономии
+    """
+    packed = pack(compact_text(text), budget_tokens, RESUME_SECTIONS)
+    _record("resume", text, packed, baseline_chars)
+    return packed
+
+
+def prepare_vacancy_text(text: str, budget_tokens: int = VACANCY_TEXT_TOKEN_BUDGET, baseline_chars: int = 2000) -> str:
+    """Текст вакансии для промпта (требования и обязанности важнее условий и описания компании)"""
+    packed = pack(compact_text(text), budget_tokens, VACANCY_SECTIONS)
+    _record("vacancy", text, packed, baseline_chars)
+    return packed
+
+
+def get_compaction_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Статистика по типам текста: вызовов, токенов до/после и экономия на вызов
+    относительно прежней обрезки
+    """
+    with _stats_lock:
+        snapshot = {kind: dict(stats) for kind, stats in _stats.items()}
+
+    for stats in snapshot.values():
+        calls = stats["calls"] or 1
+        stats["saved_per_call"] = (stats["baseline_tokens"] - stats["packed_tokens"]) / calls
+        stats["packed_per_call"] = stats["packed_tokens"] / calls
+    return snapshot
@@ -2,21 +2,50 @@ import streamlit as st
 import json
 from datetime import datetime
 from db.models import init_db, SessionLocal, Vacancy, Match
-from services.llm_client import LLMClient
-from services.document_parser import DocumentParser, VacancyExtractor, ResumeExtractor
-from config import load_system_prompt
+from services.llm_client import get_llm_client
+from services.document_parser import VacancyExtractor, ResumeExtractor
+from services.parse_pool import parse_document
+from config import (
+    load_system_prompt, RESULTS_PAGE_SIZES, VACANCIES_PAGE_SIZE, PRESCREEN_TOP_K, PRESCREEN_MIN_SCORE
+)
 from pdf_export import generate_pdf_report
 from components.filters import render_filters, show_filter_summary
 from components.status_manager import (
     render_status_badge, render_status_selector, 
-    render_status_history, render_status_overview, get_status_label
+    render_status_history, render_status_overview, get_status_label,
+    get_status_counts_db, render_bulk_status_change
 )
 from components.comments import render_comments
-from utils.search import filter_matches
+from utils.search import search_matches, search_match_ids
+from utils.queries import (
+    get_vacancies, get_vacancy_summaries, count_all_matches,
+    get_matches_by_ids
+)
+from services.query_cache import invalidate
 from pages.analytics import render_analytics_page
+from pages.matrix import render_matrix_page
+from pages.llm_calls import render_llm_calls_page
+from services.search_index import ensure_search_index
+from services.batch_analyzer import save_match
+from services.resume_store import store_structured
+from services.prescreen import prescore
+from components.job_status import render_rescore_action
+from services.analytics_rollup import (
+    ensure_built, on_match_deleted, on_vacancy_matches_deleted
+)
 
 init_db()
 
+# Фоновые воркеры очереди анализа — один пул на процесс, переживает reruns
+from services.job_queue import start_worker
+start_worker()
+
+# Предагрегаты аналитики для БД, созданной до их появления
+ensure_built()
+
+# Полнотекстовый индекс и триггеры синхронизации
+ensure_search_index()
+
 st.set_page_config(page_title="HR Analysis System", layout="wide", page_icon="📊")
 
 st.markdown("""
@@ -205,17 +234,100 @@ with st.sidebar.expander("🤖 Выбор модели анализа"):
     model_config = AVAILABLE_MODELS[current_model]
     st.info(f"**Текущая модель:** {model_config['name']}\n\n{model_config['description']}")
 
+with st.sidebar.expander("⚡ Кэш LLM"):
+    from services import llm_cache
+    
+    cache_stats = llm_cache.get_stats()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Попаданий", cache_stats['hits'])
+    with col2:
+        st.metric("Промахов", cache_stats['misses'])
+    st.caption(f"Hit rate: {cache_stats['hit_rate']:.0f}% | Записей: {cache_stats['entries']}")
+    
+    if st.button("🧹 Очистить кэш"):
+        removed = llm_cache.clear()
+        st.success(f"Удалено записей: {removed}")
+
+with st.sidebar.expander("🖧 Узлы LLM"):
+    from services.llm_router import get_router
+
+    breaker_labels = {"closed": "✅", "half_open": "🟡 проба", "open": "⛔ исключён"}
+    st.dataframe([
+        {
+            "Узел": node['url'],
+            "Модель": node['active_model'] or ("все" if not node['models'] else ", ".join(node['models'])),
+            "Запросов": f"{node['pending']} / {node['slots']}",
+            "Состояние": breaker_labels[node['breaker']]
+        }
+        for node in get_router().snapshot()
+    ], use_container_width=True)
+
+with st.sidebar.expander("🗄️ Кэш запросов"):
+    from services import query_cache
+    
+    query_stats = query_cache.get_stats()
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Попаданий", query_stats['hits'])
+    with col2:
+        st.metric("Промахов", query_stats['misses'])
+    st.caption(f"Записей: {query_stats['entries']} | Сбросов: {query_stats['invalidations']}")
+
+with st.sidebar.expander("🧪 Разбор JSON по моделям"):
+    from services.llm_client import get_parse_stats
+    
+    parse_stats = get_parse_stats()
+    if not parse_stats:
+        st.caption("Вызовов LLM в этом процессе ещё не было")
+    else:
+        st.dataframe([
+            {
+                "Модель": model_id,
+                "Вызовов": stats['calls'],
+                "Автофикс": stats['repaired'],
+                "Перезапрос": stats['reasked'],
+                "Ошибок": stats['failed'],
+                "Доля ошибок": f"{stats['failure_rate']:.1f}%"
+            }
+            for model_id, stats in parse_stats.items()
+        ], use_container_width=True)
+
+with st.sidebar.expander("✂️ Сжатие текста"):
+    from services.text_compactor import get_compaction_stats
+
+    compaction_stats = get_compaction_stats()
+    if not compaction_stats:
+        st.caption("Текстов в этом процессе ещё не отправлялось")
+    else:
+        st.dataframe([
+            {
+                "Текст": {"resume": "Резюме", "vacancy": "Вакансия"}.get(kind, kind),
+                "Вызовов": stats['calls'],
+                "Токенов/вызов": f"{stats['packed_per_call']:.0f}",
+                "Экономия/вызов": f"{stats['saved_per_call']:.0f}"
+            }
+            for kind, stats in compaction_stats.items()
+        ], use_container_width=True)
+        st.caption("Экономия — относительно прежней обрезки text[:N]; токены оценены по длине текста")
+
 st.sidebar.divider()
 
 if st.button("🔄 Перезагрузить промпты"):
         st.session_state['prompt_reloaded'] = True
         st.rerun()
 
-page = st.sidebar.radio("Навигация", ["Вакансии", "Анализ", "Результаты", "Аналитика", "Kanban", "Сравнение"])
+page = st.sidebar.radio("Навигация", ["Вакансии", "Анализ", "Результаты", "Аналитика", "Матрица", "LLM", "Kanban", "Сравнение"])
 
 if page == "Аналитика":
     render_analytics_page()
 
+elif page == "Матрица":
+    render_matrix_page()
+
+elif page == "LLM":
+    render_llm_calls_page()
+
 elif page == "Вакансии":
     st.title("Управление вакансиями")
     
@@ -254,6 +366,7 @@ elif page == "Вакансии":
                     db.add(vacancy)
                     db.commit()
                     db.close()
+                    invalidate("vacancies")
                     
                     st.success(f"Вакансия '{title}' добавлена")
                     st.rerun()
@@ -266,11 +379,11 @@ elif page == "Вакансии":
             with st.spinner("Обработка..."):
                 try:
                     file_bytes = uploaded_file.read()
-                    text = DocumentParser.parse_file(file_bytes, uploaded_file.name)
+                    text = parse_document(file_bytes, uploaded_file.name)
                     
                     st.text_area("Извлечённый текст (500 символов)", text[:500], height=150)
                     
-                    llm = LLMClient()
+                    llm = get_llm_client()
                     vacancy_data = VacancyExtractor.extract_vacancy_structure(text, llm)
                     
                     st.json(vacancy_data)
@@ -284,6 +397,7 @@ elif page == "Вакансии":
                     db.add(vacancy)
                     db.commit()
                     db.close()
+                    invalidate("vacancies")
                     
                     st.success(f"Вакансия '{vacancy_data['title']}' добавлена")
                     
@@ -293,49 +407,74 @@ elif page == "Вакансии":
     st.divider()
     st.subheader("Текущие вакансии")
     
-    db = SessionLocal()
-    vacancies = db.query(Vacancy).order_by(Vacancy.created_at.desc()).all()
-    db.close()
+    vacancy_page = st.session_state.get('vacancies_page', 1)
+    summaries, vacancies_total = get_vacancy_summaries(vacancy_page, VACANCIES_PAGE_SIZE)
     
-    if not vacancies:
+    total_pages = max((vacancies_total + VACANCIES_PAGE_SIZE - 1) // VACANCIES_PAGE_SIZE, 1)
+    if vacancy_page > total_pages:
+        vacancy_page = total_pages
+        summaries, vacancies_total = get_vacancy_summaries(vacancy_page, VACANCIES_PAGE_SIZE)
+    
+    if not summaries:
         st.info("Вакансии отсутствуют")
     else:
-        for v in vacancies:
-            with st.expander(f"{v.title} @ {v.company} (ID: {v.id})"):
-                req = json.loads(v.requirements_json)
+        if total_pages > 1:
+            new_page = st.number_input(
+                f"Страница (из {total_pages}, всего вакансий: {vacancies_total})",
+                min_value=1,
+                max_value=total_pages,
+                value=vacancy_page,
+                step=1
+            )
+            if new_page != vacancy_page:
+                st.session_state['vacancies_page'] = new_page
+                st.rerun()
+        
+        for summary in summaries:
+            v = summary['vacancy']
+            req = summary['requirements']
+            matches_count = summary['matches_count']
+            
+            with st.expander(f"{v.title} @ {v.company} (ID: {v.id}) — кандидатов: {matches_count}"):
                 st.write(f"**Hard Skills:** {', '.join(req.get('hard_skills', []))}")
                 st.write(f"**Опыт:** {req.get('experience_years', 'N/A')} лет")
                 
+                if matches_count > 0:
+                    status_parts = [
+                        f"{get_status_label(status)}: {count}"
+                        for status, count in summary['statuses'].items() if count
+                    ]
+                    st.write(f"**Средняя оценка:** {summary['avg_score']:.1f}% | {' | '.join(status_parts)}")
+                
                 col1, col2 = st.columns(2)
                 with col1:
                     if st.button("🗑️ Удалить вакансию", key=f"del_{v.id}"):
                         db = SessionLocal()
+                        on_vacancy_matches_deleted(db, v.id)
                         db.query(Match).filter(Match.vacancy_id == v.id).delete()
                         db.query(Vacancy).filter(Vacancy.id == v.id).delete()
                         db.commit()
                         db.close()
+                        invalidate("vacancies", "matches", "comments", "status_history")
                         st.success(f"Вакансия и связанные резюме удалены")
                         st.rerun()
                 
                 with col2:
-                    db = SessionLocal()
-                    matches_count = db.query(Match).filter(Match.vacancy_id == v.id).count()
-                    db.close()
                     if matches_count > 0:
                         if st.button(f"🧹 Очистить резюме ({matches_count})", key=f"clear_{v.id}"):
                             db = SessionLocal()
+                            on_vacancy_matches_deleted(db, v.id)
                             db.query(Match).filter(Match.vacancy_id == v.id).delete()
                             db.commit()
                             db.close()
+                            invalidate("matches", "comments", "status_history")
                             st.success(f"Резюме очищены")
                             st.rerun()
 
 elif page == "Анализ":
     st.title("Анализ резюме")
     
-    db = SessionLocal()
-    vacancies = db.query(Vacancy).all()
-    db.close()
+    vacancies = get_vacancies()
     
     if not vacancies:
         st.warning("Добавьте вакансии")
@@ -351,55 +490,46 @@ elif page == "Анализ":
         if input_method == "Файлы (PDF/DOCX)":
             uploaded_files = st.file_uploader("Резюме", type=["pdf", "docx", "txt"], accept_multiple_files=True)
             
-            if uploaded_files and st.button("Анализировать"):
-                progress_bar = st.progress(0)
-                results = []
-                
-                for i, file in enumerate(uploaded_files):
-                    st.info(f"Обработка: {file.name}")
-                    
-                    try:
-                        file_bytes = file.read()
-                        text = DocumentParser.parse_file(file_bytes, file.name)
-                        
-                        llm = LLMClient()
-                        resume = ResumeExtractor.extract_resume_structure(text, llm)
-                        
-                        vacancy_data = {
-                            "title": vacancy.title,
-                            "company": vacancy.company,
-                            "requirements": json.loads(vacancy.requirements_json)
-                        }
-                        
-                        analysis = llm.analyze_resume(resume, vacancy_data)
-                        
-                        db = SessionLocal()
-                        match = Match(
-                            resume_name=resume.get('name', file.name),
-                            vacancy_id=vacancy.id,
-                            vacancy_title=vacancy.title,
-                            score=analysis['matching_score']['overall'],
-                            analysis_json=json.dumps(analysis, ensure_ascii=False),
-                            status='new'
-                        )
-                        db.add(match)
-                        db.commit()
-                        db.close()
-                        
-                        results.append({
-                            "file": file.name,
-                            "name": resume.get('name', 'Unknown'),
-                            "score": analysis['matching_score']['overall']
-                        })
-                        
-                    except Exception as e:
-                        st.error(f"Ошибка в {file.name}: {str(e)}")
-                    
-                    progress_bar.progress((i + 1) / len(uploaded_files))
+            combined_mode = st.checkbox(
+                "⚡ Один запрос на резюме",
+                value=False,
+                help="Извлечение структуры и оценка за один вызов LLM вместо двух"
+            )
+            
+            prefilter_mode = st.checkbox(
+                "🧹 Предварительный отбор",
+                value=False,
+                help="Локальная оценка по навыкам и опыту без LLM; в LLM отправляются только лучшие"
+            )
+            prefilter = None
+            if prefilter_mode:
+                col1, col2 = st.columns(2)
+                with col1:
+                    top_k = st.number_input(
+                        "Лучших в LLM (0 — все)", min_value=0, value=PRESCREEN_TOP_K, step=10
+                    )
+                with col2:
+                    min_prescore = st.slider(
+                        "Минимальная локальная оценка", 0, 100, int(PRESCREEN_MIN_SCORE)
+                    )
+                prefilter = {"top_k": int(top_k), "min_score": float(min_prescore)}
+            
+            if uploaded_files and st.button("Поставить в очередь"):
+                from config import get_selected_model
+                from services.job_queue import enqueue_files
                 
-                st.success(f"Обработано: {len(results)} резюме")
-                if results:
-                    st.dataframe(results)
+                files = [(file.name, file.read()) for file in uploaded_files]
+                batch_id = enqueue_files(
+                    vacancy.id,
+                    get_selected_model(),
+                    files,
+                    options={"combined": combined_mode, "prefilter": prefilter}
+                )
+                st.session_state['active_batch_id'] = batch_id
+                st.success(f"В очередь поставлено {len(files)} резюме (пакет {batch_id})")
+            
+            from components.job_status import render_job_queue
+            render_job_queue()
         
         else:
             st.subheader("JSON резюме")
@@ -411,28 +541,30 @@ elif page == "Анализ":
                 try:
                     resume = json.loads(resume_json)
                     
+                    partial_box = st.empty()
+                    
+                    def show_partial(fields):
+                        # Оценка появляется, как только модель её сгенерировала
+                        if 'overall' in fields:
+                            rec = fields.get('recommendation', '...')
+                            partial_box.info(f"Предварительно: **{fields['overall']}%** | Решение: {rec}")
+                    
                     with st.spinner("Анализ..."):
-                        llm = LLMClient()
+                        llm = get_llm_client()
                         vacancy_data = {
                             "title": vacancy.title,
                             "company": vacancy.company,
                             "requirements": json.loads(vacancy.requirements_json)
                         }
                         
-                        analysis = llm.analyze_resume(resume, vacancy_data)
+                        analysis = llm.analyze_resume(resume, vacancy_data, on_partial=show_partial)
                         
-                        db = SessionLocal()
-                        match = Match(
-                            resume_name=resume.get('name', 'Unknown'),
-                            vacancy_id=vacancy.id,
-                            vacancy_title=vacancy.title,
-                            score=analysis['matching_score']['overall'],
-                            analysis_json=json.dumps(analysis, ensure_ascii=False),
-                            status='new'
+                        # Структура сохраняется — кандидата можно переоценить под другую вакансию
+                        save_match(
+                            resume, analysis, 'Unknown', vacancy.id, vacancy.title,
+                            resume_id=store_structured(resume),
+                            prescore=prescore(None, vacancy_data['requirements'], resume)
                         )
-                        db.add(match)
-                        db.commit()
-                        db.close()
                         
                         st.success("Анализ завершён")
                         
@@ -442,32 +574,54 @@ elif page == "Анализ":
 elif page == "Результаты":
     st.title("Результаты анализа")
     
-    db = SessionLocal()
-    all_matches = db.query(Match).order_by(Match.score.desc()).all()
-    vacancies = db.query(Vacancy).all()
-    db.close()
+    total_count = count_all_matches()
+    vacancies = get_vacancies()
     
-    if not all_matches:
+    if not total_count:
         st.info("Результаты отсутствуют")
     else:
-        render_status_overview(all_matches)
+        render_status_overview(get_status_counts_db())
         
         st.divider()
         
         filters = render_filters(vacancies)
         
-        matches = filter_matches(
-            all_matches,
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            page_size = st.selectbox("На странице", RESULTS_PAGE_SIZES, key="results_page_size")
+        
+        search_params = dict(
             vacancy_id=filters['vacancy_id'],
             min_score=filters['min_score'],
             max_score=filters['max_score'],
             recommendation=filters['recommendation'],
             search_query=filters['search_query'],
             date_from=filters['date_from'],
-            date_to=filters['date_to']
+            date_to=filters['date_to'],
+            statuses=tuple(filters['statuses'])
         )
         
-        show_filter_summary(filters, len(all_matches), len(matches))
+        page_num = st.session_state.get('results_page', 1)
+        matches, filtered_count = search_matches(page_num, page_size, **search_params)
+        
+        total_pages = max((filtered_count + page_size - 1) // page_size, 1)
+        if page_num > total_pages:
+            page_num = total_pages
+            matches, filtered_count = search_matches(page_num, page_size, **search_params)
+        
+        with col2:
+            page_num = st.number_input(
+                f"Страница (из {total_pages})",
+                min_value=1,
+                max_value=total_pages,
+                value=page_num,
+                step=1
+            )
+        if page_num != st.session_state.get('results_page', 1):
+            st.session_state['results_page'] = page_num
+            matches, filtered_count = search_matches(page_num, page_size, **search_params)
+        
+        show_filter_summary(filters, total_count, filtered_count)
         
         st.divider()
         st.subheader("Список кандидатов")
@@ -475,6 +629,13 @@ elif page == "Результаты":
         if not matches:
             st.warning("Нет кандидатов, соответствующих фильтрам")
         else:
+            with st.expander("🔀 Массовая смена статуса"):
+                render_bulk_status_change(
+                    {m.id: f"{m.resume_name} — {m.score}%" for m in matches},
+                    key=f"results_bulk_{page_num}",
+                    all_ids=search_match_ids(**search_params)
+                )
+            
             header_cols = st.columns([0.5, 3, 2, 1, 1, 1.5, 1.5])
             with header_cols[0]:
                 st.markdown("<div class='table-header'></div>", unsafe_allow_html=True)
@@ -492,9 +653,8 @@ elif page == "Результаты":
                 st.markdown("<div class='table-header'>Дата</div>", unsafe_allow_html=True)
             
             for m in matches:
-                analysis = json.loads(m.analysis_json)
                 rec_map = {"YES": "✅", "NO": "❌", "MAYBE": "🔍"}
-                rec_icon = rec_map.get(analysis.get('recommendation', 'MAYBE'), '🔍')
+                rec_icon = rec_map.get(m.recommendation or 'MAYBE', '🔍')
                 
                 cols = st.columns([0.5, 3, 2, 1, 1, 1.5, 1.5])
                 
@@ -511,6 +671,8 @@ elif page == "Результаты":
                 
                 with cols[3]:
                     st.write(f"**{m.score}%**")
+                    if m.prescore is not None:
+                        st.caption(f"🧹 {m.prescore:.0f}%")
                 
                 with cols[4]:
                     st.write(f"{rec_icon}")
@@ -560,15 +722,23 @@ elif page == "Результаты":
                 with col3:
                     if st.button("🗑️ Удалить", key="delete_match_button"):
                         db = SessionLocal()
-                        db.query(Match).filter(Match.id == selected.id).delete()
+                        match = db.query(Match).filter(Match.id == selected.id).first()
+                        if match:
+                            on_match_deleted(db, match)
+                            db.delete(match)
                         db.commit()
                         db.close()
+                        invalidate("matches", "comments", "status_history")
                         if 'selected_match_id' in st.session_state:
                             del st.session_state['selected_match_id']
                         st.rerun()
                 
                 st.write(f"**Вакансия:** {selected.vacancy_title}")
                 
+                if selected.resume_id:
+                    with st.expander("🔁 Переоценить под другую вакансию"):
+                        render_rescore_action(selected.resume_id, vacancies)
+                
                 st.divider()
                 col1, col2 = st.columns(2)
                 
@@ -594,6 +764,8 @@ elif page == "Результаты":
                 with col3:
                     st.metric("Experience", f"{analysis['matching_score'].get('experience', 0)}%")
                     st.markdown("<div class='metric-help'>Опыт (35%)</div>", unsafe_allow_html=True)
+                    if selected.prescore is not None:
+                        st.caption(f"🧹 Локальная оценка (навыки и опыт, без LLM): {selected.prescore:.0f}%")
                 with col4:
                     rec_map = {"YES": "Принять", "NO": "Отклонить", "MAYBE": "Уточнить"}
                     rec = rec_map.get(analysis.get('recommendation', 'N/A'), 'N/A')
@@ -605,14 +777,15 @@ elif page == "Kanban":
     
     st.title("📋 Kanban доска")
     
-    db = SessionLocal()
-    all_matches = db.query(Match).all()
-    db.close()
-    
-    if not all_matches:
+    if not count_all_matches():
         st.info("Нет кандидатов для отображения")
     else:
-        render_kanban_board(all_matches)
+        vacancy_scope = {"Все вакансии": None}
+        for v in get_vacancies():
+            vacancy_scope[f"{v.title} @ {v.company}"] = v.id
+        
+        selected_scope = st.selectbox("Вакансия", list(vacancy_scope.keys()), key="kanban_vacancy")
+        render_kanban_board(vacancy_scope[selected_scope])
         
         # Показываем счётчик выбранных для сравнения
         if 'comparison_candidates' in st.session_state and st.session_state['comparison_candidates']:
@@ -632,10 +805,8 @@ elif page == "Сравнение":
         st.info("Выберите кандидатов для сравнения на Kanban доске (кнопка 📊)")
         st.info("Можно выбрать до 3 кандидатов одновременно")
     else:
-        db = SessionLocal()
         candidate_ids = st.session_state['comparison_candidates']
-        matches = db.query(Match).filter(Match.id.in_(candidate_ids)).all()
-        db.close()
+        matches = get_matches_by_ids(tuple(candidate_ids))
         
         render_comparison_view(matches)
 
@@ -644,14 +815,15 @@ elif page == "Kanban":
     
     st.title("📋 Kanban доска")
     
-    db = SessionLocal()
-    all_matches = db.query(Match).all()
-    db.close()
-    
-    if not all_matches:
+    if not count_all_matches():
         st.info("Нет кандидатов для отображения")
     else:
-        render_kanban_board(all_matches)
+        vacancy_scope = {"Все вакансии": None}
+        for v in get_vacancies():
+            vacancy_scope[f"{v.title} @ {v.company}"] = v.id
+        
+        selected_scope = st.selectbox("Вакансия", list(vacancy_scope.keys()), key="kanban_vacancy")
+        render_kanban_board(vacancy_scope[selected_scope])
         
         # Показываем счётчик выбранных для сравнения
         if 'comparison_candidates' in st.session_state and st.session_state['comparison_candidates']:
@@ -671,10 +843,8 @@ elif page == "Сравнение":
         st.info("Выберите кандидатов для сравнения на Kanban доске (кнопка 📊)")
         st.info("Можно выбрать до 3 кандидатов одновременно")
     else:
-        db = SessionLocal()
         candidate_ids = st.session_state['comparison_candidates']
-        matches = db.query(Match).filter(Match.id.in_(candidate_ids)).all()
-        db.close()
+        matches = get_matches_by_ids(tuple(candidate_ids))
         
         render_comparison_view(matches)
 
@@ -1,192 +1,204 @@
-"""Утилиты для расчёта аналитических метрик"""
-from typing import List, Dict, Any
-from collections import Counter
+"""Утилиты для расчёта аналитических метрик
+
+Метрики читаются из предагрегатов analytics_* (по дням и вакансиям),
+которые поддерживает services/analytics_rollup.py. Период фильтруется
+с точностью до дня.
+"""
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
-import json
-from db.models import Match
+from sqlalchemy import func
+from sqlalchemy.orm import Session, Query
+from db.models import Match, AnalyticsDaily, AnalyticsScoreBucket, AnalyticsMissingSkill
+from services.analytics_rollup import SCORE_BUCKET_SIZE
+
+def _period_query(db: Session, date_from: Optional[datetime], model, *columns) -> Query:
+    """Запрос по таблице предагрегатов с ограничением по дню"""
+    query = db.query(*columns)
+    if date_from is not None:
+        query = query.filter(model.day >= date_from.date())
+    return query
 
-def calculate_funnel_metrics(matches: List[Match]) -> Dict[str, int]:
+def calculate_funnel_metrics(db: Session, date_from: Optional[datetime] = None) -> Dict[str, int]:
     """
     Рассчитывает метрики воронки найма
-    
+
     Returns:
         Dict с количеством кандидатов на каждом этапе
     """
     from components.status_manager import STATUS_CONFIG
-    
+
     counts = {key: 0 for key in STATUS_CONFIG.keys()}
-    
-    for m in matches:
-        status = getattr(m, 'status', 'new')
+
+    rows = _period_query(
+        db, date_from, AnalyticsDaily, AnalyticsDaily.status, func.sum(AnalyticsDaily.cnt)
+    ).group_by(AnalyticsDaily.status).all()
+
+    for status, count in rows:
         if status in counts:
-            counts[status] += 1
+            counts[status] += count or 0
         else:
-            counts['new'] += 1
-    
+            counts['new'] += count or 0
+
     return counts
 
-def calculate_conversion_rate(matches: List[Match]) -> Dict[str, float]:
+def calculate_conversion_rate(funnel: Dict[str, int]) -> Dict[str, float]:
     """
     Рассчитывает конверсию между этапами воронки
-    
+
+    Args:
+        funnel: Результат calculate_funnel_metrics
+
     Returns:
         Dict с процентом конверсии
     """
-    total = len(matches)
+    total = sum(funnel.values())
     if total == 0:
         return {}
-    
-    metrics = calculate_funnel_metrics(matches)
-    
+
     conversion = {
-        'new_to_review': (metrics['review'] / total * 100) if total > 0 else 0,
-        'review_to_interview': (metrics['interview'] / total * 100) if total > 0 else 0,
-        'interview_to_offer': (metrics['offer'] / total * 100) if total > 0 else 0,
-        'overall_success': (metrics['offer'] / total * 100) if total > 0 else 0,
-        'rejection_rate': (metrics['rejected'] / total * 100) if total > 0 else 0
+        'new_to_review': funnel['review'] / total * 100,
+        'review_to_interview': funnel['interview'] / total * 100,
+        'interview_to_offer': funnel['offer'] / total * 100,
+        'overall_success': funnel['offer'] / total * 100,
+        'rejection_rate': funnel['rejected'] / total * 100
     }
-    
+
     return conversion
 
-def get_average_scores_by_vacancy(matches: List[Match]) -> Dict[str, Dict[str, float]]:
+def get_score_summary(db: Session, date_from: Optional[datetime] = None) -> Dict[str, float]:
+    """
+    Общее количество кандидатов и средняя оценка за период
+
+    Returns:
+        Dict {'count': int, 'avg_score': float}
+    """
+    count, score_sum = _period_query(
+        db, date_from, AnalyticsDaily, func.sum(AnalyticsDaily.cnt), func.sum(AnalyticsDaily.score_sum)
+    ).one()
+    return {'count': count or 0, 'avg_score': score_sum / count if count else 0}
+
+def get_score_distribution(db: Session, date_from: Optional[datetime] = None) -> Dict[int, int]:
+    """
+    Гистограмма оценок Overall по корзинам SCORE_BUCKET_SIZE
+
+    Returns:
+        Dict {начало корзины: количество}
+    """
+    rows = _period_query(
+        db, date_from, AnalyticsScoreBucket, AnalyticsScoreBucket.bucket, func.sum(AnalyticsScoreBucket.cnt)
+    ).group_by(AnalyticsScoreBucket.bucket).all()
+
+    return {bucket * SCORE_BUCKET_SIZE: count for bucket, count in rows if count}
+
+def get_average_scores_by_vacancy(db: Session, date_from: Optional[datetime] = None) -> Dict[str, Dict[str, float]]:
     """
     Средние оценки по вакансиям
-    
+
     Returns:
         Dict {vacancy_title: {metric: score}}
     """
-    vacancy_scores = {}
-    
-    for m in matches:
-        vacancy = m.vacancy_title
-        
-        if vacancy not in vacancy_scores:
-            vacancy_scores[vacancy] = {
-                'overall': [],
-                'hard_skills': [],
-                'experience': [],
-                'count': 0
-            }
-        
-        vacancy_scores[vacancy]['overall'].append(m.score)
-        vacancy_scores[vacancy]['count'] += 1
-        
-        # Извлекаем доп. метрики из JSON
-        try:
-            analysis = json.loads(m.analysis_json)
-            hs = analysis['matching_score'].get('hard_skills', 0)
-            exp = analysis['matching_score'].get('experience', 0)
-            
-            vacancy_scores[vacancy]['hard_skills'].append(hs)
-            vacancy_scores[vacancy]['experience'].append(exp)
-        except:
-            pass
-    
-    # Считаем средние
-    result = {}
-    for vacancy, scores in vacancy_scores.items():
-        result[vacancy] = {
-            'overall': sum(scores['overall']) / len(scores['overall']) if scores['overall'] else 0,
-            'hard_skills': sum(scores['hard_skills']) / len(scores['hard_skills']) if scores['hard_skills'] else 0,
-            'experience': sum(scores['experience']) / len(scores['experience']) if scores['experience'] else 0,
-            'count': scores['count']
+    rows = _period_query(
+        db, date_from, AnalyticsDaily,
+        AnalyticsDaily.vacancy_title,
+        func.sum(AnalyticsDaily.score_sum),
+        func.sum(AnalyticsDaily.hard_skills_sum),
+        func.sum(AnalyticsDaily.experience_sum),
+        func.sum(AnalyticsDaily.cnt)
+    ).group_by(AnalyticsDaily.vacancy_title).all()
+
+    return {
+        title: {
+            'overall': overall / count,
+            'hard_skills': hard_skills / count,
+            'experience': experience / count,
+            'count': count
         }
-    
-    return result
+        for title, overall, hard_skills, experience, count in rows if count
+    }
 
-def get_top_missing_skills(matches: List[Match], top_n: int = 10) -> List[tuple]:
+def get_top_missing_skills(db: Session, date_from: Optional[datetime] = None, top_n: int = 10) -> List[tuple]:
     """
     ТОП недостающих навыков
-    
+
     Returns:
         List[(skill, count)]
     """
-    all_missing = []
-    
-    for m in matches:
-        try:
-            analysis = json.loads(m.analysis_json)
-            missing = analysis.get('missing_skills', [])
-            all_missing.extend(missing)
-        except:
-            pass
-    
-    counter = Counter(all_missing)
-    return counter.most_common(top_n)
-
-def get_recommendation_distribution(matches: List[Match]) -> Dict[str, int]:
+    total = func.sum(AnalyticsMissingSkill.cnt)
+    rows = _period_query(db, date_from, AnalyticsMissingSkill, AnalyticsMissingSkill.skill, total) \
+        .group_by(AnalyticsMissingSkill.skill) \
+        .order_by(total.desc()) \
+        .limit(top_n) \
+        .all()
+
+    return [(skill, count) for skill, count in rows]
+
+def get_recommendation_distribution(db: Session, date_from: Optional[datetime] = None) -> Dict[str, int]:
     """
     Распределение решений (Принять/Отклонить/Уточнить)
-    
+
     Returns:
         Dict {recommendation: count}
     """
     recommendations = {'YES': 0, 'NO': 0, 'MAYBE': 0}
-    
-    for m in matches:
-        try:
-            analysis = json.loads(m.analysis_json)
-            rec = analysis.get('recommendation', 'MAYBE')
-            if rec in recommendations:
-                recommendations[rec] += 1
-        except:
-            pass
-    
+
+    rows = _period_query(
+        db, date_from, AnalyticsDaily, AnalyticsDaily.recommendation, func.sum(AnalyticsDaily.cnt)
+    ).group_by(AnalyticsDaily.recommendation).all()
+
+    for value, count in rows:
+        if value in recommendations:
+            recommendations[value] += count or 0
+
     return recommendations
 
-def get_candidates_by_date(matches: List[Match], days: int = 30) -> Dict[str, int]:
+def get_candidates_by_date(db: Session, days: int = 30) -> Dict[str, int]:
     """
     Количество кандидатов по дням
-    
+
     Args:
         days: За сколько последних дней считать
-    
+
     Returns:
         Dict {date_str: count}
     """
-    from datetime import date
-    
     today = datetime.now().date()
-    date_counts = {}
-    
-    for m in matches:
-        if hasattr(m, 'created_at'):
-            m_date = m.created_at.date()
-            
-            # Только за последние N дней
-            if (today - m_date).days <= days:
-                date_str = m_date.strftime('%d.%m')
-                date_counts[date_str] = date_counts.get(date_str, 0) + 1
-    
-    return date_counts
-
-def get_time_to_decision_stats(matches: List[Match]) -> Dict[str, Any]:
+    cutoff = datetime.combine(today - timedelta(days=days), datetime.min.time())
+
+    rows = _period_query(
+        db, cutoff, AnalyticsDaily, AnalyticsDaily.day, func.sum(AnalyticsDaily.cnt)
+    ).group_by(AnalyticsDaily.day).order_by(AnalyticsDaily.day).all()
+
+    return {day.strftime('%d.%m'): count for day, count in rows if count}
+
+def get_time_to_decision_stats(db: Session, date_from: Optional[datetime] = None) -> Dict[str, Any]:
     """
     Статистика времени от подачи резюме до решения
-    
+
+    Min/max не поддерживаются инкрементально, поэтому считается по matches
+    (только offer/rejected — по индексу ix_matches_status).
+
     Returns:
         Dict с метриками времени
     """
-    times = []
-    
-    for m in matches:
-        status = getattr(m, 'status', 'new')
-        
-        # Считаем только для завершённых (offer, rejected)
-        if status in ['offer', 'rejected']:
-            created = getattr(m, 'created_at', None)
-            updated = getattr(m, 'status_updated_at', None)
-            
-            if created and updated:
-                delta = (updated - created).total_seconds() / 3600  # в часах
-                times.append(delta)
-    
-    if not times:
+    # Считаем только для завершённых (offer, rejected); разница в часах через julianday
+    hours = (func.julianday(Match.status_updated_at) - func.julianday(Match.created_at)) * 24
+
+    query = db.query(func.count(hours), func.avg(hours), func.min(hours), func.max(hours))
+    if date_from is not None:
+        query = query.filter(Match.created_at >= date_from)
+
+    count, avg_hours, min_hours, max_hours = query.filter(
+        Match.status.in_(['offer', 'rejected']),
+        Match.created_at.isnot(None),
+        Match.status_updated_at.isnot(None)
+    ).one()
+
+    if not count:
         return {'avg_hours': 0, 'min_hours': 0, 'max_hours': 0, 'count': 0}
-    
+
     return {
-        'avg_hours': sum(times) / len(times),
-        'min_hours': min(times),
-        'max_hours': max(times),
-        'count': len(times)
+        'avg_hours': avg_hours,
+        'min_hours': min_hours,
+        'max_hours': max_hours,
+        'count': count
     }
@@ -0,0 +1,221 @@
+"""Кэшируемые запросы чтения, общие для страниц приложения"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, case, select, or_
+from db.models import SessionLocal, Vacancy, Match, Resume
+from services.query_cache import cached
+
+
+@cached("vacancies")
+def get_vacancies() -> List[Vacancy]:
+    """Все вакансии, новые сверху"""
+    db = SessionLocal()
+    try:
+        return db.query(Vacancy).order_by(Vacancy.created_at.desc()).all()
+    finally:
+        db.close()
+
+
+@cached("vacancies")
+def get_vacancy_context(vacancy_id: int) -> Optional[Tuple[int, str, Dict[str, Any]]]:
+    """
+    Вакансия в виде для промпта оценки
+
+    Returns:
+        (id, title, {title, company, requirements}) или None, если вакансия удалена
+    """
+    db = SessionLocal()
+    try:
+        vacancy = db.query(Vacancy).filter(Vacancy.id == vacancy_id).first()
+        if vacancy is None:
+            return None
+        return vacancy.id, vacancy.title, {
+            "title": vacancy.title,
+            "company": vacancy.company,
+            "requirements": json.loads(vacancy.requirements_json)
+        }
+    finally:
+        db.close()
+
+
+@cached("matches")
+def count_all_matches() -> int:
+    db = SessionLocal()
+    try:
+        return db.query(func.count(Match.id)).scalar()
+    finally:
+        db.close()
+
+
+@cached("vacancies", "matches")
+def get_vacancy_summaries(page: int, page_size: int) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Страница вакансий со сводкой по кандидатам одним сгруппированным запросом
+
+    Returns:
+        ([{vacancy, requirements, matches_count, avg_score, statuses}], всего вакансий)
+    """
+    from components.status_manager import STATUS_CONFIG
+
+    status_columns = [
+        func.sum(case((Match.status == status, 1), else_=0)).label(status)
+        for status in STATUS_CONFIG
+    ]
+
+    db = SessionLocal()
+    try:
+        total = db.query(func.count(Vacancy.id)).scalar()
+
+        order = (Vacancy.created_at.desc(), Vacancy.id.desc())
+
+        # Сначала страница вакансий, затем агрегаты только по её кандидатам
+        page_ids = db.query(Vacancy.id) \
+            .order_by(*order) \
+            .offset(max(page - 1, 0) * page_size) \
+            .limit(page_size) \
+            .subquery()
+
+        rows = db.query(
+            Vacancy,
+            func.count(Match.id).label('matches_count'),
+            func.avg(Match.score).label('avg_score'),
+            *status_columns
+        ).filter(Vacancy.id.in_(select(page_ids.c.id))) \
+            .outerjoin(Match, Match.vacancy_id == Vacancy.id) \
+            .group_by(Vacancy.id) \
+            .order_by(*order) \
+            .all()
+    finally:
+        db.close()
+
+    summaries = []
+    for row in rows:
+        vacancy = row[0]
+        summaries.append({
+            "vacancy": vacancy,
+            "requirements": json.loads(vacancy.requirements_json),
+            "matches_count": row.matches_count,
+            "avg_score": row.avg_score or 0,
+            "statuses": {status: getattr(row, status) or 0 for status in STATUS_CONFIG}
+        })
+
+    return summaries, total
+
+
+def _kanban_status_filter(status: str):
+    """Условие колонки; неизвестные и пустые статусы показываются в 'new' (как раньше)"""
+    from components.status_manager import STATUS_CONFIG
+
+    if status == 'new':
+        return or_(
+            Match.status == 'new',
+            Match.status.is_(None),
+            Match.status.notin_(list(STATUS_CONFIG.keys()))
+        )
+    return Match.status == status
+
+
+@cached("matches")
+def get_kanban_counts(vacancy_id: Optional[int] = None) -> Dict[str, int]:
+    """Количество карточек в каждой колонке Kanban одним GROUP BY"""
+    from components.status_manager import STATUS_CONFIG
+
+    db = SessionLocal()
+    try:
+        query = db.query(Match.status, func.count(Match.id))
+        if vacancy_id is not None:
+            query = query.filter(Match.vacancy_id == vacancy_id)
+        rows = query.group_by(Match.status).all()
+    finally:
+        db.close()
+
+    counts = {key: 0 for key in STATUS_CONFIG}
+    for status, count in rows:
+        counts[status if status in counts else 'new'] += count
+    return counts
+
+
+@cached("matches")
+def get_kanban_cards(status: str, limit: int, vacancy_id: Optional[int] = None) -> List[Any]:
+    """
+    Первые limit карточек колонки по убыванию рейтинга
+
+    Возвращает лёгкую проекцию (id, resume_name, vacancy_title, score,
+    recommendation) без analysis_json и ORM-объектов.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(
+            Match.id, Match.resume_name, Match.vacancy_title, Match.score, Match.recommendation
+        ).filter(_kanban_status_filter(status))
+        if vacancy_id is not None:
+            query = query.filter(Match.vacancy_id == vacancy_id)
+        return query.order_by(Match.score.desc(), Match.id.desc()).limit(limit).all()
+    finally:
+        db.close()
+
+
+@cached("matches")
+def get_kanban_card_ids(status: str, vacancy_id: Optional[int] = None) -> List[int]:
+    """ID всех карточек колонки (для массовой смены статуса)"""
+    db = SessionLocal()
+    try:
+        query = db.query(Match.id).filter(_kanban_status_filter(status))
+        if vacancy_id is not None:
+            query = query.filter(Match.vacancy_id == vacancy_id)
+        return [row.id for row in query.all()]
+    finally:
+        db.close()
+
+
+@cached("matches")
+def get_matches_by_ids(match_ids: Tuple[int, ...]) -> List[Match]:
+    db = SessionLocal()
+    try:
+        return db.query(Match).filter(Match.id.in_(match_ids)).all()
+    finally:
+        db.close()
+
+
+@cached("matches")
+def get_stored_resumes() -> List[Any]:
+    """
+    Сохранённые резюме с извлечённой структурой (id, name), новые сверху
+
+    Резюме появляются вместе с первым Match, поэтому кэш сбрасывается по теме matches.
+    """
+    db = SessionLocal()
+    try:
+        return db.query(Resume.id, Resume.name) \
+            .filter(Resume.structure_json.isnot(None)) \
+            .order_by(Resume.id.desc()) \
+            .all()
+    finally:
+        db.close()
+
+
+@cached("matches")
+def get_score_matrix(
+    resume_ids: Tuple[int, ...],
+    vacancy_ids: Tuple[int, ...]
+) -> Dict[Tuple[int, int], float]:
+    """
+    Оценки для матрицы резюме × вакансии (по последнему Match каждой пары)
+
+    Returns:
+        {(resume_id, vacancy_id): score}
+    """
+    latest = select(func.max(Match.id)).where(
+        Match.resume_id.in_(resume_ids),
+        Match.vacancy_id.in_(vacancy_ids)
+    ).group_by(Match.resume_id, Match.vacancy_id)
+
+    db = SessionLocal()
+    try:
+        rows = db.query(Match.resume_id, Match.vacancy_id, Match.score) \
+            .filter(Match.id.in_(latest)) \
+            .all()
+    finally:
+        db.close()
+
+    return {(resume_id, vacancy_id): score for resume_id, vacancy_id, score in rows}
@@ -1,68 +1,162 @@
 """Утилиты для фильтрации и поиска кандидатов"""
 from datetime import datetime
-from typing import List, Optional
-from db.models import Match
-import json
+from typing import List, Optional, Tuple
+from sqlalchemy import false
+from sqlalchemy.orm import Session, Query
+from db.models import SessionLocal, Match
+from services.query_cache import cached
+from services.search_index import search_subquery
 
-def filter_matches(
-    matches: List[Match],
+def build_matches_query(
+    db: Session,
     vacancy_id: Optional[int] = None,
     min_score: Optional[int] = None,
     max_score: Optional[int] = None,
     recommendation: Optional[str] = None,
     search_query: Optional[str] = None,
     date_from: Optional[datetime] = None,
-    date_to: Optional[datetime] = None
-) -> List[Match]:
+    date_to: Optional[datetime] = None,
+    statuses: Optional[List[str]] = None
+) -> Query:
     """
-    Фильтрует список кандидатов по заданным параметрам
-    
+    Строит SQL-запрос по кандидатам; фильтрация выполняется в БД (по индексам)
+
     Args:
-        matches: Список объектов Match из БД
+        db: Сессия БД
         vacancy_id: ID вакансии (None = все вакансии)
         min_score: Минимальный рейтинг (0-100)
         max_score: Максимальный рейтинг (0-100)
         recommendation: Фильтр по решению ("YES", "NO", "MAYBE")
-        search_query: Поиск по имени кандидата
+        search_query: Полнотекстовый поиск (services/search_index.py) по имени,
+            тексту резюме, анализу и комментариям
         date_from: Начало периода
         date_to: Конец периода
-    
+        statuses: Статусы кандидатов (None = все)
+
     Returns:
-        Отфильтрованный список Match
+        Query без LIMIT; при поиске — отсортирован по релевантности
     """
-    filtered = matches
+    query = db.query(Match)
     
-    # Фильтр по вакансии
     if vacancy_id is not None:
-        filtered = [m for m in filtered if m.vacancy_id == vacancy_id]
+        query = query.filter(Match.vacancy_id == vacancy_id)
+    
+    if min_score is not None and min_score > 0:
+        query = query.filter(Match.score >= min_score)
     
-    # Фильтр по рейтингу
-    if min_score is not None:
-        filtered = [m for m in filtered if m.score >= min_score]
+    if max_score is not None and max_score < 100:
+        query = query.filter(Match.score <= max_score)
     
-    if max_score is not None:
-        filtered = [m for m in filtered if m.score <= max_score]
+    if statuses:
+        query = query.filter(Match.status.in_(statuses))
     
-    # Фильтр по решению
     if recommendation:
-        filtered = [
-            m for m in filtered 
-            if json.loads(m.analysis_json).get('recommendation') == recommendation
-        ]
+        query = query.filter(Match.recommendation == recommendation)
     
-    # Поиск по имени
     if search_query and search_query.strip():
-        query_lower = search_query.lower().strip()
-        filtered = [
-            m for m in filtered 
-            if query_lower in m.resume_name.lower()
-        ]
+        # Полнотекстовый поиск (имя, анализ, комментарии); сначала самые релевантные
+        fts = search_subquery(search_query)
+        if fts is None:
+            # В запросе нет слов (например, "!!") — искать нечего
+            query = query.filter(false())
+        else:
+            query = query.join(fts, fts.c.match_id == Match.id).order_by(fts.c.rank)
     
-    # Фильтр по дате
     if date_from:
-        filtered = [m for m in filtered if m.created_at >= date_from]
+        query = query.filter(Match.created_at >= date_from)
     
     if date_to:
-        filtered = [m for m in filtered if m.created_at <= date_to]
+        query = query.filter(Match.created_at <= date_to)
     
-    return filtered
+    return query
+
+
+def count_matches(query: Query) -> int:
+    """Количество кандидатов по запросу из build_matches_query"""
+    return query.order_by(None).count()
+
+
+def paginate_matches(query: Query, page: int, page_size: int) -> List[Match]:
+    """
+    Возвращает страницу кандидатов по убыванию рейтинга
+    (при полнотекстовом поиске — сначала по релевантности)
+
+    Args:
+        query: Запрос из build_matches_query
+        page: Номер страницы, начиная с 1
+        page_size: Размер страницы
+
+    Returns:
+        Список Match на странице
+    """
+    return query.order_by(Match.score.desc(), Match.id.desc()) \
+        .offset(max(page - 1, 0) * page_size) \
+        .limit(page_size) \
+        .all()
+
+
+@cached("matches", "comments")
+def search_matches(
+    page: int,
+    page_size: int,
+    vacancy_id: Optional[int] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+    recommendation: Optional[str] = None,
+    search_query: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    statuses: Optional[Tuple[str, ...]] = None
+) -> Tuple[List[Match], int]:
+    """
+    Страница кандидатов по фильтрам и общее число найденных (с кэшем запросов)
+
+    Returns:
+        (список Match на странице, количество по фильтрам)
+    """
+    db = SessionLocal()
+    try:
+        query = build_matches_query(
+            db,
+            vacancy_id=vacancy_id,
+            min_score=min_score,
+            max_score=max_score,
+            recommendation=recommendation,
+            search_query=search_query,
+            date_from=date_from,
+            date_to=date_to,
+            statuses=list(statuses) if statuses else None
+        )
+        return paginate_matches(query, page, page_size), count_matches(query)
+    finally:
+        db.close()
+
+
+@cached("matches", "comments")
+def search_match_ids(
+    vacancy_id: Optional[int] = None,
+    min_score: Optional[int] = None,
+    max_score: Optional[int] = None,
+    recommendation: Optional[str] = None,
+    search_query: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    statuses: Optional[Tuple[str, ...]] = None
+) -> List[int]:
+    """ID всех кандидатов по фильтрам (для массовых операций)"""
+    db = SessionLocal()
+    try:
+        query = build_matches_query(
+            db,
+            vacancy_id=vacancy_id,
+            min_score=min_score,
+            max_score=max_score,
+            recommendation=recommendation,
+            search_query=search_query,
+            date_from=date_from,
+            date_to=date_to,
+            statuses=list(statuses) if statuses else None
+        )
+        return [row.id for row in query.with_entities(Match.id).all()]
+    finally:
+        db.close()
@@ -0,0 +1,120 @@
+"""Бенчмарк: два вызова LLM (извлечение + анализ) против одного комбинированного
+
+Запуск (в контейнере приложения, оркестратор должен быть доступен):
+    python benchmarks/bench_combined.py --vacancy-id 1 --model a-vibe resume1.pdf resume2.docx
+
+Для каждого файла выполняются оба варианта с отключённым кэшем, выводятся
+символы промпта, токены prompt/completion (из usage) и время.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from db.models import SessionLocal, Vacancy  # noqa: E402
+from services.llm_client import LLMClient  # noqa: E402
+from services.document_parser import DocumentParser, ResumeExtractor  # noqa: E402
+
+
+class UsageRecorder:
+    """Оборачивает _call_llm и копит символы промпта и usage по всем вызовам"""
+
+    def __init__(self, client: LLMClient):
+        self.client = client
+        self.calls = 0
+        self.prompt_chars = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._original = client._call_llm
+        client._call_llm = self._call
+
+    def _call(self, user_prompt, temperature=0.3, max_retries=3, **kwargs):
+        response = self._original(user_prompt, temperature, max_retries, **kwargs)
+        usage = self.client.get_last_usage()
+        self.calls += 1
+        self.prompt_chars += len(self.client.system_prompt) + len(user_prompt)
+        self.prompt_tokens += usage.get('prompt_tokens', 0)
+        self.completion_tokens += usage.get('completion_tokens', 0)
+        return response
+
+    def reset(self):
+        self.calls = self.prompt_chars = self.prompt_tokens = self.completion_tokens = 0
+
+    def snapshot(self, elapsed: float) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_chars": self.prompt_chars,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "seconds": round(elapsed, 1)
+        }
+
+
+def load_vacancy(vacancy_id: int) -> dict:
+    db = SessionLocal()
+    vacancy = db.query(Vacancy).filter(Vacancy.id == vacancy_id).first()
+    db.close()
+    if vacancy is None:
+        raise SystemExit(f"Вакансия {vacancy_id} не найдена")
+    return {
+        "title": vacancy.title,
+        "company": vacancy.company,
+        "requirements": json.loads(vacancy.requirements_json)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="+", help="Файлы резюме (PDF/DOCX/TXT)")
+    parser.add_argument("--vacancy-id", type=int, required=True)
+    parser.add_argument("--model", default="a-vibe", help="Ключ модели из AVAILABLE_MODELS")
+    args = parser.parse_args()
+
+    vacancy_data = load_vacancy(args.vacancy_id)
+    client = LLMClient(model_key=args.model, use_cache=False)
+    recorder = UsageRecorder(client)
+
+    totals = {"two_call": [], "combined": []}
+
+    for path in args.files:
+        with open(path, 'rb') as f:
+            text = DocumentParser.parse_file(f.read(), os.path.basename(path))
+
+        recorder.reset()
+        started = time.time()
+        resume = ResumeExtractor.extract_resume_structure(text, client)
+        two_score = client.analyze_resume(resume, vacancy_data)['matching_score']['overall']
+        two_call = recorder.snapshot(time.time() - started)
+
+        recorder.reset()
+        started = time.time()
+        combined_result = client.extract_and_analyze(text, vacancy_data)
+        combined_score = combined_result['analysis']['matching_score']['overall']
+        combined = recorder.snapshot(time.time() - started)
+
+        totals["two_call"].append(two_call)
+        totals["combined"].append(combined)
+
+        print(f"\n{os.path.basename(path)}: score {two_score} (2 вызова) / {combined_score} (1 вызов)")
+        for name, row in (("2 вызова", two_call), ("1 вызов", combined)):
+            print(
+                f"  {name:9} calls={row['calls']} prompt_chars={row['prompt_chars']} "
+                f"prompt_tokens={row['prompt_tokens']} completion_tokens={row['completion_tokens']} "
+                f"time={row['seconds']}s"
+            )
+
+    print("\nИтого:")
+    for name, rows in totals.items():
+        summed = {key: sum(r[key] for r in rows) for key in rows[0]}
+        print(
+            f"  {name:9} calls={summed['calls']} prompt_chars={summed['prompt_chars']} "
+            f"prompt_tokens={summed['prompt_tokens']} completion_tokens={summed['completion_tokens']} "
+            f"time={summed['seconds']:.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
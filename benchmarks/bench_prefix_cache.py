@@ -0,0 +1,257 @@
+"""Бенчмарк: переиспользование кэша префикса при старой и новой раскладке промпта анализа
+
+Запуск (оркестратор не нужен — поднимается локальный stub-сервер):
+    python benchmarks/bench_prefix_cache.py --vacancies 3 --resumes 20
+
+Stub-сервер отвечает на /v1/chat/completions как llama.cpp с cache_prompt:
+помнит последние --cache-prompts промптов, считает общий префикс нового
+промпта с ними (в грубых токенах) и "пересчитывает" только остаток —
+с задержкой --prefill-ms на 1000 токенов. В usage возвращается
+prompt_tokens_details.cached_tokens, как у OpenAI-совместимых серверов.
+
+Запросы идут в том же порядке, что и в матрице (services/job_queue.py):
+сначала все резюме под первую вакансию, затем под вторую и т.д.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+# Метрики вызовов пишутся в БД приложения — для бенчмарка не нужны
+os.environ.setdefault("LLM_METRICS_ENABLED", "false")
+
+from services import llm_client  # noqa: E402
+from services.llm_client import (  # noqa: E402
+    LLMClient, ANALYSIS_JSON_FORMAT, JSON_OUTPUT_RULES
+)
+from services.llm_router import Backend, LLMRouter  # noqa: E402
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]|\s+")
+
+SKILLS = [
+    "Python", "Django", "FastAPI", "PostgreSQL", "Redis", "Kafka", "Docker", "Kubernetes",
+    "Go", "Java", "Spring", "React", "TypeScript", "ClickHouse", "Airflow", "Spark",
+    "Linux", "Nginx", "gRPC", "RabbitMQ", "Terraform", "AWS", "GitLab CI", "Celery"
+]
+
+STUB_ANALYSIS = {
+    "matching_score": {
+        "overall": 70, "hard_skills": 70, "hard_skills_reasoning": "stub",
+        "experience": 70, "experience_reasoning": "stub",
+        "cultural_fit": 70, "cultural_fit_reasoning": "stub",
+        "communication": 70, "communication_reasoning": "stub",
+        "growth_potential": 70, "growth_potential_reasoning": "stub",
+        "stability": 70, "stability_reasoning": "stub"
+    },
+    "summary": "stub", "strengths": [], "weaknesses": [], "missing_skills": [], "red_flags": [],
+    "recommendation": "MAYBE", "confidence_level": "LOW", "interview_questions": [], "next_steps": [],
+    "salary_expectation_fit": "UNCLEAR", "availability": "UNCLEAR"
+}
+
+
+def tokenize(text: str) -> list:
+    """Грубые токены: слова, знаки препинания и пробельные блоки"""
+    return _TOKEN_RE.findall(text)
+
+
+def common_prefix(a: list, b: list) -> int:
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+class PrefixCacheStub:
+    """Состояние stub-сервера: кэш последних промптов и счётчики"""
+
+    def __init__(self, cache_prompts: int, prefill_ms: float):
+        self.cache = deque(maxlen=cache_prompts)
+        self.prefill_ms = prefill_ms
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.cache.clear()
+            self.requests = 0
+            self.prompt_tokens = 0
+            self.cached_tokens = 0
+            self.prefill_seconds = 0.0
+
+    def complete(self, payload: dict) -> dict:
+        # Аналог chat template: роли и содержимое сообщений подряд
+        rendered = "".join(f"<|{m['role']}|>\n{m['content']}\n" for m in payload["messages"])
+        tokens = tokenize(rendered)
+
+        with self.lock:
+            cached = max((common_prefix(tokens, previous) for previous in self.cache), default=0)
+            self.cache.append(tokens)
+            prefill = (len(tokens) - cached) * self.prefill_ms / 1000 / 1000
+            self.requests += 1
+            self.prompt_tokens += len(tokens)
+            self.cached_tokens += cached
+            self.prefill_seconds += prefill
+
+        time.sleep(prefill)
+        return {
+            "choices": [{"message": {"role": "assistant", "content": json.dumps(STUB_ANALYSIS)}}],
+            "usage": {
+                "prompt_tokens": len(tokens),
+                "completion_tokens": 200,
+                "prompt_tokens_details": {"cached_tokens": cached}
+            }
+        }
+
+
+def start_stub(stub: PrefixCacheStub) -> HTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, body: dict):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.startswith("/switch/"):
+                self._reply({"status": "ok"})
+            else:
+                self._reply(stub.complete(payload))
+
+        def do_GET(self):
+            self._reply({"status": "ready"})
+
+        def log_message(self, *args):
+            pass
+
+    # Однопоточный сервер — как один слот llama.cpp
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_analysis_prompt(hr_guidelines: str, vacancy_data: dict, resume_data: dict) -> str:
+    """Раскладка до переноса формата ответа в начало: формат и правила шли после резюме"""
+    return f"""
+Проанализируй резюме кандидата относительно требований вакансии.
+
+HR Guidelines:
+{hr_guidelines}
+
+Вакансия:
+{json.dumps(vacancy_data, ensure_ascii=False, indent=2)}
+
+Резюме:
+{json.dumps(resume_data, ensure_ascii=False, indent=2)}
+
+Верни результат СТРОГО в формате JSON (без markdown блоков, без комментариев):
+{ANALYSIS_JSON_FORMAT}
+
+{JSON_OUTPUT_RULES}
+"""
+
+
+def make_dataset(vacancies: int, resumes: int, seed: int):
+    rng = random.Random(seed)
+    vacancy_list = [
+        {
+            "title": f"Backend-разработчик {i + 1}",
+            "company": f"Компания {i + 1}",
+            "requirements": {
+                "hard_skills": rng.sample(SKILLS, 6),
+                "soft_skills": ["коммуникабельность", "ответственность"],
+                "experience_years": rng.randint(1, 6)
+            }
+        }
+        for i in range(vacancies)
+    ]
+    resume_list = [
+        {
+            "name": f"Кандидат {i + 1}",
+            "age": rng.randint(22, 50),
+            "skills": rng.sample(SKILLS, rng.randint(4, 10)),
+            "experience": [
+                {
+                    "company": f"ООО Работодатель {rng.randint(1, 500)}",
+                    "position": rng.choice(["Python-разработчик", "Backend-разработчик", "Инженер данных"]),
+                    "start_date": f"{2024 - 2 * j}-0{rng.randint(1, 9)}",
+                    "end_date": f"{2025 - 2 * j}-0{rng.randint(1, 9)}",
+                    "description": "Разработка сервисов, " + ", ".join(rng.sample(SKILLS, 3))
+                }
+                for j in range(rng.randint(1, 4))
+            ],
+            "education": [{"institution": "МГТУ", "degree": "Бакалавр", "year": str(rng.randint(2005, 2022))}]
+        }
+        for i in range(resumes)
+    ]
+    return vacancy_list, resume_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vacancies", type=int, default=3)
+    parser.add_argument("--resumes", type=int, default=20)
+    parser.add_argument("--cache-prompts", type=int, default=1,
+                        help="Сколько последних промптов помнит сервер (1 — один слот llama.cpp)")
+    parser.add_argument("--prefill-ms", type=float, default=150,
+                        help="Задержка пересчёта на 1000 некэшированных токенов, мс")
+    parser.add_argument("--prompts-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prompts'))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Промпты из репозитория, а не из /app/prompts контейнера
+    with open(os.path.join(args.prompts_dir, "system_prompt.txt"), encoding="utf-8") as f:
+        system_prompt = f.read()
+    with open(os.path.join(args.prompts_dir, "hr_guidelines.txt"), encoding="utf-8") as f:
+        hr_guidelines = f.read()
+    llm_client.load_system_prompt = lambda: system_prompt
+    llm_client.load_hr_guidelines = lambda: hr_guidelines
+
+    stub = PrefixCacheStub(args.cache_prompts, args.prefill_ms)
+    server = start_stub(stub)
+
+    router = LLMRouter([Backend(f"http://127.0.0.1:{server.server_port}", slots=1)])
+    client = LLMClient(use_cache=False, router=router)
+    client._get_model_config = lambda: {"model_id": "stub"}
+
+    vacancies, resumes = make_dataset(args.vacancies, args.resumes, args.seed)
+
+    layouts = {
+        "старая": lambda vacancy, resume: legacy_analysis_prompt(hr_guidelines, vacancy, resume),
+        "новая": lambda vacancy, resume: client._build_analysis_prompt(resume, vacancy),
+    }
+
+    print(f"{len(vacancies)} вакансий × {len(resumes)} резюме, кэш сервера: {args.cache_prompts} промпт(ов), "
+          f"prefill {args.prefill_ms:g} мс / 1000 токенов\n")
+    print(f"{'Раскладка':10} {'Запросов':>8} {'Токенов':>9} {'Из кэша':>9} {'Доля':>6} {'Prefill, с':>11} {'Время, с':>9}")
+
+    for name, build in layouts.items():
+        stub.reset()
+        started = time.time()
+        for vacancy in vacancies:
+            for resume in resumes:
+                client.call_llm_json(build(vacancy, resume), kind="analysis")
+        elapsed = time.time() - started
+
+        share = stub.cached_tokens / stub.prompt_tokens * 100 if stub.prompt_tokens else 0
+        print(
+            f"{name:10} {stub.requests:>8} {stub.prompt_tokens:>9} {stub.cached_tokens:>9} "
+            f"{share:>5.0f}% {stub.prefill_seconds:>11.2f} {elapsed:>9.2f}"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
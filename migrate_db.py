@@ -3,6 +3,37 @@ import sqlite3
 import os
 
 DB_PATH = "/data/db/hr_analysis.db"
+BACKFILL_BATCH_SIZE = 1000
+
+def backfill_analysis_columns(conn):
+    """
+    Заполняет колонки recommendation/confidence_level/оценок из analysis_json
+
+    Идёт диапазонами id по BACKFILL_BATCH_SIZE строк с коммитом после каждого,
+    чтобы не держать одну длинную транзакцию на большой таблице.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT COALESCE(MAX(id), 0) FROM matches")
+    max_id = cursor.fetchone()[0]
+
+    updated = 0
+    for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+        cursor.execute("""
+            UPDATE matches SET
+                recommendation = COALESCE(json_extract(analysis_json, '$.recommendation'), 'MAYBE'),
+                confidence_level = json_extract(analysis_json, '$.confidence_level'),
+                hard_skills = COALESCE(json_extract(analysis_json, '$.matching_score.hard_skills'), 0),
+                experience = COALESCE(json_extract(analysis_json, '$.matching_score.experience'), 0),
+                cultural_fit = COALESCE(json_extract(analysis_json, '$.matching_score.cultural_fit'), 0),
+                communication = COALESCE(json_extract(analysis_json, '$.matching_score.communication'), 0),
+                growth_potential = COALESCE(json_extract(analysis_json, '$.matching_score.growth_potential'), 0),
+                stability = COALESCE(json_extract(analysis_json, '$.matching_score.stability'), 0)
+            WHERE id > ? AND id <= ? AND recommendation IS NULL AND json_valid(analysis_json)
+        """, (start, start + BACKFILL_BATCH_SIZE))
+        updated += cursor.rowcount
+        conn.commit()
+
+    print(f"Заполнено колонок анализа: {updated} строк")
 
 def migrate():
     if not os.path.exists(DB_PATH):
@@ -29,6 +60,44 @@ def migrate():
         cursor.execute("ALTER TABLE matches ADD COLUMN status_updated_at TIMESTAMP")
         cursor.execute("UPDATE matches SET status_updated_at = created_at WHERE status_updated_at IS NULL")
     
+    # Поля из analysis_json, вынесенные в колонки
+    analysis_columns = {
+        'recommendation': 'TEXT',
+        'confidence_level': 'TEXT',
+        'hard_skills': 'FLOAT',
+        'experience': 'FLOAT',
+        'cultural_fit': 'FLOAT',
+        'communication': 'FLOAT',
+        'growth_potential': 'FLOAT',
+        'stability': 'FLOAT',
+    }
+    added = [name for name in analysis_columns if name not in existing_columns]
+    for name in added:
+        print(f"Добавляем колонку '{name}'...")
+        cursor.execute(f"ALTER TABLE matches ADD COLUMN {name} {analysis_columns[name]}")
+
+    # Ссылка на сохранённое резюме (таблицы resumes/resume_documents создаёт init_db)
+    if 'resume_id' not in existing_columns:
+        print("Добавляем колонку 'resume_id'...")
+        cursor.execute("ALTER TABLE matches ADD COLUMN resume_id INTEGER REFERENCES resumes (id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_matches_resume_id ON matches (resume_id)")
+
+    if 'prescore' not in existing_columns:
+        print("Добавляем колонку 'prescore'...")
+        cursor.execute("ALTER TABLE matches ADD COLUMN prescore FLOAT")
+
+    # Узел LLM в метриках вызовов (таблицу llm_calls создаёт init_db)
+    cursor.execute("PRAGMA table_info(llm_calls)")
+    llm_calls_columns = [row[1] for row in cursor.fetchall()]
+    if llm_calls_columns and 'backend' not in llm_calls_columns:
+        print("Добавляем колонку 'llm_calls.backend'...")
+        cursor.execute("ALTER TABLE llm_calls ADD COLUMN backend TEXT")
+
+    # Повторный запуск дозаполняет только строки с recommendation IS NULL
+    backfill_analysis_columns(conn)
+
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_matches_recommendation ON matches (recommendation)")
+
     # Создаём таблицу comments если её нет
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS comments (
@@ -54,7 +123,14 @@ def migrate():
         )
     """)
     print("Таблица 'status_history' создана")
-    
+
+    # Индексы под фильтры и сортировку страницы "Результаты"
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_matches_vacancy_score ON matches (vacancy_id, score)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_matches_vacancy_status ON matches (vacancy_id, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_matches_status ON matches (status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_matches_created_at ON matches (created_at)")
+    print("Индексы таблицы 'matches' созданы")
+
     conn.commit()
     conn.close()
     